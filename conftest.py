@@ -0,0 +1,7 @@
+import pytest
+
+
+@pytest.fixture(autouse=True)
+def no_thumbnail_pregeneration(settings):
+    """Фоновые миниатюры не переживают очистку базы и MEDIA_ROOT тестов."""
+    settings.THUMBNAIL_PREGENERATE = False
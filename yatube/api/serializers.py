@@ -0,0 +1,28 @@
+def serialize_post(post):
+    """Карточка поста в ленте: только поля из PostQuerySet.for_list."""
+    return {
+        'id': post.pk,
+        'text': post.text,
+        'pub_date': post.pub_date,
+        'updated': post.updated,
+        'author': post.author.username,
+        'group': post.group.slug if post.group_id else None,
+        'image': post.image.url if post.image else None,
+    }
+
+
+def serialize_post_detail(post):
+    return {
+        **serialize_post(post),
+        'comments_count': post.comments_count,
+        'author_posts_count': post.author.stats.posts_count,
+    }
+
+
+def serialize_comment(comment):
+    return {
+        'id': comment.pk,
+        'author': comment.author.username,
+        'text': comment.text,
+        'created': comment.created,
+    }
@@ -0,0 +1,148 @@
+from http import HTTPStatus
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+
+from posts.models import Comment, Follow, Group, Post
+
+User = get_user_model()
+
+
+@override_settings(NUM_OF_POST=2, NUM_OF_COMMENTS=2)
+class ApiViewsTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(username='author')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(
+            title='Группа', slug='group', description='Описание'
+        )
+        cls.posts = [
+            Post.objects.create(
+                author=cls.author, group=cls.group, text=f'Пост {number}'
+            )
+            for number in range(3)
+        ]
+        Follow.objects.create(user=cls.reader, author=cls.author)
+        for number in range(3):
+            Comment.objects.create(
+                post=cls.posts[0], author=cls.reader,
+                text=f'Комментарий {number}'
+            )
+
+    def setUp(self):
+        cache.clear()
+        self.guest_client = Client()
+        self.reader_client = Client()
+        self.reader_client.force_login(self.reader)
+
+    def test_lists_paginate_compact_posts(self):
+        """Ленты отдают посты страницами по курсору."""
+        urls = (
+            reverse('api:index'),
+            reverse('api:group_list', args=(self.group.slug,)),
+            reverse('api:profile', args=(self.author.username,)),
+        )
+        for url in urls:
+            with self.subTest(url=url):
+                data = self.guest_client.get(url).json()
+                self.assertEqual(
+                    [post['id'] for post in data['results']],
+                    [self.posts[2].pk, self.posts[1].pk]
+                )
+                self.assertEqual(data['results'][0]['author'], 'author')
+                self.assertEqual(data['results'][0]['group'], 'group')
+                self.assertIsNone(data['previous'])
+                data = self.guest_client.get(data['next']).json()
+                self.assertEqual(
+                    [post['id'] for post in data['results']],
+                    [self.posts[0].pk]
+                )
+
+    def test_post_detail_and_comments(self):
+        """Пост отдаётся с первыми комментариями и ссылкой на остальные."""
+        post = self.posts[0]
+        data = self.guest_client.get(
+            reverse('api:post_detail', args=(post.pk,))
+        ).json()
+        self.assertEqual(data['text'], post.text)
+        self.assertEqual(data['comments_count'], 3)
+        self.assertEqual(data['author_posts_count'], 3)
+        self.assertEqual(len(data['comments']), 2)
+        rest = self.guest_client.get(data['comments_next']).json()
+        self.assertEqual(
+            [comment['text'] for comment in rest['results']],
+            ['Комментарий 2']
+        )
+
+    def test_errors_are_json(self):
+        """Ошибки API отдаются в JSON, лента подписок требует входа."""
+        cases = (
+            (reverse('api:post_detail', args=(0,)), HTTPStatus.NOT_FOUND),
+            (reverse('api:group_list', args=('no',)), HTTPStatus.NOT_FOUND),
+            (reverse('api:follow_index'), HTTPStatus.UNAUTHORIZED),
+        )
+        for url, status in cases:
+            with self.subTest(url=url):
+                response = self.guest_client.get(url)
+                self.assertEqual(response.status_code, status)
+                self.assertIn('detail', response.json())
+        response = self.guest_client.post(reverse('api:index'))
+        self.assertEqual(
+            response.status_code, HTTPStatus.METHOD_NOT_ALLOWED
+        )
+
+    def test_follow_feed(self):
+        """Лента подписок отдаёт посты авторов из подписок."""
+        response = self.reader_client.get(reverse('api:follow_index'))
+        self.assertEqual(len(response.json()['results']), 2)
+        self.assertIn('Cookie', response['Vary'])
+
+    def test_conditional_get_answers_not_modified(self):
+        """Повторный запрос с ETag получает 304 без обращений к базе."""
+        urls = (
+            reverse('api:index'),
+            reverse('api:post_detail', args=(self.posts[0].pk,)),
+        )
+        for url in urls:
+            with self.subTest(url=url):
+                response = self.guest_client.get(url)
+                self.assertTrue(response.has_header('Last-Modified'))
+                with self.assertNumQueries(0):
+                    response = self.guest_client.get(
+                        url, HTTP_IF_NONE_MATCH=response['ETag']
+                    )
+                self.assertEqual(
+                    response.status_code, HTTPStatus.NOT_MODIFIED
+                )
+                self.assertEqual(response.content, b'')
+
+    def test_follow_feed_conditional_get(self):
+        """Лента подписок тоже отвечает 304, пока подписки не менялись."""
+        url = reverse('api:follow_index')
+        etag = self.reader_client.get(url)['ETag']
+        response = self.reader_client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, HTTPStatus.NOT_MODIFIED)
+        Follow.objects.filter(user=self.reader).delete()
+        response = self.reader_client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.json()['results'], [])
+
+    def test_etag_changes_with_data(self):
+        """ETag меняется после новой записи, которую видно в ответе."""
+        urls = (
+            reverse('api:index'),
+            reverse('api:post_detail', args=(self.posts[0].pk,)),
+        )
+        etags = [self.reader_client.get(url)['ETag'] for url in urls]
+        Post.objects.create(author=self.author, text='Новый пост')
+        Comment.objects.create(
+            post=self.posts[0], author=self.reader, text='Новый'
+        )
+        for url, etag in zip(urls, etags):
+            with self.subTest(url=url):
+                response = self.reader_client.get(
+                    url, HTTP_IF_NONE_MATCH=etag
+                )
+                self.assertEqual(response.status_code, HTTPStatus.OK)
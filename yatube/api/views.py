@@ -0,0 +1,164 @@
+import hashlib
+from datetime import datetime, timezone
+from functools import wraps
+from http import HTTPStatus
+
+from django.conf import settings
+from django.http import Http404, JsonResponse
+from django.shortcuts import get_object_or_404
+from django.urls import reverse
+from django.utils.cache import patch_vary_headers
+from django.views.decorators.http import condition, require_safe
+
+from posts.feed import FEED_DATE, get_follow_feed
+from posts.models import Comment, Group, Post, User
+from posts.page_cache import (author_scope, cache_page_by_generation,
+                              get_generations, group_scopes, index_scopes,
+                              post_comments_scopes, post_detail_scopes,
+                              profile_scopes)
+from posts.utils import get_comments_page, get_cursor_page
+
+from .serializers import (serialize_comment, serialize_post,
+                          serialize_post_detail)
+
+
+def api_view(view_func):
+    """Только GET и HEAD, ошибки 404 и 401 отдаются в JSON."""
+    @require_safe
+    @wraps(view_func)
+    def wrapper(request, *args, **kwargs):
+        try:
+            return view_func(request, *args, **kwargs)
+        except Http404:
+            return JsonResponse(
+                {'detail': 'Не найдено.'}, status=HTTPStatus.NOT_FOUND
+            )
+    return wrapper
+
+
+def api_login_required(view_func):
+    @wraps(view_func)
+    def wrapper(request, *args, **kwargs):
+        if not request.user.is_authenticated:
+            return JsonResponse(
+                {'detail': 'Нужна авторизация.'},
+                status=HTTPStatus.UNAUTHORIZED
+            )
+        response = view_func(request, *args, **kwargs)
+        patch_vary_headers(response, ('Cookie',))
+        return response
+    return wrapper
+
+
+def conditional_by_generation(get_scopes, per_user=False):
+    """ETag и Last-Modified по поколениям кеша страниц.
+
+    Поколения меняются при любой правке данных ответа, поэтому повторный
+    запрос с If-None-Match получает 304, не дойдя до базы. С per_user
+    в версию входят подписки пользователя: они меняют его ленту.
+    """
+    def get_versions(request, **kwargs):
+        if not hasattr(request, 'api_generations'):
+            scopes = get_scopes(**kwargs)
+            if per_user:
+                scopes.append(author_scope(request.user.username))
+            request.api_generations = get_generations(scopes)
+        return request.api_generations
+
+    def etag(request, **kwargs):
+        generations = get_versions(request, **kwargs)
+        version = '|'.join([
+            request.get_full_path(),
+            request.user.username if per_user else '',
+            *(str(gen) for gen in generations),
+        ])
+        return hashlib.md5(version.encode()).hexdigest()
+
+    def last_modified(request, **kwargs):
+        generation = max(get_versions(request, **kwargs))
+        return datetime.fromtimestamp(generation / 10 ** 9, tz=timezone.utc)
+
+    return condition(etag_func=etag, last_modified_func=last_modified)
+
+
+def page_url(request, cursor, path=None):
+    if cursor is None:
+        return None
+    path = path or request.path
+    return request.build_absolute_uri(f'{path}?cursor={cursor}')
+
+
+def posts_response(request, posts, field='pub_date'):
+    page = get_cursor_page(
+        posts, request.GET.get('cursor'), settings.NUM_OF_POST, field
+    )
+    return JsonResponse({
+        'results': [serialize_post(post) for post in page],
+        'next': page_url(request, page.next_cursor),
+        'previous': page_url(request, page.previous_cursor),
+    })
+
+
+@api_view
+@conditional_by_generation(index_scopes)
+@cache_page_by_generation(index_scopes, key_prefix='api_index')
+def index(request):
+    return posts_response(request, Post.objects.for_list())
+
+
+@api_view
+@conditional_by_generation(group_scopes)
+@cache_page_by_generation(group_scopes, key_prefix='api_group')
+def group_posts(request, slug):
+    group = get_object_or_404(Group, slug=slug)
+    return posts_response(request, group.posts.for_list())
+
+
+@api_view
+@conditional_by_generation(profile_scopes)
+@cache_page_by_generation(profile_scopes, key_prefix='api_profile')
+def profile(request, username):
+    author = get_object_or_404(User, username=username)
+    return posts_response(request, author.posts.for_list())
+
+
+@api_view
+@api_login_required
+@conditional_by_generation(index_scopes, per_user=True)
+def follow_index(request):
+    return posts_response(
+        request, get_follow_feed(request.user).for_list(), FEED_DATE
+    )
+
+
+@api_view
+@conditional_by_generation(post_detail_scopes)
+@cache_page_by_generation(post_detail_scopes, key_prefix='api_post')
+def post_detail(request, post_id):
+    post = get_object_or_404(Post.objects.for_detail(), pk=post_id)
+    comments = get_comments_page(post.comments.for_list(), None)
+    return JsonResponse({
+        **serialize_post_detail(post),
+        'comments': [serialize_comment(comment) for comment in comments],
+        'comments_next': page_url(
+            request, comments.next_cursor,
+            reverse('api:post_comments', args=(post_id,))
+        ),
+    })
+
+
+@api_view
+@conditional_by_generation(post_comments_scopes)
+@cache_page_by_generation(post_comments_scopes, key_prefix='api_comments')
+def post_comments(request, post_id):
+    if not Post.objects.filter(pk=post_id).exists():
+        raise Http404
+    comments = get_comments_page(
+        Comment.objects.filter(post_id=post_id).for_list(),
+        request.GET.get('cursor')
+    )
+    return JsonResponse({
+        'results': [serialize_comment(comment) for comment in comments],
+        'next': page_url(request, comments.next_cursor),
+        'previous': page_url(request, comments.previous_cursor),
+    })
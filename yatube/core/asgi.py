@@ -0,0 +1,198 @@
+import asyncio
+import sys
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.wsgi import get_wsgi_application
+
+
+class WSGICall:
+    """Ответ WSGI-приложения, тело которого читается по кускам.
+
+    Следующий кусок читается заранее: ответ из одного куска, как у
+    обычного HttpResponse, дочитывается и закрывается в том же потоке,
+    где работало представление. close() отправляет request_finished, и
+    соединения с базой освобождаются в потоке, где были открыты.
+    """
+
+    def __init__(self, application, environ):
+        self.status = None
+        self.headers = None
+        self.closed = False
+        self.result = application(environ, self.start_response)
+        self.chunks = iter(self.result)
+        self.pending = self.next_chunk()
+
+    def start_response(self, status, headers, exc_info=None):
+        if exc_info and self.status is not None:
+            raise exc_info[1].with_traceback(exc_info[2])
+        self.status = int(status.split(' ', 1)[0])
+        self.headers = [
+            (name.lower().encode('latin1'), value.encode('latin1'))
+            for name, value in headers
+        ]
+
+    def next_chunk(self):
+        try:
+            for chunk in self.chunks:
+                if chunk:
+                    return chunk
+        except BaseException:
+            self.close()
+            raise
+        self.close()
+        return None
+
+    def read(self):
+        """Очередной кусок тела или None, если ответ кончился."""
+        chunk = self.pending
+        if chunk is not None:
+            self.pending = self.next_chunk()
+        return chunk
+
+    def close(self):
+        if self.closed:
+            return
+        self.closed = True
+        if hasattr(self.result, 'close'):
+            self.result.close()
+
+
+def start_wsgi(application, environ):
+    """Выполняет WSGI-приложение до первого куска тела ответа."""
+    call = WSGICall(application, environ)
+    return call, call.read()
+
+
+def call_wsgi(application, environ):
+    """Выполняет WSGI-приложение и собирает ответ целиком."""
+    call = WSGICall(application, environ)
+    return call.status, call.headers, b''.join(iter(call.read, None))
+
+
+def get_environ(scope, body):
+    """WSGI-окружение по HTTP-соединению ASGI."""
+    server = scope.get('server') or ('localhost', 80)
+    client = scope.get('client') or ('', 0)
+    environ = {
+        'REQUEST_METHOD': scope['method'],
+        'SCRIPT_NAME': scope.get('root_path', '').encode().decode('latin1'),
+        'PATH_INFO': scope['path'].encode().decode('latin1'),
+        'QUERY_STRING': scope.get('query_string', b'').decode('latin1'),
+        'SERVER_NAME': server[0],
+        'SERVER_PORT': str(server[1]),
+        'SERVER_PROTOCOL': f'HTTP/{scope.get("http_version", "1.1")}',
+        'REMOTE_ADDR': client[0],
+        'REMOTE_PORT': str(client[1]),
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': scope.get('scheme', 'http'),
+        'wsgi.input': body,
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': True,
+        'wsgi.run_once': False,
+    }
+    for name, value in scope.get('headers', []):
+        name = name.decode('latin1')
+        if name == 'content-length':
+            key = 'CONTENT_LENGTH'
+        elif name == 'content-type':
+            key = 'CONTENT_TYPE'
+        else:
+            key = 'HTTP_' + name.upper().replace('-', '_')
+        value = value.decode('latin1')
+        if key in environ:
+            separator = '; ' if key == 'HTTP_COOKIE' else ','
+            value = environ[key] + separator + value
+        environ[key] = value
+    return environ
+
+
+class ASGIHandler:
+    """ASGI-приложение поверх синхронного обработчика Django.
+
+    Django 2.2 не умеет асинхронных представлений, поэтому представления
+    выполняются в пуле из ASGI_THREADS потоков, а чтение запроса и отправка
+    ответа остаются в цикле событий. Медленный клиент занимает поток только
+    на время работы представления, и пул заодно ограничивает число
+    соединений с базой.
+    """
+
+    def __init__(self, application, max_workers):
+        self.application = application
+        self.executor = ThreadPoolExecutor(
+            max_workers, thread_name_prefix='asgi'
+        )
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            await self.lifespan(receive, send)
+            return
+        if scope['type'] != 'http':
+            raise ValueError(f'Соединения {scope["type"]} не поддерживаются.')
+        body = await self.read_body(receive)
+        if body is None:
+            return
+        loop = asyncio.get_running_loop()
+        try:
+            call, chunk = await loop.run_in_executor(
+                self.executor, start_wsgi, self.application,
+                get_environ(scope, body)
+            )
+        finally:
+            body.close()
+        await send({
+            'type': 'http.response.start',
+            'status': call.status,
+            'headers': call.headers,
+        })
+        try:
+            # Тело уходит по кускам: в памяти не больше двух, даже у
+            # FileResponse и потоковых ответов.
+            while chunk is not None:
+                await send({
+                    'type': 'http.response.body',
+                    'body': chunk,
+                    'more_body': True,
+                })
+                if call.closed:
+                    chunk = call.read()
+                else:
+                    chunk = await loop.run_in_executor(
+                        self.executor, call.read
+                    )
+        finally:
+            if not call.closed:
+                await loop.run_in_executor(self.executor, call.close)
+        await send({'type': 'http.response.body', 'body': b''})
+
+    @staticmethod
+    async def read_body(receive):
+        """Тело запроса; крупное уходит на диск. None, если клиент ушёл."""
+        body = tempfile.SpooledTemporaryFile(
+            max_size=settings.FILE_UPLOAD_MAX_MEMORY_SIZE
+        )
+        while True:
+            message = await receive()
+            if message['type'] == 'http.disconnect':
+                body.close()
+                return None
+            body.write(message.get('body', b''))
+            if not message.get('more_body'):
+                body.seek(0)
+                return body
+
+    async def lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                self.executor.shutdown(wait=True)
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+
+def get_asgi_application():
+    return ASGIHandler(get_wsgi_application(), settings.ASGI_THREADS)
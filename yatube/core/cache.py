@@ -0,0 +1,257 @@
+import json
+import os
+import pickle
+import random
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+from django.core.cache.backends.filebased import FileBasedCache
+from django.utils.module_loading import import_string
+
+from . import instrumentation
+
+LOG_NAME = 'invalidations.log'
+CULL_STAMP = 'cull.stamp'
+CLEAR_ALL = None
+MISSING = object()
+
+_tiers = {}
+_tiers_lock = threading.Lock()
+
+
+class LocalTier:
+    """LRU процесса: общий для всех потоков, как у LocMemCache."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        self.entries = OrderedDict()
+        self.pid = os.getpid()
+        self.origin = uuid.uuid4().hex
+        self.log_inode = None
+        self.log_offset = 0
+        self.stats = dict.fromkeys(
+            ('l1_hits', 'l2_hits', 'misses', 'invalidations'), 0
+        )
+
+
+class SharedFileCache(FileBasedCache):
+    """FileBasedCache, который чистит каталог не при каждой записи.
+
+    Стандартный _cull перечисляет все файлы кеша при каждом set, и запись
+    дорожает с ростом кеша. Здесь каталог перечисляется не чаще раза в
+    CULL_INTERVAL секунд на все процессы, а лишнее за это время удаляется
+    заодно с обычной долей записей.
+    """
+
+    def __init__(self, dir, params):
+        super().__init__(dir, params)
+        options = params.get('OPTIONS', {})
+        self._cull_interval = options.get('CULL_INTERVAL', 60)
+
+    def _cull_due(self):
+        stamp = os.path.join(self._dir, CULL_STAMP)
+        try:
+            if time.time() - os.stat(stamp).st_mtime < self._cull_interval:
+                return False
+        except FileNotFoundError:
+            pass
+        with open(stamp, 'a'):
+            os.utime(stamp)
+        return True
+
+    def _cull(self):
+        if not self._cull_due():
+            return
+        filelist = self._list_cache_files()
+        excess = len(filelist) - self._max_entries
+        if excess < 0:
+            return
+        if self._cull_frequency == 0:
+            return self.clear()
+        count = excess + self._max_entries // self._cull_frequency
+        for fname in random.sample(filelist, min(count, len(filelist))):
+            self._delete(fname)
+
+
+def get_tier(location):
+    with _tiers_lock:
+        if location not in _tiers:
+            _tiers[location] = LocalTier()
+        return _tiers[location]
+
+
+class TwoTierCache(BaseCache):
+    """Локальный LRU (L1) перед общим для процессов кешем (L2).
+
+    Записи уходят в L2, а ключ публикуется в журнал инвалидаций рядом
+    с файлами кеша; остальные процессы читают журнал при обращении к
+    кешу и выбрасывают ключи из своего L1. Время жизни в L1 задаётся по
+    префиксу ключа в L1_TIMEOUTS и ограничивает отставание, если запись
+    в журнал всё же потеряется.
+    """
+
+    def __init__(self, location, params):
+        super().__init__(params)
+        options = params.get('OPTIONS', {})
+        shared = options.get('SHARED_BACKEND', 'core.cache.SharedFileCache')
+        self.shared = import_string(shared)(location, {
+            **params, 'OPTIONS': options.get('SHARED_OPTIONS', {}),
+        })
+        self.max_entries = options.get('L1_MAX_ENTRIES', 1000)
+        self.l1_timeouts = sorted(
+            options.get('L1_TIMEOUTS', {'': 30}).items(),
+            key=lambda item: len(item[0]), reverse=True
+        )
+        self.log_path = os.path.join(location, LOG_NAME)
+        self.log_max_bytes = options.get('LOG_MAX_BYTES', 1024 * 1024)
+        self.local = get_tier(location)
+
+    def l1_timeout(self, key):
+        for prefix, timeout in self.l1_timeouts:
+            if key.startswith(prefix):
+                return timeout
+        return 0
+
+    def remember(self, key, made_key, value, timeout=None):
+        l1_timeout = self.l1_timeout(key)
+        if timeout is not None and timeout is not DEFAULT_TIMEOUT:
+            l1_timeout = min(l1_timeout, timeout)
+        if l1_timeout <= 0:
+            return
+        entry = (time.monotonic() + l1_timeout, pickle.dumps(value, -1))
+        local = self.local
+        with local.lock:
+            local.entries[made_key] = entry
+            local.entries.move_to_end(made_key)
+            while len(local.entries) > self.max_entries:
+                local.entries.popitem(last=False)
+
+    def forget(self, made_key):
+        with self.local.lock:
+            if made_key is CLEAR_ALL:
+                self.local.entries.clear()
+            else:
+                self.local.entries.pop(made_key, None)
+
+    def publish(self, made_key):
+        """Сообщает остальным процессам, что ключ изменился."""
+        self.forget(made_key)
+        line = json.dumps([self.local.origin, made_key]) + '\n'
+        os.makedirs(os.path.dirname(self.log_path), exist_ok=True)
+        fd = os.open(self.log_path, os.O_WRONLY | os.O_APPEND | os.O_CREAT)
+        try:
+            os.write(fd, line.encode())
+            size = os.fstat(fd).st_size
+        finally:
+            os.close(fd)
+        if size > self.log_max_bytes:
+            # Новый файл вместо усечения: читатели заметят смену inode
+            # и очистят L1 целиком, ничего не пропустив. Так же очищается
+            # L1 процесса, впервые увидевшего журнал.
+            rotated = f'{self.log_path}.{self.local.origin}'
+            open(rotated, 'w').close()
+            os.replace(rotated, self.log_path)
+
+    def poll(self):
+        """Применяет к L1 инвалидации, записанные другими процессами."""
+        local = self.local
+        with local.lock:
+            if local.pid != os.getpid():
+                local.reset()
+            for origin, made_key in self.read_log():
+                if origin == local.origin:
+                    continue
+                local.stats['invalidations'] += 1
+                if made_key is CLEAR_ALL:
+                    local.entries.clear()
+                else:
+                    local.entries.pop(made_key, None)
+
+    def read_log(self):
+        """Новые строки журнала. При смене файла очищает L1 целиком."""
+        local = self.local
+        try:
+            stat = os.stat(self.log_path)
+            if stat.st_ino == local.log_inode and (
+                stat.st_size <= local.log_offset
+            ):
+                return []
+            log = open(self.log_path, 'rb')
+        except FileNotFoundError:
+            return []
+        with log:
+            stat = os.fstat(log.fileno())
+            if stat.st_ino != local.log_inode:
+                local.entries.clear()
+                local.log_inode = stat.st_ino
+                local.log_offset = stat.st_size
+                return []
+            log.seek(local.log_offset)
+            chunk = log.read(stat.st_size - local.log_offset)
+        chunk = chunk[:chunk.rfind(b'\n') + 1]
+        local.log_offset += len(chunk)
+        return [json.loads(line) for line in chunk.splitlines()]
+
+    def get(self, key, default=None, version=None):
+        self.poll()
+        made_key = self.make_key(key, version=version)
+        self.validate_key(made_key)
+        local = self.local
+        with local.lock:
+            entry = local.entries.get(made_key)
+            if entry is not None and entry[0] > time.monotonic():
+                local.entries.move_to_end(made_key)
+                local.stats['l1_hits'] += 1
+                instrumentation.count_cache_lookup(True)
+                return pickle.loads(entry[1])
+        value = self.shared.get(key, MISSING, version=version)
+        with local.lock:
+            local.stats['misses' if value is MISSING else 'l2_hits'] += 1
+        instrumentation.count_cache_lookup(value is not MISSING)
+        if value is MISSING:
+            return default
+        self.remember(key, made_key, value)
+        return value
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        made_key = self.make_key(key, version=version)
+        self.shared.set(key, value, timeout, version=version)
+        self.publish(made_key)
+        self.remember(key, made_key, value, timeout)
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        if not self.shared.add(key, value, timeout, version=version):
+            return False
+        made_key = self.make_key(key, version=version)
+        self.publish(made_key)
+        self.remember(key, made_key, value, timeout)
+        return True
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        return self.shared.touch(key, timeout, version=version)
+
+    def delete(self, key, version=None):
+        self.shared.delete(key, version=version)
+        self.publish(self.make_key(key, version=version))
+
+    def has_key(self, key, version=None):
+        return self.get(key, MISSING, version=version) is not MISSING
+
+    def clear(self):
+        self.shared.clear()
+        self.publish(CLEAR_ALL)
+
+    def stats(self):
+        with self.local.lock:
+            stats = dict(self.local.stats, l1_size=len(self.local.entries))
+        hits = stats['l1_hits'] + stats['l2_hits']
+        total = hits + stats['misses']
+        stats['hit_rate'] = hits / total if total else 0
+        stats['l1_hit_rate'] = stats['l1_hits'] / total if total else 0
+        return stats
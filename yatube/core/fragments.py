@@ -0,0 +1,64 @@
+import re
+from contextlib import contextmanager
+from urllib.parse import parse_qsl, urlencode
+
+from django.template.loader import render_to_string
+
+MARKER = re.compile(r'<!--personal:(\w+):([^>]*?)-->')
+
+_fragments = {}
+
+
+def fragment(template_name):
+    """Регистрирует часть страницы, которая зависит от пользователя.
+
+    Функция получает запрос и параметры из шаблона и возвращает
+    контекст для template_name.
+    """
+    def decorator(get_context):
+        _fragments[get_context.__name__] = (template_name, get_context)
+        return get_context
+    return decorator
+
+
+@fragment('includes/header.html')
+def header(request):
+    return {}
+
+
+def render_fragment(request, name, params):
+    template_name, get_context = _fragments[name]
+    return render_to_string(
+        template_name, get_context(request, **params), request
+    )
+
+
+def is_shell(request):
+    return getattr(request, 'render_shell', False)
+
+
+@contextmanager
+def render_shell(request):
+    """Страница рендерится без пользовательских частей, только с метками."""
+    request.render_shell = True
+    try:
+        yield
+    finally:
+        request.render_shell = False
+
+
+def marker(name, params):
+    # Текст пользователей экранируется, поэтому «<!--» в нём не появится.
+    return f'<!--personal:{name}:{urlencode(params)}-->'
+
+
+def splice(request, response):
+    """Подставляет в общую для всех страницу части текущего пользователя."""
+    content = response.content.decode(response.charset)
+    response.content = MARKER.sub(
+        lambda match: render_fragment(
+            request, match[1], dict(parse_qsl(match[2]))
+        ),
+        content
+    )
+    return response
@@ -0,0 +1,192 @@
+import heapq
+import math
+import threading
+import time
+from bisect import bisect_left
+from contextlib import ExitStack, contextmanager
+
+from django.db import connections
+
+TIME_BUCKETS = (1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+QUERY_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+SLOWEST_QUERIES = 3
+
+_local = threading.local()
+_lock = threading.Lock()
+_views = {}
+
+
+class RequestMetrics:
+    """Счётчики одного запроса."""
+
+    def __init__(self):
+        self.queries = 0
+        self.db_ms = 0.0
+        self.render_ms = 0.0
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.slowest = []
+        self.render_depth = 0
+
+    def add_query(self, sql, duration_ms):
+        self.queries += 1
+        self.db_ms += duration_ms
+        item = (duration_ms, sql)
+        if len(self.slowest) < SLOWEST_QUERIES:
+            heapq.heappush(self.slowest, item)
+        elif item > self.slowest[0]:
+            heapq.heapreplace(self.slowest, item)
+
+    def slowest_queries(self):
+        return sorted(self.slowest, reverse=True)
+
+    def server_timing(self, total_ms):
+        return (
+            f'db;dur={self.db_ms:.1f}, tpl;dur={self.render_ms:.1f}, '
+            f'total;dur={total_ms:.1f}'
+        )
+
+
+class Histogram:
+    """Гистограмма с фиксированными корзинами: дёшево копить и сливать."""
+
+    def __init__(self, bounds):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.count = 0
+        self.total = 0.0
+
+    def add(self, value):
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.total += value
+
+    def percentile(self, percent):
+        """Верхняя граница корзины с перцентилем, None для последней."""
+        rank = max(math.ceil(percent / 100 * self.count), 1)
+        seen = 0
+        for bound, count in zip(self.bounds, self.counts):
+            seen += count
+            if seen >= rank:
+                return bound
+        return None
+
+    def as_dict(self):
+        labels = [f'le_{bound}' for bound in self.bounds] + ['inf']
+        return {
+            'count': self.count,
+            'mean': self.total / self.count if self.count else 0,
+            'p50': self.percentile(50),
+            'p90': self.percentile(90),
+            'p99': self.percentile(99),
+            'buckets': dict(zip(labels, self.counts)),
+        }
+
+
+class ViewStats:
+    def __init__(self):
+        self.total_ms = Histogram(TIME_BUCKETS)
+        self.db_ms = Histogram(TIME_BUCKETS)
+        self.render_ms = Histogram(TIME_BUCKETS)
+        self.queries = Histogram(QUERY_BUCKETS)
+        self.cache_hits = 0
+        self.cache_misses = 0
+
+    def add(self, metrics, total_ms):
+        self.total_ms.add(total_ms)
+        self.db_ms.add(metrics.db_ms)
+        self.render_ms.add(metrics.render_ms)
+        self.queries.add(metrics.queries)
+        self.cache_hits += metrics.cache_hits
+        self.cache_misses += metrics.cache_misses
+
+    def as_dict(self):
+        return {
+            'requests': self.total_ms.count,
+            'total_ms': self.total_ms.as_dict(),
+            'db_ms': self.db_ms.as_dict(),
+            'render_ms': self.render_ms.as_dict(),
+            'queries': self.queries.as_dict(),
+            'cache_hits': self.cache_hits,
+            'cache_misses': self.cache_misses,
+        }
+
+
+def current():
+    return getattr(_local, 'metrics', None)
+
+
+def record_query(execute, sql, params, many, context):
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        metrics = current()
+        if metrics is not None:
+            metrics.add_query(sql, (time.perf_counter() - started) * 1000)
+
+
+@contextmanager
+def collect():
+    """Собирает метрики кода внутри блока в RequestMetrics."""
+    previous = current()
+    metrics = RequestMetrics()
+    _local.metrics = metrics
+    try:
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(
+                    connection.execute_wrapper(record_query)
+                )
+            yield metrics
+    finally:
+        _local.metrics = previous
+
+
+@contextmanager
+def timed_render():
+    """Время рендеринга шаблона без SQL, выполненного из шаблона.
+
+    Вложенные шаблоны уже учтены во внешнем и не считаются повторно.
+    """
+    metrics = current()
+    if metrics is None or metrics.render_depth:
+        yield
+        return
+    metrics.render_depth += 1
+    db_ms = metrics.db_ms
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        metrics.render_depth -= 1
+        metrics.render_ms += (
+            (time.perf_counter() - started) * 1000 - (metrics.db_ms - db_ms)
+        )
+
+
+def count_cache_lookup(hit):
+    metrics = current()
+    if metrics is None:
+        return
+    if hit:
+        metrics.cache_hits += 1
+    else:
+        metrics.cache_misses += 1
+
+
+def record(view_name, metrics, total_ms):
+    with _lock:
+        if view_name not in _views:
+            _views[view_name] = ViewStats()
+        _views[view_name].add(metrics, total_ms)
+
+
+def snapshot():
+    with _lock:
+        return {name: stats.as_dict() for name, stats in _views.items()}
+
+
+def reset():
+    with _lock:
+        _views.clear()
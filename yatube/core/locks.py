@@ -0,0 +1,53 @@
+import hashlib
+import os
+import time
+import uuid
+
+from django.conf import settings
+
+
+def lock_path(name):
+    digest = hashlib.md5(name.encode()).hexdigest()
+    return os.path.join(settings.CACHE_DIR, 'locks', f'{digest}.lock')
+
+
+def acquire(name, timeout):
+    """Берёт межпроцессную блокировку. Возвращает токен или None.
+
+    Файл создаётся с O_CREAT | O_EXCL, и из одновременных запросов это
+    удаётся ровно одному. Блокировку старше timeout секунд считаем
+    брошенной упавшим держателем и забираем.
+    """
+    path = lock_path(name)
+    os.makedirs(os.path.dirname(path), 0o700, exist_ok=True)
+    token = uuid.uuid4().hex
+    for _ in range(2):
+        try:
+            fd = os.open(path, os.O_CREAT | os.O_EXCL | os.O_WRONLY, 0o600)
+        except FileExistsError:
+            try:
+                with open(path) as file:
+                    stale = file.read()
+                age = time.time() - os.stat(path).st_mtime
+            except FileNotFoundError:
+                continue
+            if age < timeout:
+                return None
+            release(name, stale)
+            continue
+        with os.fdopen(fd, 'w') as file:
+            file.write(token)
+        return token
+    return None
+
+
+def release(name, token):
+    """Снимает блокировку, если её всё ещё держит token."""
+    path = lock_path(name)
+    try:
+        with open(path) as file:
+            if file.read() != token:
+                return
+        os.unlink(path)
+    except FileNotFoundError:
+        pass
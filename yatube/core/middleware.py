@@ -0,0 +1,46 @@
+import logging
+import time
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+
+from . import instrumentation
+
+logger = logging.getLogger(__name__)
+
+
+class RequestMetricsMiddleware:
+    """Копит по представлениям число SQL-запросов, время базы и шаблонов
+    и обращения к кешу, пишет в лог медленные запросы."""
+
+    def __init__(self, get_response):
+        if not settings.REQUEST_METRICS:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        started = time.perf_counter()
+        with instrumentation.collect() as metrics:
+            response = self.get_response(request)
+        total_ms = (time.perf_counter() - started) * 1000
+        match = request.resolver_match
+        view_name = match.view_name if match else 'unresolved'
+        instrumentation.record(view_name, metrics, total_ms)
+        response['Server-Timing'] = metrics.server_timing(total_ms)
+        if total_ms >= settings.SLOW_REQUEST_MS:
+            self.log_slow_request(request, view_name, metrics, total_ms)
+        return response
+
+    @staticmethod
+    def log_slow_request(request, view_name, metrics, total_ms):
+        queries = ''.join(
+            f'\n  {duration:.1f} мс: {sql}'
+            for duration, sql in metrics.slowest_queries()
+        )
+        logger.warning(
+            'Медленный запрос %s %s (%s): %.0f мс, SQL %d за %.0f мс, '
+            'шаблоны %.0f мс, кеш %d попаданий, %d промахов%s',
+            request.method, request.get_full_path(), view_name, total_ms,
+            metrics.queries, metrics.db_ms, metrics.render_ms,
+            metrics.cache_hits, metrics.cache_misses, queries
+        )
@@ -0,0 +1,78 @@
+import random
+import threading
+import time
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+
+PRIMARY = 'default'
+PIN_COOKIE = 'pin_primary'
+
+_local = threading.local()
+
+
+def pin_primary():
+    """Направляет чтения до конца запроса в основную базу."""
+    _local.pinned = True
+
+
+def is_pinned():
+    return getattr(_local, 'pinned', False)
+
+
+def unpin():
+    _local.pinned = False
+    _local.wrote = False
+
+
+def is_recent(generation):
+    """Поколение кеша моложе окна, за которое реплика могла не догнать."""
+    age = time.time_ns() - generation
+    return age < settings.REPLICA_STICKY_SECONDS * 10 ** 9
+
+
+class ReplicaRouter:
+    """Чтения в случайную реплику, записи и всё после них в основную базу."""
+
+    def db_for_read(self, model, **hints):
+        if not settings.DATABASE_REPLICAS or is_pinned():
+            return PRIMARY
+        return random.choice(settings.DATABASE_REPLICAS)
+
+    def db_for_write(self, model, **hints):
+        _local.wrote = True
+        pin_primary()
+        return PRIMARY
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db not in settings.DATABASE_REPLICAS
+
+
+class ReplicaPinningMiddleware:
+    """Read-your-writes: после записи клиент REPLICA_STICKY_SECONDS
+    читает из основной базы, пока реплики её догоняют."""
+
+    def __init__(self, get_response):
+        if not settings.DATABASE_REPLICAS:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        unpin()
+        if request.method not in ('GET', 'HEAD') or (
+            PIN_COOKIE in request.COOKIES
+        ):
+            pin_primary()
+        try:
+            response = self.get_response(request)
+            if getattr(_local, 'wrote', False):
+                response.set_cookie(
+                    PIN_COOKIE, '1',
+                    max_age=settings.REPLICA_STICKY_SECONDS, httponly=True
+                )
+        finally:
+            unpin()
+        return response
@@ -0,0 +1,75 @@
+import random
+import threading
+import time
+from contextlib import contextmanager
+from functools import wraps
+
+from django.conf import settings
+from django.db import OperationalError, connection, transaction
+
+
+# Сколько инструкций SQLite между проверками срока query_deadline.
+PROGRESS_INTERVAL = 10000
+
+_local = threading.local()
+
+
+def configure_connection(sender, connection, **kwargs):
+    """Выставляет SQLITE_PRAGMAS каждому новому соединению с SQLite."""
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        for name, value in settings.SQLITE_PRAGMAS.items():
+            cursor.execute(f'PRAGMA {name} = {value}')
+    connection.connection.set_progress_handler(
+        deadline_passed, PROGRESS_INTERVAL
+    )
+
+
+def deadline_passed():
+    deadline = getattr(_local, 'deadline', None)
+    return deadline is not None and time.monotonic() > deadline
+
+
+@contextmanager
+def query_deadline(seconds):
+    """Прерывает запросы потока к SQLite, не успевшие за seconds секунд.
+
+    Прерванный запрос падает с OperationalError «interrupted».
+    """
+    previous = getattr(_local, 'deadline', None)
+    _local.deadline = time.monotonic() + seconds
+    try:
+        yield
+    finally:
+        _local.deadline = previous
+
+
+def is_locked(error):
+    return 'database is locked' in str(error)
+
+
+def retry_on_locked(func):
+    """Повторяет запись в транзакции, если SQLite занят другим писателем.
+
+    busy_timeout не спасает транзакцию, начавшую с чтения: SQLite сразу
+    отвечает «database is locked», и помогает только повтор с начала.
+    Внутри чужой транзакции повтор невозможен, там func вызывается как есть.
+    """
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        if connection.in_atomic_block:
+            return func(*args, **kwargs)
+        for attempt in range(1, settings.DB_RETRY_ATTEMPTS + 1):
+            try:
+                with transaction.atomic():
+                    return func(*args, **kwargs)
+            except OperationalError as error:
+                if not is_locked(error) or (
+                    attempt == settings.DB_RETRY_ATTEMPTS
+                ):
+                    raise
+            time.sleep(
+                settings.DB_RETRY_DELAY * 2 ** attempt * random.random()
+            )
+    return wrapper
@@ -0,0 +1,131 @@
+import mimetypes
+import os
+
+from django.conf import settings
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.core.exceptions import MiddlewareNotUsed
+from django.http import (FileResponse, HttpResponse, HttpResponseNotFound,
+                         HttpResponseNotModified)
+from django.utils.http import http_date
+
+MANIFEST_NAME = 'staticfiles.json'
+# Кодировки в порядке предпочтения: brotli плотнее gzip.
+ENCODINGS = (('br', '.br'), ('gzip', '.gz'))
+
+
+def accepted_encodings(request):
+    accepted = set()
+    for part in request.META.get('HTTP_ACCEPT_ENCODING', '').split(','):
+        coding, _, params = part.partition(';')
+        if params.replace(' ', '') not in ('q=0', 'q=0.0', 'q=0.00'):
+            accepted.add(coding.strip().lower())
+    return accepted
+
+
+class StaticFile:
+    """Файл из STATIC_ROOT с заранее посчитанными заголовками."""
+
+    def __init__(self, path, max_age):
+        self.content_type = (
+            mimetypes.guess_type(path)[0] or 'application/octet-stream'
+        )
+        self.cache_control = f'public, max-age={max_age}'
+        if max_age >= settings.STATIC_MAX_AGE:
+            self.cache_control += ', immutable'
+        self.variants = [(None, self.describe(path))]
+        for encoding, suffix in ENCODINGS:
+            if os.path.isfile(path + suffix):
+                self.variants.insert(
+                    -1, (encoding, self.describe(path + suffix))
+                )
+
+    @staticmethod
+    def describe(path):
+        stat = os.stat(path)
+        return {
+            'path': path,
+            'size': stat.st_size,
+            'etag': f'"{stat.st_mtime_ns:x}-{stat.st_size:x}"',
+            'last_modified': http_date(stat.st_mtime),
+        }
+
+    def choose(self, request):
+        accepted = accepted_encodings(request)
+        for encoding, variant in self.variants:
+            if encoding is None or encoding in accepted:
+                return encoding, variant
+
+    def serve(self, request):
+        encoding, variant = self.choose(request)
+        if request.META.get('HTTP_IF_NONE_MATCH') == variant['etag']:
+            response = HttpResponseNotModified()
+        elif request.method == 'HEAD':
+            response = HttpResponse(content_type=self.content_type)
+        else:
+            response = FileResponse(
+                open(variant['path'], 'rb'), content_type=self.content_type
+            )
+        if response.status_code == 200:
+            response['Content-Length'] = variant['size']
+            if encoding:
+                response['Content-Encoding'] = encoding
+        if len(self.variants) > 1:
+            response['Vary'] = 'Accept-Encoding'
+        response['Cache-Control'] = self.cache_control
+        response['ETag'] = variant['etag']
+        response['Last-Modified'] = variant['last_modified']
+        return response
+
+
+def build_index():
+    """Адрес → StaticFile для всего, что собрал collectstatic.
+
+    Имена с хешем из манифеста кешируются навсегда, остальные и адреса
+    из STATIC_ALIASES — на STATIC_ALIAS_MAX_AGE.
+    """
+    root = settings.STATIC_ROOT
+    hashed = set(getattr(staticfiles_storage, 'hashed_files', {}).values())
+    index = {}
+    for directory, _, filenames in os.walk(root):
+        for filename in filenames:
+            if filename.endswith(('.gz', '.br')) or filename == MANIFEST_NAME:
+                continue
+            path = os.path.join(directory, filename)
+            name = os.path.relpath(path, root).replace(os.sep, '/')
+            max_age = (
+                settings.STATIC_MAX_AGE if name in hashed
+                else settings.STATIC_ALIAS_MAX_AGE
+            )
+            index[settings.STATIC_URL + name] = StaticFile(path, max_age)
+    for url, name in settings.STATIC_ALIASES.items():
+        path = os.path.join(root, name)
+        if os.path.isfile(path):
+            index[url] = StaticFile(path, settings.STATIC_ALIAS_MAX_AGE)
+    return index
+
+
+class StaticFilesMiddleware:
+    """Отдаёт собранную статику, не доходя до сессий и URLconf.
+
+    Список файлов читается при запуске, поэтому после collectstatic
+    процессы нужно перезапустить. Несуществующие файлы под STATIC_URL
+    получают короткий 404 без шаблона.
+    """
+
+    def __init__(self, get_response):
+        if not settings.STATIC_ROOT or not os.path.isdir(
+            settings.STATIC_ROOT
+        ):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.files = build_index()
+
+    def __call__(self, request):
+        static_file = self.files.get(request.path_info)
+        if static_file is None:
+            if request.path_info.startswith(settings.STATIC_URL):
+                return HttpResponseNotFound()
+            return self.get_response(request)
+        if request.method not in ('GET', 'HEAD'):
+            return self.get_response(request)
+        return static_file.serve(request)
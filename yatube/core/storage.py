@@ -0,0 +1,95 @@
+import gzip
+import hashlib
+import os
+import posixpath
+import uuid
+
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage
+from django.core.files.storage import FileSystemStorage
+from django.utils.deconstruct import deconstructible
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+COMPRESSIBLE = ('.css', '.js', '.map', '.svg', '.ico', '.json', '.txt')
+# Сжатая копия, которая выигрывает меньше 5 %, не стоит лишнего файла.
+MIN_RATIO = 0.95
+
+
+@deconstructible
+class ContentAddressedStorage(FileSystemStorage):
+    """Хранит файлы под именем из SHA-256 содержимого.
+
+    Одинаковые загрузки получают одно имя и пишутся на диск один раз, а
+    миниатюры sorl-thumbnail привязаны к имени исходника и тоже общие.
+    Поэтому файл можно удалять, только когда на него никто не ссылается.
+    """
+
+    def get_available_name(self, name, max_length=None):
+        # Имя всё равно заменит хеш содержимого, подбирать свободное незачем.
+        return name
+
+    def _save(self, name, content):
+        digest = hashlib.sha256()
+        for chunk in content.chunks():
+            digest.update(chunk)
+        digest = digest.hexdigest()
+        directory, basename = posixpath.split(name)
+        extension = os.path.splitext(basename)[1].lower()
+        name = posixpath.join(directory, digest[:2], digest + extension)
+        if self.exists(name):
+            try:
+                # Свежее время изменения не даст удалить файл, пока пост
+                # с ним ещё не сохранён, см. posts.images.release_image.
+                os.utime(self.path(name))
+                return name
+            except FileNotFoundError:
+                pass
+        # Запись во временный файл и переименование: параллельная загрузка
+        # того же содержимого просто перезапишет файл тем же самым.
+        temporary = super()._save(f'{name}.{uuid.uuid4().hex}.tmp', content)
+        os.replace(self.path(temporary), self.path(name))
+        return name
+
+
+def compress_file(path):
+    """Кладёт рядом с файлом .gz и, если есть brotli, .br."""
+    with open(path, 'rb') as source:
+        data = source.read()
+    variants = [('.gz', gzip.compress(data, 9, mtime=0))]
+    if brotli is not None:
+        variants.append(('.br', brotli.compress(data)))
+    for suffix, compressed in variants:
+        if len(compressed) < len(data) * MIN_RATIO:
+            with open(path + suffix, 'wb') as target:
+                target.write(compressed)
+
+
+class CompressedManifestStaticFilesStorage(ManifestStaticFilesStorage):
+    """Статика с хешем содержимого в имени и заранее сжатыми копиями.
+
+    Пока collectstatic не запускали и манифеста нет, ссылки ведут на
+    исходные имена, как у StaticFilesStorage.
+    """
+
+    def stored_name(self, name):
+        if not self.hashed_files:
+            return name
+        return super().stored_name(name)
+
+    def post_process(self, paths, dry_run=False, **options):
+        hashed_names = {}
+        for name, hashed_name, processed in super().post_process(
+            paths, dry_run, **options
+        ):
+            if hashed_name and not isinstance(processed, Exception):
+                hashed_names[name] = hashed_name
+            yield name, hashed_name, processed
+        if dry_run:
+            return
+        for name, hashed_name in hashed_names.items():
+            for stored in {name, hashed_name}:
+                if stored.lower().endswith(COMPRESSIBLE):
+                    compress_file(self.path(stored))
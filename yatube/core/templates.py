@@ -0,0 +1,24 @@
+from django.template import TemplateDoesNotExist
+from django.template.backends.django import (DjangoTemplates, Template,
+                                             reraise)
+
+from . import instrumentation
+
+
+class TimedTemplate(Template):
+    def render(self, context=None, request=None):
+        with instrumentation.timed_render():
+            return super().render(context, request)
+
+
+class TimedDjangoTemplates(DjangoTemplates):
+    """DjangoTemplates, который засчитывает рендеринг в метрики запроса."""
+
+    def from_string(self, template_code):
+        return TimedTemplate(self.engine.from_string(template_code), self)
+
+    def get_template(self, template_name):
+        try:
+            return TimedTemplate(self.engine.get_template(template_name), self)
+        except TemplateDoesNotExist as exc:
+            reraise(exc, self)
@@ -0,0 +1,15 @@
+from django import template
+from django.utils.safestring import mark_safe
+
+from core.fragments import is_shell, marker, render_fragment
+
+register = template.Library()
+
+
+@register.simple_tag(takes_context=True)
+def personal(context, name, **params):
+    """Часть страницы для текущего пользователя или метка на её месте."""
+    request = context.request
+    if is_shell(request):
+        return mark_safe(marker(name, params))
+    return render_fragment(request, name, params)
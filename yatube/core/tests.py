@@ -1,6 +1,32 @@
-from django.test import TestCase, Client
+import asyncio
+import gzip
+import os
+import shutil
+import tempfile
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.conf import settings
+from django.core.cache import cache, caches
+from django.core.files.base import ContentFile
+from django.core.management import call_command
+from django.core.wsgi import get_wsgi_application
+from django.db import OperationalError, connection
+from django.http import HttpResponse
+from django.test import (RequestFactory, SimpleTestCase, TestCase,
+                         TransactionTestCase, Client, override_settings)
+from django.urls import reverse
 from http import HTTPStatus
 
+from . import instrumentation, locks, routers
+from .asgi import ASGIHandler, get_environ
+from .cache import LocalTier, SharedFileCache, TwoTierCache
+from .storage import ContentAddressedStorage, brotli
+from .sqlite import query_deadline, retry_on_locked
+
+User = get_user_model()
+
 
 class CoreViewTest(TestCase):
     @classmethod
@@ -16,3 +42,452 @@ class CoreViewTest(TestCase):
         """"Страница /unexisting_page/ ведёт к ошибке 404."""
         response = self.guest_client.get('/unexisting_page/')
         self.assertEqual(response.status_code, HTTPStatus.NOT_FOUND)
+
+
+class RequestMetricsTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        instrumentation.reset()
+        self.guest_client = Client()
+
+    def test_metrics_recorded_per_view(self):
+        """Запросы, время и обращения к кешу копятся по представлениям."""
+        response = self.guest_client.get(reverse('posts:index'))
+        self.assertIn('db;dur=', response['Server-Timing'])
+        self.guest_client.get(reverse('posts:index'))
+        stats = instrumentation.snapshot()['posts:index']
+        self.assertEqual(stats['requests'], 2)
+        self.assertEqual(stats['queries']['count'], 2)
+        self.assertGreater(stats['queries']['mean'], 0)
+        self.assertGreater(stats['render_ms']['mean'], 0)
+        self.assertGreater(stats['cache_hits'], 0)
+        self.assertGreater(stats['cache_misses'], 0)
+
+    @override_settings(SLOW_REQUEST_MS=0)
+    def test_slow_request_logged_with_sql(self):
+        """Медленный запрос попадает в лог вместе с самым долгим SQL."""
+        with self.assertLogs('core.middleware', 'WARNING') as logs:
+            self.guest_client.get(reverse('posts:index'))
+        self.assertIn('posts:index', logs.output[0])
+        self.assertIn('SELECT', logs.output[0])
+
+    def test_metrics_endpoint_for_staff_only(self):
+        """Сводку метрик видит только персонал."""
+        self.guest_client.get(reverse('posts:index'))
+        url = reverse('request_metrics')
+        response = self.guest_client.get(url)
+        self.assertEqual(response.status_code, HTTPStatus.FOUND)
+        staff = User.objects.create_user(username='staff', is_staff=True)
+        self.guest_client.force_login(staff)
+        response = self.guest_client.get(url)
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        self.assertIn('posts:index', response.json()['views'])
+
+
+class SQLiteTuningTest(TransactionTestCase):
+    def test_pragmas_applied_to_connection(self):
+        """Соединение получает настройки из SQLITE_PRAGMAS."""
+        with connection.cursor() as cursor:
+            cursor.execute('PRAGMA busy_timeout')
+            self.assertEqual(cursor.fetchone()[0], 5000)
+            cursor.execute('PRAGMA synchronous')
+            self.assertEqual(cursor.fetchone()[0], 1)
+
+    @override_settings(DB_RETRY_ATTEMPTS=3, DB_RETRY_DELAY=0)
+    def test_retry_on_locked(self):
+        """Запись повторяется при блокировке и не повторяется при иных
+        ошибках."""
+        calls = []
+
+        @retry_on_locked
+        def write(error):
+            calls.append(connection.in_atomic_block)
+            if len(calls) < 3:
+                raise OperationalError(error)
+            return 'ok'
+
+        self.assertEqual(write('database is locked'), 'ok')
+        self.assertEqual(calls, [True, True, True])
+        calls.clear()
+        with self.assertRaises(OperationalError):
+            write('no such table')
+        self.assertEqual(len(calls), 1)
+
+    def test_query_deadline_interrupts_slow_query(self):
+        """Запрос, не уложившийся в срок, прерывается."""
+        with connection.cursor() as cursor:
+            with query_deadline(0):
+                with self.assertRaises(OperationalError):
+                    cursor.execute(
+                        'WITH RECURSIVE n(i) AS (SELECT 1 UNION ALL '
+                        'SELECT i + 1 FROM n WHERE i < 100000000) '
+                        'SELECT count(*) FROM n'
+                    )
+            cursor.execute('SELECT 1')
+            self.assertEqual(cursor.fetchone()[0], 1)
+
+
+class FileLockTest(SimpleTestCase):
+    def test_lock_is_exclusive(self):
+        """Блокировку держит один владелец, чужой токен её не снимает."""
+        token = locks.acquire('test', timeout=30)
+        self.addCleanup(locks.release, 'test', token)
+        self.assertIsNotNone(token)
+        self.assertIsNone(locks.acquire('test', timeout=30))
+        locks.release('test', 'чужой')
+        self.assertIsNone(locks.acquire('test', timeout=30))
+        locks.release('test', token)
+        second = locks.acquire('test', timeout=30)
+        self.addCleanup(locks.release, 'test', second)
+        self.assertIsNotNone(second)
+
+    def test_abandoned_lock_taken_over(self):
+        """Брошенная блокировка старше timeout достаётся новому запросу."""
+        token = locks.acquire('abandoned', timeout=30)
+        self.addCleanup(locks.release, 'abandoned', token)
+        path = locks.lock_path('abandoned')
+        os.utime(path, (0, 0))
+        second = locks.acquire('abandoned', timeout=30)
+        self.addCleanup(locks.release, 'abandoned', second)
+        self.assertIsNotNone(second)
+        self.assertNotEqual(second, token)
+
+
+@override_settings(DATABASE_REPLICAS=['replica1'])
+class ReplicaRoutingTest(SimpleTestCase):
+    def setUp(self):
+        routers.unpin()
+        self.addCleanup(routers.unpin)
+        self.router = routers.ReplicaRouter()
+
+    def test_reads_go_to_replica_until_write(self):
+        """Чтения идут в реплику, а после записи — в основную базу."""
+        self.assertEqual(self.router.db_for_read(User), 'replica1')
+        self.assertEqual(self.router.db_for_write(User), 'default')
+        self.assertEqual(self.router.db_for_read(User), 'default')
+        self.assertFalse(self.router.allow_migrate('replica1', 'posts'))
+
+    def test_writer_pinned_to_primary_by_cookie(self):
+        """После записи клиент получает куку и читает из основной базы."""
+        def write_view(request):
+            self.router.db_for_write(User)
+            return HttpResponse()
+
+        def read_view(request):
+            return HttpResponse(self.router.db_for_read(User))
+
+        factory = RequestFactory()
+        response = routers.ReplicaPinningMiddleware(write_view)(
+            factory.post('/create/')
+        )
+        self.assertIn(routers.PIN_COOKIE, response.cookies)
+        middleware = routers.ReplicaPinningMiddleware(read_view)
+        self.assertEqual(
+            middleware(factory.get('/')).content, b'replica1'
+        )
+        factory.cookies[routers.PIN_COOKIE] = '1'
+        self.assertEqual(middleware(factory.get('/')).content, b'default')
+
+
+class TwoTierCacheTest(SimpleTestCase):
+    def setUp(self):
+        self.location = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.location)
+
+    def make_process_caches(self, **options):
+        """Два экземпляра с разными L1, как в двух процессах, уже
+        прочитавших журнал."""
+        params = {'OPTIONS': {'L1_TIMEOUTS': {'': 30}, **options}}
+        first = TwoTierCache(self.location, params)
+        second = TwoTierCache(self.location, params)
+        first.local, second.local = LocalTier(), LocalTier()
+        first.delete('warm-up')
+        first.poll()
+        second.poll()
+        return first, second
+
+    def test_local_tier_in_front_of_shared(self):
+        """Повторное чтение обслуживает L1, а запись видна другому
+        процессу."""
+        first, second = self.make_process_caches()
+        first.set('key', 1)
+        self.assertEqual(first.get('key'), 1)
+        self.assertEqual(second.get('key'), 1)
+        self.assertEqual(second.get('key'), 1)
+        self.assertEqual(first.stats()['l1_hits'], 1)
+        self.assertEqual(second.stats()['l2_hits'], 1)
+        self.assertEqual(second.stats()['l1_hits'], 1)
+        invalidations = second.stats()['invalidations']
+        first.set('key', 2)
+        self.assertEqual(second.get('key'), 2)
+        self.assertEqual(second.stats()['invalidations'], invalidations + 1)
+        first.delete('key')
+        self.assertIsNone(second.get('key'))
+        second.set('key', 3)
+        first.clear()
+        self.assertIsNone(second.get('key'))
+
+    def test_configured_cache_location_and_limits(self):
+        """Тесты работают в своём каталоге кеша внутри проекта, а общий
+        кеш не чистится на первых сотнях записей."""
+        default = caches['default']
+        self.assertEqual(default.shared._dir, settings.CACHE_DIR)
+        self.assertTrue(settings.CACHE_DIR.endswith('-test'))
+        self.assertTrue(settings.CACHE_DIR.startswith(settings.BASE_DIR))
+        self.assertEqual(default.shared._max_entries, 50000)
+        self.assertEqual(default.shared._cull_frequency, 10)
+
+    def test_shared_tier_culls_periodically(self):
+        """Каталог общего кеша перечисляется не при каждой записи, а при
+        очистке уходит и накопленный с прошлого раза избыток."""
+        shared = SharedFileCache(self.location, {'OPTIONS': {
+            'MAX_ENTRIES': 10, 'CULL_FREQUENCY': 5, 'CULL_INTERVAL': 60,
+        }})
+        with mock.patch.object(
+            shared, '_list_cache_files', wraps=shared._list_cache_files
+        ) as list_files:
+            for number in range(30):
+                shared.set(f'key{number}', number)
+        self.assertEqual(list_files.call_count, 1)
+        self.assertEqual(len(shared._list_cache_files()), 30)
+        os.utime(os.path.join(self.location, 'cull.stamp'), (0, 0))
+        shared.set('last', 1)
+        self.assertEqual(len(shared._list_cache_files()), 8 + 1)
+
+    def test_l1_timeouts_by_prefix_and_size_limit(self):
+        """L1 ограничен по размеру, а ключи с нулевым временем жизни
+        в нём не хранятся."""
+        first, _ = self.make_process_caches(
+            L1_TIMEOUTS={'': 30, 'uncached:': 0}, L1_MAX_ENTRIES=2
+        )
+        first.set('uncached:key', 1)
+        self.assertEqual(first.get('uncached:key'), 1)
+        self.assertEqual(first.stats()['l2_hits'], 1)
+        for key in ('a', 'b', 'c'):
+            first.set(key, key)
+        self.assertEqual(first.stats()['l1_size'], 2)
+
+    def test_rotated_log_clears_local_tier(self):
+        """После ротации журнала другой процесс очищает свой L1."""
+        first, second = self.make_process_caches(LOG_MAX_BYTES=1)
+        first.set('key', 1)
+        second.get('key')
+        first.shared.set('key', 2)
+        first.set('other', 1)
+        self.assertEqual(second.get('key'), 2)
+
+
+class ASGIHandlerTest(SimpleTestCase):
+    def setUp(self):
+        self.handler = ASGIHandler(self.echo_cookies, 2)
+        self.addCleanup(self.handler.executor.shutdown)
+
+    @staticmethod
+    def echo_cookies(environ, start_response):
+        start_response('200 OK', [('Content-Type', 'text/plain')])
+        return [environ['HTTP_COOKIE'].encode(), environ['wsgi.input'].read()]
+
+    def request(self, messages, scope=None):
+        scope = scope or {
+            'type': 'http', 'method': 'POST', 'path': '/',
+            'headers': [(b'cookie', b'a=1'), (b'cookie', b'b=2')],
+        }
+        messages = iter(messages)
+        sent = []
+
+        async def receive():
+            return next(messages)
+
+        async def send(message):
+            sent.append(message)
+
+        asyncio.run(self.handler(scope, receive, send))
+        return sent
+
+    def test_environ_from_scope(self):
+        """Окружение WSGI собирается из scope по правилам PEP 3333."""
+        environ = get_environ({
+            'method': 'GET', 'path': '/пост/', 'query_string': b'a=1',
+            'headers': [(b'content-type', b'text/plain'),
+                        (b'x-forwarded-for', b'10.0.0.1')],
+        }, None)
+        self.assertEqual(environ['PATH_INFO'], '/пост/'.encode().decode(
+            'latin1'
+        ))
+        self.assertEqual(environ['QUERY_STRING'], 'a=1')
+        self.assertEqual(environ['CONTENT_TYPE'], 'text/plain')
+        self.assertEqual(environ['HTTP_X_FORWARDED_FOR'], '10.0.0.1')
+
+    def test_request_is_served_from_thread_pool(self):
+        """Тело запроса по частям доходит до приложения, ответ — клиенту."""
+        sent = self.request([
+            {'type': 'http.request', 'body': b'part1', 'more_body': True},
+            {'type': 'http.request', 'body': b'part2'},
+        ])
+        self.assertEqual(sent[0]['status'], 200)
+        self.assertIn((b'content-type', b'text/plain'), sent[0]['headers'])
+        self.assertEqual(
+            b''.join(message.get('body', b'') for message in sent[1:]),
+            b'a=1; b=2part1part2'
+        )
+        self.assertFalse(sent[-1].get('more_body'))
+
+    def test_streaming_body_sent_chunk_by_chunk(self):
+        """Потоковый ответ уходит клиенту по мере чтения, а не целиком."""
+        events = []
+
+        def stream(environ, start_response):
+            start_response('200 OK', [('Content-Type', 'text/plain')])
+            for number in range(4):
+                events.append(f'read {number}')
+                yield str(number).encode()
+
+        self.handler = ASGIHandler(stream, 2)
+        self.addCleanup(self.handler.executor.shutdown)
+        messages = iter([{'type': 'http.request'}])
+
+        async def receive():
+            return next(messages)
+
+        async def send(message):
+            if message.get('body'):
+                events.append(f'sent {message["body"].decode()}')
+
+        asyncio.run(self.handler(
+            {'type': 'http', 'method': 'GET', 'path': '/'}, receive, send
+        ))
+        self.assertEqual(events, [
+            'read 0', 'read 1', 'sent 0', 'read 2', 'sent 1', 'read 3',
+            'sent 2', 'sent 3',
+        ])
+
+    def test_disconnect_and_lifespan(self):
+        """Ушедший клиент не доходит до приложения, lifespan подтверждается."""
+        self.assertEqual(self.request([{'type': 'http.disconnect'}]), [])
+        sent = self.request(
+            [{'type': 'lifespan.startup'}, {'type': 'lifespan.shutdown'}],
+            scope={'type': 'lifespan'}
+        )
+        self.assertEqual(
+            [message['type'] for message in sent],
+            ['lifespan.startup.complete', 'lifespan.shutdown.complete']
+        )
+
+    def test_django_page_over_asgi(self):
+        """Страница Django отдаётся через ASGI-обработчик."""
+        self.handler = ASGIHandler(get_wsgi_application(), 2)
+        self.addCleanup(self.handler.executor.shutdown)
+        sent = self.request([{'type': 'http.request'}], scope={
+            'type': 'http', 'method': 'GET', 'path': reverse('about:author'),
+            'headers': [(b'host', b'localhost')],
+        })
+        self.assertEqual(sent[0]['status'], HTTPStatus.OK)
+        self.assertIn('Об авторе'.encode(), b''.join(
+            message.get('body', b'') for message in sent[1:]
+        ))
+
+
+class ContentAddressedStorageTest(SimpleTestCase):
+    def setUp(self):
+        location = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, location)
+        self.storage = ContentAddressedStorage(location=location)
+
+    def test_name_is_content_hash(self):
+        """Имя файла — SHA-256 содержимого, одинаковое содержимое
+        хранится один раз."""
+        first = self.storage.save('posts/cat.JPG', ContentFile(b'cat'))
+        second = self.storage.save('posts/other.jpg', ContentFile(b'cat'))
+        self.assertEqual(first, second)
+        self.assertEqual(
+            first,
+            'posts/77/77af778b51abd4a3c51c5ddd97204a9c3ae614ebccb75a606c3b6865'
+            'aed6744e.jpg'
+        )
+        self.assertEqual(self.storage.listdir('posts/77'), ([], [
+            '77af778b51abd4a3c51c5ddd97204a9c3ae614ebccb75a606c3b6865aed6744e'
+            '.jpg'
+        ]))
+        with self.storage.open(first) as file:
+            self.assertEqual(file.read(), b'cat')
+        self.assertNotEqual(
+            self.storage.save('posts/dog.jpg', ContentFile(b'dog')), first
+        )
+
+
+class StaticFilesTest(SimpleTestCase):
+    def setUp(self):
+        source = tempfile.mkdtemp()
+        root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, source)
+        self.addCleanup(shutil.rmtree, root)
+        self.css = 'body { background: url("../img/fav/fav.ico"); }\n' * 50
+        for name, content in (
+            ('css/site.css', self.css.encode()),
+            ('img/fav/fav.ico', b'icon' * 100),
+            ('img/logo.png', b'png'),
+        ):
+            os.makedirs(os.path.dirname(os.path.join(source, name)),
+                        exist_ok=True)
+            with open(os.path.join(source, name), 'wb') as file:
+                file.write(content)
+        overrides = override_settings(
+            STATICFILES_DIRS=[source], STATIC_ROOT=root,
+            STATICFILES_STORAGE=(
+                'core.storage.CompressedManifestStaticFilesStorage'
+            ),
+        )
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+        call_command('collectstatic', interactive=False, verbosity=0)
+        self.client = Client()
+
+    def test_collected_files_hashed_and_compressed(self):
+        """collectstatic даёт имена с хешем и сжатые копии текстовых
+        файлов, картинки не сжимаются."""
+        url = staticfiles_storage.url('css/site.css')
+        self.assertRegex(url, r'^/static/css/site\.[0-9a-f]{12}\.css$')
+        path = staticfiles_storage.path(url[len('/static/'):])
+        with gzip.open(path + '.gz') as file:
+            self.assertIn(b'fav.', file.read())
+        self.assertEqual(os.path.exists(path + '.br'), brotli is not None)
+        self.assertFalse(os.path.exists(
+            staticfiles_storage.path(
+                staticfiles_storage.stored_name('img/logo.png')
+            ) + '.gz'
+        ))
+
+    def test_hashed_file_served_immutable_and_compressed(self):
+        """Файл с хешем отдаётся сжатым и с вечным кешированием."""
+        url = staticfiles_storage.url('css/site.css')
+        response = self.client.get(url, HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(response['Content-Type'], 'text/css')
+        self.assertEqual(response['Vary'], 'Accept-Encoding')
+        self.assertIn('immutable', response['Cache-Control'])
+        body = gzip.decompress(b''.join(response.streaming_content))
+        self.assertEqual(body.decode().count('fav.'), 50)
+        self.assertNotIn('fav.ico', body.decode())
+        response.close()
+        plain = self.client.get(url, HTTP_ACCEPT_ENCODING='gzip;q=0')
+        self.assertFalse(plain.has_header('Content-Encoding'))
+        plain.close()
+        not_modified = self.client.get(
+            url, HTTP_ACCEPT_ENCODING='gzip',
+            HTTP_IF_NONE_MATCH=response['ETag']
+        )
+        self.assertEqual(
+            not_modified.status_code, HTTPStatus.NOT_MODIFIED
+        )
+
+    def test_favicon_and_missing_files_skip_views(self):
+        """Фавикон отдаётся из статики, пропавший файл — короткий 404
+        без шаблона."""
+        response = self.client.get('/favicon.ico')
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        self.assertNotIn('immutable', response['Cache-Control'])
+        response.close()
+        response = self.client.get('/static/css/missing.css')
+        self.assertEqual(response.status_code, HTTPStatus.NOT_FOUND)
+        self.assertEqual(response.templates, [])
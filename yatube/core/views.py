@@ -1,5 +1,11 @@
+from django.conf import settings
+from django.contrib.admin.views.decorators import staff_member_required
+from django.core.cache import caches
+from django.http import JsonResponse
 from django.shortcuts import render
 
+from . import instrumentation
+
 
 def page_not_found(request, exception):
     return render(request, 'core/404.html', {'path': request.path}, status=404)
@@ -11,3 +17,18 @@ def csrf_failure(request, reason=''):
 
 def permission_denied(request, exception):
     return render(request, 'core/403.html', status=403)
+
+
+@staff_member_required
+def request_metrics(request):
+    """Гистограммы метрик по представлениям, накопленные этим процессом."""
+    return JsonResponse(
+        {
+            'views': instrumentation.snapshot(),
+            'caches': {
+                alias: caches[alias].stats() for alias in settings.CACHES
+                if hasattr(caches[alias], 'stats')
+            },
+        },
+        json_dumps_params={'ensure_ascii': False}
+    )
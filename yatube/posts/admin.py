@@ -1,9 +1,24 @@
 from django.contrib import admin
 
+from .counters import recount_posts, recount_users
 from .models import Post, Group, Comment, Follow
 
 
-class PostAdmin(admin.ModelAdmin):
+class CounterAdminMixin:
+    """Пересчитывает счётчики, если в админке сменили связанный объект."""
+    counted_fields = {}
+
+    def save_model(self, request, obj, form, change):
+        super().save_model(request, obj, form, change)
+        if not change:
+            return
+        for field, recount in self.counted_fields.items():
+            if field in form.changed_data:
+                old_value = form.initial.get(field)
+                recount([old_value, getattr(obj, f'{field}_id')])
+
+
+class PostAdmin(CounterAdminMixin, admin.ModelAdmin):
     list_display = (
         'pk',
         'text',
@@ -15,6 +30,7 @@ class PostAdmin(admin.ModelAdmin):
     search_fields = ('text',)
     list_filter = ('pub_date',)
     empty_value_display = '-пусто-'
+    counted_fields = {'author': recount_users}
 
 
 class GroupAdmin(admin.ModelAdmin):
@@ -29,7 +45,7 @@ class GroupAdmin(admin.ModelAdmin):
     empty_value_display = '-пусто-'
 
 
-class CommentAdmin(admin.ModelAdmin):
+class CommentAdmin(CounterAdminMixin, admin.ModelAdmin):
     list_display = (
         'pk',
         'text',
@@ -40,9 +56,10 @@ class CommentAdmin(admin.ModelAdmin):
     search_fields = ('text',)
     list_filter = ('created',)
     empty_value_display = '-пусто-'
+    counted_fields = {'post': recount_posts}
 
 
-class FollowAdmin(admin.ModelAdmin):
+class FollowAdmin(CounterAdminMixin, admin.ModelAdmin):
     list_display = (
         'pk',
         'author',
@@ -50,6 +67,7 @@ class FollowAdmin(admin.ModelAdmin):
     )
     search_fields = ('user',)
     empty_value_display = '-пусто-'
+    counted_fields = {'author': recount_users, 'user': recount_users}
 
 
 admin.site.register(Post, PostAdmin)
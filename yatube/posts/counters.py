@@ -0,0 +1,60 @@
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce, Greatest
+
+from .models import Comment, Follow, Post, User, UserStats
+
+
+def count_related(model, field, outer='pk'):
+    """Подзапрос с числом объектов model, ссылающихся на внешнюю строку."""
+    return Coalesce(
+        Subquery(
+            model.objects.filter(**{field: OuterRef(outer)}).order_by(
+            ).values(field).annotate(count=Count('pk')).values('count')
+        ),
+        0
+    )
+
+
+def change_user_counters(user_id, **deltas):
+    """Сдвигает счётчики пользователя, например posts_count=1."""
+    UserStats.objects.filter(user_id=user_id).update(**{
+        field: Greatest(F(field) + delta, 0)
+        for field, delta in deltas.items()
+    })
+
+
+def change_comments_count(post_id, delta):
+    Post.objects.filter(pk=post_id).update(
+        comments_count=Greatest(F('comments_count') + delta, 0)
+    )
+
+
+def recount_users(user_ids=None):
+    """Пересчитывает счётчики пользователей (всех, если user_ids=None)."""
+    users = User.objects.all()
+    if user_ids is not None:
+        users = users.filter(pk__in=user_ids)
+    UserStats.objects.bulk_create(
+        [
+            UserStats(user_id=pk) for pk in users.filter(
+                stats__isnull=True
+            ).values_list('pk', flat=True).iterator()
+        ],
+        ignore_conflicts=True
+    )
+    stats = UserStats.objects.all()
+    if user_ids is not None:
+        stats = stats.filter(user_id__in=user_ids)
+    return stats.update(
+        posts_count=count_related(Post, 'author', 'user'),
+        followers_count=count_related(Follow, 'author', 'user'),
+        following_count=count_related(Follow, 'user', 'user'),
+    )
+
+
+def recount_posts(post_ids=None):
+    """Пересчитывает число комментариев постов (всех, если post_ids=None)."""
+    posts = Post.objects.all()
+    if post_ids is not None:
+        posts = posts.filter(pk__in=post_ids)
+    return posts.update(comments_count=count_related(Comment, 'post'))
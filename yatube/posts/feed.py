@@ -0,0 +1,201 @@
+import time
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import Count, Exists, F, OuterRef, Q
+
+from core.sqlite import retry_on_locked
+
+from .models import FeedItem, Follow, Post, User, UserStats
+
+# Ключ сортировки и курсора ленты: дата из записи ленты, а не из поста.
+FEED_DATE = 'feed_pub_date'
+
+
+def fan_out_post(post):
+    """Раскладывает новый пост по лентам подписчиков автора."""
+    followers = list(
+        Follow.objects.filter(author_id=post.author_id).values_list(
+            'user_id', flat=True
+        )[:settings.FEED_FANOUT_LIMIT + 1]
+    )
+    if len(followers) > settings.FEED_FANOUT_LIMIT:
+        return
+    FeedItem.objects.bulk_create(
+        [
+            FeedItem(user_id=user_id, post=post, pub_date=post.pub_date)
+            for user_id in followers
+        ],
+        ignore_conflicts=True
+    )
+
+
+def backfill_feed(user_id, author_id):
+    """Добавляет в ленту свежие посты автора при подписке на него."""
+    posts = Post.objects.filter(author_id=author_id).order_by(
+        '-pub_date'
+    ).values_list('pk', 'pub_date')[:settings.FEED_BACKFILL_LIMIT]
+    FeedItem.objects.bulk_create(
+        [
+            FeedItem(user_id=user_id, post_id=pk, pub_date=pub_date)
+            for pk, pub_date in posts
+        ],
+        ignore_conflicts=True
+    )
+
+
+def backfill_skipped_posts(author_id):
+    """Раскладывает посты, пропущенные, пока автор был выше лимита.
+
+    Вызывается, когда подписчиков снова FEED_FANOUT_LIMIT: посты автора
+    больше не подмешиваются при чтении. Пропущенными считаются посты
+    новее последнего разложенного по лентам.
+    """
+    posts = Post.objects.filter(author_id=author_id).annotate(
+        fanned_out=Exists(FeedItem.objects.filter(post=OuterRef('pk')))
+    ).order_by('-pub_date').values_list(
+        'pk', 'pub_date', 'fanned_out'
+    )[:settings.FEED_BACKFILL_LIMIT]
+    skipped = []
+    for pk, pub_date, fanned_out in posts:
+        if fanned_out:
+            break
+        skipped.append((pk, pub_date))
+    if not skipped:
+        return
+    FeedItem.objects.bulk_create(
+        [
+            FeedItem(user_id=user_id, post_id=pk, pub_date=pub_date)
+            for user_id in Follow.objects.filter(
+                author_id=author_id
+            ).values_list('user_id', flat=True)
+            for pk, pub_date in skipped
+        ],
+        batch_size=1000,
+        ignore_conflicts=True
+    )
+
+
+def trim_feed(user_id, author_id):
+    """Убирает из ленты посты автора после отписки."""
+    FeedItem.objects.filter(
+        user_id=user_id, post__author_id=author_id
+    ).delete()
+
+
+def get_fanout_skipped_authors(user):
+    """Авторы из подписок, чьи посты не раскладываются по лентам."""
+    return list(
+        User.objects.filter(
+            following__user=user,
+            stats__followers_count__gt=settings.FEED_FANOUT_LIMIT
+        ).values_list('pk', flat=True)
+    )
+
+
+def get_follow_feed(user):
+    """Посты ленты подписок по убыванию FEED_DATE.
+
+    Обычно это диапазон индекса feed_user_pub_date_idx, который читается
+    по порядку и обрывается на размере страницы. Посты популярных авторов
+    подмешиваются при чтении, и тогда сортировать приходится по дате поста.
+    """
+    skipped_authors = get_fanout_skipped_authors(user)
+    if not skipped_authors:
+        posts = Post.objects.filter(feed_items__user=user).annotate(
+            **{FEED_DATE: F('feed_items__pub_date')}
+        )
+    else:
+        posts = Post.objects.filter(
+            Q(pk__in=FeedItem.objects.filter(user=user).values('post'))
+            | Q(author__in=skipped_authors)
+        ).annotate(**{FEED_DATE: F('pub_date')})
+    return posts.order_by(f'-{FEED_DATE}', '-pk')
+
+
+def rebuild_feeds(author_ids=None, chunk_rows=10000, pause=0.1):
+    """Заново собирает ленты по постам авторов (всех, если author_ids=None).
+
+    Нужна после массовой загрузки данных мимо сигналов: у каждой подписки
+    в ленте оказываются последние FEED_BACKFILL_LIMIT постов автора.
+    Ленты пишутся частями примерно по chunk_rows строк, каждая своей
+    транзакцией, а между частями pause секунд: иначе ждущие блокировку
+    писатели сайта не успевают вклиниться и падают по busy_timeout.
+    """
+    if author_ids is None:
+        author_ids = User.objects.values_list('pk', flat=True)
+    total = 0
+    for number, (authors, users) in enumerate(
+        feed_chunks(sorted(set(author_ids)), chunk_rows)
+    ):
+        if number:
+            time.sleep(pause)
+        total += rebuild_author_feeds(authors, users)
+    return total
+
+
+def feed_chunks(author_ids, chunk_rows, max_authors=500):
+    """Части пересборки: (авторы, подписчики или None — все подписчики).
+
+    Автор, чьи ленты не помещаются в chunk_rows, делится по подписчикам.
+    """
+    followers = dict(
+        Follow.objects.values_list('author_id').annotate(
+            count=Count('pk')
+        ).order_by()
+    )
+    per_user = settings.FEED_BACKFILL_LIMIT
+    authors, rows = [], 0
+    for author_id in author_ids:
+        count = followers.get(author_id, 0)
+        weight = count * per_user if count <= settings.FEED_FANOUT_LIMIT else 0
+        if weight > chunk_rows:
+            user_ids = list(Follow.objects.filter(
+                author_id=author_id
+            ).order_by('user_id').values_list('user_id', flat=True))
+            step = max(chunk_rows // per_user, 1)
+            for start in range(0, len(user_ids), step):
+                yield [author_id], user_ids[start:start + step]
+            continue
+        if authors and (
+            rows + weight > chunk_rows or len(authors) == max_authors
+        ):
+            yield authors, None
+            authors, rows = [], 0
+        authors.append(author_id)
+        rows += weight
+    if authors:
+        yield authors, None
+
+
+@retry_on_locked
+def rebuild_author_feeds(author_ids, user_ids=None):
+    feed_table = FeedItem._meta.db_table
+    post_table = Post._meta.db_table
+    authors = ', '.join(['%s'] * len(author_ids))
+    users_filter, users_params = '', []
+    if user_ids is not None:
+        users_filter = f'AND user_id IN ({", ".join(["%s"] * len(user_ids))})'
+        users_params = list(user_ids)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'DELETE FROM {feed_table} WHERE post_id IN ('
+            f'SELECT id FROM {post_table} WHERE author_id IN ({authors})) '
+            f'{users_filter}',
+            [*author_ids, *users_params]
+        )
+        cursor.execute(
+            f'INSERT INTO {feed_table} (user_id, post_id, pub_date) '
+            f'SELECT f.user_id, p.id, p.pub_date '
+            f'FROM {Follow._meta.db_table} f '
+            f'JOIN {UserStats._meta.db_table} s ON s.user_id = f.author_id '
+            f'JOIN (SELECT id, author_id, pub_date, ROW_NUMBER() OVER ('
+            f'PARTITION BY author_id ORDER BY pub_date DESC) AS position '
+            f'FROM {post_table} WHERE author_id IN ({authors})) p '
+            f'ON p.author_id = f.author_id '
+            f'WHERE p.position <= %s AND s.followers_count <= %s '
+            f'{users_filter.replace("user_id", "f.user_id")}',
+            [*author_ids, settings.FEED_BACKFILL_LIMIT,
+             settings.FEED_FANOUT_LIMIT, *users_params]
+        )
+        return cursor.rowcount
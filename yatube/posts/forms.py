@@ -1,5 +1,7 @@
 from django import forms
+from django.core.files.uploadedfile import UploadedFile
 
+from .images import check_image, process_image
 from .models import Post, Comment
 
 
@@ -9,6 +11,13 @@ class PostForm(forms.ModelForm):
         model = Post
         fields = ('text', 'group', 'image')
 
+    def clean_image(self):
+        image = self.cleaned_data['image']
+        if isinstance(image, UploadedFile):
+            check_image(image)
+            image = process_image(image)
+        return image
+
 
 class CommentForm(forms.ModelForm):
 
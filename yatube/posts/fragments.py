@@ -0,0 +1,29 @@
+from core.fragments import fragment
+
+from .forms import CommentForm
+from .models import Follow
+
+
+@fragment('includes/switcher.html')
+def switcher(request):
+    return {}
+
+
+@fragment('includes/follow_button.html')
+def follow_button(request, username, author_id):
+    following = request.user.is_authenticated and Follow.objects.filter(
+        user=request.user, author_id=author_id
+    ).exists()
+    return {
+        'username': username,
+        'following': following,
+    }
+
+
+@fragment('includes/post_actions.html')
+def post_actions(request, post_id, author_id):
+    return {
+        'post_id': post_id,
+        'is_author': request.user.pk == int(author_id),
+        'form': CommentForm(),
+    }
@@ -0,0 +1,113 @@
+import logging
+import math
+import os
+import time
+from io import BytesIO
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.files.base import ContentFile
+from PIL import Image, ImageOps, features
+from sorl.thumbnail import delete
+from sorl.thumbnail.images import ImageFile
+
+from .models import Post
+
+logger = logging.getLogger(__name__)
+
+EXTENSIONS = {'JPEG': 'jpg', 'PNG': 'png', 'WEBP': 'webp'}
+
+
+def check_image(upload):
+    """Проверяет размер файла и картинки по заголовку, не декодируя её."""
+    if upload.size > settings.POST_IMAGE_MAX_BYTES:
+        raise ValidationError(
+            'Файл больше %(limit)d МБ.',
+            params={'limit': settings.POST_IMAGE_MAX_BYTES // 2 ** 20},
+        )
+    upload.seek(0)
+    with Image.open(upload) as image:
+        width, height = image.size
+    if width * height > settings.POST_IMAGE_MAX_PIXELS:
+        raise ValidationError(
+            'Картинка %(width)d×%(height)d слишком большая.',
+            params={'width': width, 'height': height},
+        )
+
+
+def get_format(has_alpha):
+    if settings.POST_IMAGE_FORMAT == 'WEBP' and features.check('webp'):
+        return 'WEBP'
+    return 'PNG' if has_alpha else 'JPEG'
+
+
+def get_save_options(image_format):
+    quality = settings.POST_IMAGE_QUALITY
+    return {
+        'JPEG': {'quality': quality, 'optimize': True, 'progressive': True},
+        'PNG': {'optimize': True},
+        'WEBP': {'quality': quality, 'method': 4},
+    }[image_format]
+
+
+def process_image(upload):
+    """Пересохраняет загрузку без метаданных, уменьшив до POST_IMAGE_MAX_SIDE.
+
+    Миниатюры потом строятся из уменьшенного оригинала, и sorl-thumbnail
+    не декодирует многомегабайтный файл при каждом промахе кеша.
+    """
+    max_side = settings.POST_IMAGE_MAX_SIDE
+    upload.seek(0)
+    with Image.open(upload) as original:
+        # JPEG сразу декодируется в масштабе 1/2–1/8, если он намного больше.
+        ratio = max_side / max(original.size)
+        if ratio < 1:
+            original.draft('RGB', tuple(
+                math.ceil(side * ratio) for side in original.size
+            ))
+        image = ImageOps.exif_transpose(original)
+        has_alpha = (
+            image.mode in ('RGBA', 'LA', 'PA')
+            or 'transparency' in image.info
+        )
+        image_format = get_format(has_alpha)
+        image = image.convert(
+            'RGBA' if has_alpha and image_format != 'JPEG' else 'RGB'
+        )
+    image.thumbnail((max_side, max_side), Image.LANCZOS)
+    output = BytesIO()
+    image.save(output, image_format, **get_save_options(image_format))
+    name = os.path.splitext(os.path.basename(upload.name))[0]
+    return ContentFile(
+        output.getvalue(), name=f'{name}.{EXTENSIONS[image_format]}'
+    )
+
+
+def touched_recently(storage, name):
+    try:
+        modified = os.path.getmtime(storage.path(name))
+    except FileNotFoundError:
+        return False
+    return time.time() - modified < settings.POST_IMAGE_RELEASE_GRACE
+
+
+def release_image(name):
+    """Удаляет картинку и её миниатюры, если на неё не ссылается ни один пост.
+
+    Хранилище картинок адресуется содержимым, так что один файл может
+    принадлежать нескольким постам; число ссылок считает индекс по image.
+    Файл, который недавно загружали, остаётся: пост с ним может быть ещё
+    не сохранён. Такие файлы позже убирает команда purge_images.
+    """
+    if not name or Post.objects.filter(image=name).exists():
+        return False
+    storage = Post._meta.get_field('image').storage
+    try:
+        if touched_recently(storage, name):
+            return False
+        delete(ImageFile(name, storage))
+    except Exception:
+        # Пост уже удалён, а лишний файл не повод отвечать ошибкой.
+        logger.exception('Не удалось удалить картинку %s', name)
+        return False
+    return True
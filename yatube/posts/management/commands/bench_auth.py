@@ -0,0 +1,92 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http import HTTPStatus
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test import Client
+from django.urls import reverse
+
+from posts.models import User
+from users.hashers import reset_pool
+
+PREFIX = 'bench_auth_'
+PASSWORD = 'Kx9!bench-password'
+
+
+def login(number):
+    response = Client().post(reverse('users:login'), {
+        'username': f'{PREFIX}user', 'password': PASSWORD,
+    })
+    return response.status_code
+
+
+def signup(number):
+    response = Client().post(reverse('users:signup'), {
+        'username': f'{PREFIX}{time.monotonic_ns()}_{number}',
+        'email': 'bench@example.com',
+        'password1': PASSWORD, 'password2': PASSWORD,
+    })
+    return response.status_code
+
+
+class Command(BaseCommand):
+    help = (
+        'Замеряет входы и регистрации в секунду при разном числе потоков '
+        'хеширования паролей. Созданные пользователи удаляются.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers', type=int, nargs='+', default=[1, 2, 4],
+            help='Значения PASSWORD_HASHING_WORKERS для сравнения.'
+        )
+        parser.add_argument(
+            '--clients', type=int, default=settings.PASSWORD_HASHING_SLOTS,
+            help='По умолчанию по числу мест в пуле, чтобы не было отказов.'
+        )
+        parser.add_argument('--requests', type=int, default=64)
+
+    def handle(self, *args, **options):
+        workers = settings.PASSWORD_HASHING_WORKERS
+        User.objects.create_user(f'{PREFIX}user', password=PASSWORD)
+        try:
+            for count in options['workers']:
+                settings.PASSWORD_HASHING_WORKERS = count
+                reset_pool()
+                for name, action in (('входов', login),
+                                     ('регистраций', signup)):
+                    self.measure(count, name, action, options)
+        finally:
+            settings.PASSWORD_HASHING_WORKERS = workers
+            reset_pool()
+            User.objects.filter(username__startswith=PREFIX).delete()
+
+    def measure(self, workers, name, action, options):
+        started = time.perf_counter()
+        statuses = self.run(action, options['clients'], options['requests'])
+        elapsed = time.perf_counter() - started
+        done = statuses.count(HTTPStatus.FOUND)
+        busy = statuses.count(HTTPStatus.SERVICE_UNAVAILABLE)
+        # Отказы 503 приходят сразу и в пропускную способность не входят.
+        rate = done / elapsed
+        self.stdout.write(
+            f'{workers} потоков: {rate:.1f} {name}/с, '
+            f'{rate / workers:.1f} на поток, успешных {done}, '
+            f'отказов 503: {busy} ({busy / elapsed:.1f}/с)'
+        )
+
+    @staticmethod
+    def run(action, clients, requests):
+        if clients == 1:
+            return [action(number) for number in range(requests)]
+
+        def serve(number):
+            try:
+                return action(number)
+            finally:
+                connection.close()
+
+        with ThreadPoolExecutor(clients) as executor:
+            return list(executor.map(serve, range(requests)))
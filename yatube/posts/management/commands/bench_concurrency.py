@@ -0,0 +1,97 @@
+import multiprocessing
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import OperationalError, connection, connections
+
+from core.sqlite import retry_on_locked
+from posts.models import Comment, Post, User
+
+JOURNAL_MODES = ('DELETE', 'WAL')
+
+
+@retry_on_locked
+def write_comment(post_id, author_id):
+    Comment.objects.create(
+        post_id=post_id, author_id=author_id, text='Комментарий для замера'
+    )
+
+
+def run_worker(seed, operations, write_ratio, post_ids, user_ids):
+    """Смесь чтений главной страницы и комментариев, как у живого сайта."""
+    rng = random.Random(seed)
+    failures = 0
+    started = time.perf_counter()
+    for _ in range(operations):
+        try:
+            if rng.random() < write_ratio:
+                write_comment(rng.choice(post_ids), rng.choice(user_ids))
+            else:
+                list(Post.objects.for_list()[:10])
+        except OperationalError:
+            failures += 1
+    elapsed = time.perf_counter() - started
+    connection.close()
+    return failures, elapsed
+
+
+class Command(BaseCommand):
+    help = (
+        'Сравнивает пропускную способность SQLite в разных режимах журнала '
+        'при параллельных чтениях и записях из нескольких процессов. '
+        'Добавленные комментарии остаются в базе.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=8)
+        parser.add_argument('--operations', type=int, default=200)
+        parser.add_argument('--write-ratio', type=float, default=0.2)
+        parser.add_argument(
+            '--journal-modes', nargs='+', default=JOURNAL_MODES,
+            choices=JOURNAL_MODES
+        )
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'sqlite':
+            raise CommandError('Замер рассчитан на SQLite.')
+        post_ids = list(Post.objects.values_list('pk', flat=True)[:1000])
+        user_ids = list(User.objects.values_list('pk', flat=True)[:1000])
+        if not post_ids:
+            raise CommandError('База пуста, сначала запустите seed_posts.')
+        pragmas = settings.SQLITE_PRAGMAS
+        try:
+            for mode in options['journal_modes']:
+                settings.SQLITE_PRAGMAS = {**pragmas, 'journal_mode': mode}
+                self.measure(mode, options, post_ids, user_ids)
+        finally:
+            settings.SQLITE_PRAGMAS = pragmas
+            connections.close_all()
+
+    def measure(self, mode, options, post_ids, user_ids):
+        # Режим журнала хранится в файле базы; соединения переоткрываются,
+        # чтобы процессы-наследники получили новые PRAGMA.
+        connections.close_all()
+        connection.ensure_connection()
+        connections.close_all()
+        workers = options['workers']
+        operations = options['operations']
+        started = time.perf_counter()
+        with ProcessPoolExecutor(
+            workers, mp_context=multiprocessing.get_context('fork')
+        ) as executor:
+            results = list(executor.map(
+                run_worker, range(workers), [operations] * workers,
+                [options['write_ratio']] * workers,
+                [post_ids] * workers, [user_ids] * workers,
+            ))
+        elapsed = time.perf_counter() - started
+        failures = sum(failed for failed, _ in results)
+        total = workers * operations
+        self.stdout.write(
+            f'{mode}: {total / elapsed:.0f} операций/с, '
+            f'{workers} процессов по {operations} операций, '
+            f'ошибок блокировки {failures}'
+        )
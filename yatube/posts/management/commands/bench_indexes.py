@@ -0,0 +1,118 @@
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.db.models import Count
+
+from posts.feed import get_follow_feed
+from posts.models import Comment, Follow, Post, User
+
+COMPOSITE_INDEXES = (
+    'post_author_pub_date_idx',
+    'post_group_pub_date_idx',
+    'post_pub_date_id_idx',
+    'comment_post_created_idx',
+    'follow_author_user_idx',
+)
+
+
+class Command(BaseCommand):
+    help = (
+        'Показывает план и время запросов лент с составными индексами '
+        'и без них. Базу лучше заранее заполнить командой seed_posts.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeat', type=int, default=20)
+        parser.add_argument('--page', type=int, default=50)
+
+    def handle(self, *args, **options):
+        self.repeat = options['repeat']
+        queries = self.get_queries(options['page'])
+        with_indexes = self.measure(queries, 'with indexes')
+        with transaction.atomic():
+            with connection.cursor() as cursor:
+                for name in COMPOSITE_INDEXES:
+                    cursor.execute(
+                        f'DROP INDEX {connection.ops.quote_name(name)}'
+                    )
+            without_indexes = self.measure(queries, 'without indexes')
+            transaction.set_rollback(True)
+        for name in queries:
+            self.stdout.write(self.style.MIGRATE_HEADING(name))
+            for label, results in (
+                ('с индексами', with_indexes),
+                ('без индексов', without_indexes),
+            ):
+                median, plan = results[name]
+                self.stdout.write(f'  {label}: {median:.2f} мс')
+                for line in plan:
+                    self.stdout.write(f'    {line}')
+
+    def get_queries(self, page):
+        """Запросы в том виде, в каком их выполняют представления."""
+        offset = page * 10
+        author = User.objects.annotate(
+            num_posts=Count('posts')
+        ).order_by('-num_posts').first()
+        reader = User.objects.annotate(
+            num_follows=Count('follower')
+        ).order_by('-num_follows').first()
+        group_id = Post.objects.exclude(group=None).values_list(
+            'group', flat=True
+        ).first()
+        post_id = Comment.objects.values('post').annotate(
+            num_comments=Count('pk')
+        ).order_by('-num_comments').values_list('post', flat=True).first()
+        queries = {
+            'index': Post.objects.for_list()[offset:offset + 10],
+            'group_posts': Post.objects.filter(
+                group_id=group_id
+            ).for_list()[offset:offset + 10],
+            'profile': Post.objects.filter(
+                author=author
+            ).for_list()[offset:offset + 10],
+            'post_detail comments': Comment.objects.filter(
+                post_id=post_id
+            ).for_list(),
+            'fan-out followers': Follow.objects.filter(
+                author=author
+            ).values_list('user_id', flat=True),
+        }
+        if reader is not None:
+            queries['follow_index'] = get_follow_feed(
+                reader
+            ).for_list()[offset:offset + 10]
+        return queries
+
+    def measure(self, queries, label):
+        """Медиана времени и план запросов.
+
+        Метка в комментарии делает текст запроса уникальным, иначе
+        драйвер SQLite вернёт план из кеша подготовленных выражений.
+        """
+        results = {}
+        for name, queryset in queries.items():
+            sql, params = queryset.query.sql_with_params()
+            sql = f'{sql} /* {label} */'
+            with connection.cursor() as cursor:
+                cursor.execute(self.explain_prefix() + sql, params)
+                plan = [
+                    ' '.join(str(column) for column in row)
+                    for row in cursor.fetchall()
+                ]
+                timings = []
+                for _ in range(self.repeat):
+                    started = time.perf_counter()
+                    cursor.execute(sql, params)
+                    cursor.fetchall()
+                    timings.append((time.perf_counter() - started) * 1000)
+            results[name] = (statistics.median(timings), plan)
+        return results
+
+    @staticmethod
+    def explain_prefix():
+        if connection.vendor == 'sqlite':
+            return 'EXPLAIN QUERY PLAN '
+        return 'EXPLAIN '
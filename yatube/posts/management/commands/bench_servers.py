@@ -0,0 +1,108 @@
+import asyncio
+import io
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.core.wsgi import get_wsgi_application
+
+from core.asgi import ASGIHandler, call_wsgi, get_environ
+
+from .bench_views import percentile
+
+
+def make_scope(path):
+    return {
+        'type': 'http',
+        'http_version': '1.1',
+        'method': 'GET',
+        'scheme': 'http',
+        'path': path,
+        'query_string': b'',
+        'headers': [(b'host', b'localhost')],
+        'server': ('localhost', 80),
+        'client': ('127.0.0.1', 50000),
+    }
+
+
+def run_wsgi(application, scope, connections, threads, delay):
+    """Синхронный воркер держит поток, пока клиент читает ответ."""
+    def serve(_):
+        started = time.perf_counter()
+        status, _, _ = call_wsgi(
+            application, get_environ(scope, io.BytesIO())
+        )
+        time.sleep(delay)
+        return status, time.perf_counter() - started
+
+    with ThreadPoolExecutor(threads) as executor:
+        return list(executor.map(serve, range(connections)))
+
+
+def run_asgi(application, scope, connections, threads, delay):
+    """Тот же пул потоков, но отдачу ответа ждёт цикл событий."""
+    handler = ASGIHandler(application, threads)
+
+    async def serve():
+        started = time.perf_counter()
+        response = {}
+
+        async def receive():
+            return {'type': 'http.request', 'body': b''}
+
+        async def send(message):
+            if message['type'] == 'http.response.start':
+                response['status'] = message['status']
+            elif not message.get('more_body'):
+                await asyncio.sleep(delay)
+
+        await handler(scope, receive, send)
+        return response['status'], time.perf_counter() - started
+
+    async def serve_all():
+        return await asyncio.gather(*(serve() for _ in range(connections)))
+
+    try:
+        return asyncio.run(serve_all())
+    finally:
+        handler.executor.shutdown()
+
+
+class Command(BaseCommand):
+    help = (
+        'Сравнивает пропускную способность WSGI и ASGI при медленных '
+        'клиентах. Оба варианта получают одинаковый пул потоков, клиенты '
+        'читают ответ с задержкой --client-delay.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--connections', type=int, default=200)
+        parser.add_argument(
+            '--threads', type=int, default=settings.ASGI_THREADS
+        )
+        parser.add_argument(
+            '--client-delay', type=float, default=50,
+            help='Сколько миллисекунд клиент читает ответ.'
+        )
+        parser.add_argument('--path', default='/')
+
+    def handle(self, *args, **options):
+        application = get_wsgi_application()
+        scope = make_scope(options['path'])
+        call_wsgi(application, get_environ(scope, io.BytesIO()))
+        for name, run in (('WSGI', run_wsgi), ('ASGI', run_asgi)):
+            started = time.perf_counter()
+            results = run(
+                application, scope, options['connections'],
+                options['threads'], options['client_delay'] / 1000
+            )
+            elapsed = time.perf_counter() - started
+            latencies = [latency * 1000 for _, latency in results]
+            failed = sum(status != 200 for status, _ in results)
+            self.stdout.write(
+                f'{name}: {len(results) / elapsed:.0f} запросов/с, '
+                f'p50 {percentile(latencies, 50):.1f} мс, '
+                f'p99 {percentile(latencies, 99):.1f} мс, '
+                f'ответов не 200: {failed}'
+            )
@@ -0,0 +1,215 @@
+import json
+import math
+import os
+import statistics
+import time
+import tracemalloc
+from datetime import datetime
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.db.models import Count
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from posts.models import Comment, Group, Post, User
+
+PERCENTILES = (50, 90, 99)
+
+
+def percentile(values, percent):
+    """Перцентиль по методу ближайшего ранга."""
+    values = sorted(values)
+    rank = math.ceil(percent / 100 * len(values))
+    return values[max(rank, 1) - 1]
+
+
+class Command(BaseCommand):
+    help = (
+        'Измеряет время ответа, число запросов и память представлений '
+        'на текущей базе и сохраняет результаты для сравнения прогонов. '
+        'Базу лучше заранее заполнить командой seed_posts.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=50)
+        parser.add_argument('--page', type=int, default=1)
+        parser.add_argument(
+            '--guest', action='store_true',
+            help='Читать страницы без входа, то есть через кеш страниц.'
+        )
+        parser.add_argument(
+            '--output-dir',
+            default=os.path.join(settings.BASE_DIR, 'benchmarks'),
+        )
+        parser.add_argument(
+            '--compare', metavar='FILE',
+            help='Результаты прошлого прогона для сравнения.'
+        )
+        parser.add_argument(
+            '--threshold', type=float, default=10,
+            help='Замедление в процентах, которое считается регрессией.'
+        )
+
+    def handle(self, *args, **options):
+        baseline = None
+        if options['compare']:
+            with open(options['compare'], encoding='utf-8') as file:
+                baseline = json.load(file)
+        self.requests = options['requests']
+        self.client = Client(HTTP_HOST='localhost')
+        reader = User.objects.annotate(
+            num_follows=Count('follower')
+        ).order_by('-num_follows').first()
+        if reader is None:
+            raise CommandError('База пуста, сначала запустите seed_posts.')
+        if not options['guest']:
+            self.client.force_login(reader)
+        results = {}
+        try:
+            for name, method, url, data in self.get_scenarios(
+                reader, options['page'], options['guest']
+            ):
+                results[name] = self.measure(method, url, data)
+                self.stdout.write(self.format_result(name, results[name]))
+        finally:
+            self.client.logout()
+        report = {
+            'started': datetime.now().isoformat(timespec='seconds'),
+            'guest': options['guest'],
+            'requests': self.requests,
+            'database': {
+                'vendor': connection.vendor,
+                'users': User.objects.count(),
+                'posts': Post.objects.count(),
+                'comments': Comment.objects.count(),
+            },
+            'views': results,
+        }
+        path = self.save(report, options['output_dir'])
+        self.stdout.write(self.style.SUCCESS(f'Результаты записаны в {path}'))
+        if baseline is not None:
+            self.compare(baseline, report, options['threshold'])
+
+    def get_scenarios(self, reader, page, guest):
+        """Страницы с самыми тяжёлыми данными: популярный автор и т. п."""
+        author = User.objects.annotate(
+            num_posts=Count('posts')
+        ).order_by('-num_posts').first()
+        group = Group.objects.annotate(
+            num_posts=Count('posts')
+        ).order_by('-num_posts').first()
+        post_id = Post.objects.annotate(
+            num_comments=Count('comments')
+        ).order_by('-num_comments').values_list('pk', flat=True).first()
+        query = f'?page={page}'
+        scenarios = [
+            ('index', 'get', reverse('posts:index') + query, None),
+            ('profile', 'get', reverse(
+                'posts:profile', args=[author.username]
+            ) + query, None),
+        ]
+        if group is not None:
+            scenarios.append(('group_posts', 'get', reverse(
+                'posts:group_list', args=[group.slug]
+            ) + query, None))
+        if post_id is not None:
+            scenarios.append(('post_detail', 'get', reverse(
+                'posts:post_detail', args=[post_id]
+            ), None))
+        if guest:
+            return scenarios
+        scenarios += [
+            ('follow_index', 'get', reverse('posts:follow_index') + query,
+             None),
+            ('post_create', 'post', reverse('posts:post_create'),
+             {'text': 'Пост для замера', 'group': group.pk if group else ''}),
+            ('profile_follow', 'get', reverse(
+                'posts:profile_follow', args=[author.username]
+            ), None),
+        ]
+        if post_id is not None:
+            scenarios.append(('add_comment', 'post', reverse(
+                'posts:add_comment', args=[post_id]
+            ), {'text': 'Комментарий для замера'}))
+        return scenarios
+
+    def request(self, method, url, data):
+        """Запрос внутри отменяемой транзакции, чтобы замер не менял базу."""
+        with transaction.atomic():
+            response = getattr(self.client, method)(url, data)
+            transaction.set_rollback(True)
+        return response
+
+    def measure(self, method, url, data):
+        response = self.request(method, url, data)
+        timings = []
+        queries = []
+        for _ in range(self.requests):
+            with CaptureQueriesContext(connection) as context:
+                started = time.perf_counter()
+                self.request(method, url, data)
+                timings.append((time.perf_counter() - started) * 1000)
+            queries.append(sum(
+                query['sql'] != 'BEGIN' for query in context.captured_queries
+            ))
+        tracemalloc.start()
+        self.request(method, url, data)
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        result = {
+            'url': url,
+            'status': response.status_code,
+            'mean_ms': statistics.mean(timings),
+            'queries': max(queries),
+            'peak_kib': peak / 1024,
+        }
+        for percent in PERCENTILES:
+            result[f'p{percent}_ms'] = percentile(timings, percent)
+        return result
+
+    @staticmethod
+    def format_result(name, result):
+        timings = ', '.join(
+            f'p{percent} {result[f"p{percent}_ms"]:.2f}'
+            for percent in PERCENTILES
+        )
+        return (
+            f'{name}: {timings} мс, запросов {result["queries"]}, '
+            f'память {result["peak_kib"]:.0f} КиБ, код {result["status"]}'
+        )
+
+    @staticmethod
+    def save(report, output_dir):
+        os.makedirs(output_dir, exist_ok=True)
+        name = datetime.now().strftime('%Y%m%d-%H%M%S')
+        if report['guest']:
+            name += '-guest'
+        path = os.path.join(output_dir, f'{name}.json')
+        with open(path, 'w', encoding='utf-8') as file:
+            json.dump(report, file, ensure_ascii=False, indent=2)
+        return path
+
+    def compare(self, baseline, report, threshold):
+        """Печатает изменения p50, p90 и числа запросов к прошлому прогону."""
+        self.stdout.write(self.style.MIGRATE_HEADING(
+            f'Сравнение с прогоном {baseline["started"]}'
+        ))
+        for name, result in report['views'].items():
+            before = baseline['views'].get(name)
+            if before is None:
+                continue
+            changes = []
+            regression = result['queries'] > before['queries']
+            for metric in ('p50_ms', 'p90_ms'):
+                change = (result[metric] / before[metric] - 1) * 100
+                regression = regression or change > threshold
+                changes.append(f'{metric[:3]} {change:+.0f}%')
+            changes.append(
+                f'запросов {before["queries"]} → {result["queries"]}'
+            )
+            line = f'{name}: {", ".join(changes)}'
+            style = self.style.ERROR if regression else self.style.SUCCESS
+            self.stdout.write(style(line))
@@ -0,0 +1,31 @@
+import sys
+
+from django.core.management.base import BaseCommand
+
+from posts.transfer import (FIELDS, FORMATS, export_records,
+                            guess_format, write_records)
+
+
+class Command(BaseCommand):
+    help = (
+        'Потоково выгружает группы, посты, комментарии или подписки '
+        'в JSON Lines или CSV.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('kind', choices=FIELDS)
+        parser.add_argument('path', help='Файл или - для stdout.')
+        parser.add_argument('--format', choices=FORMATS)
+
+    def handle(self, *args, **options):
+        kind, path = options['kind'], options['path']
+        file_format = options['format'] or guess_format(path)
+        records = export_records(kind)
+        if path == '-':
+            write_records(sys.stdout, file_format, FIELDS[kind], records)
+            return
+        with open(path, 'w', newline='', encoding='utf-8') as file:
+            count = write_records(file, file_format, FIELDS[kind], records)
+        self.stdout.write(self.style.SUCCESS(
+            f'Выгружено записей: {count}.'
+        ))
@@ -0,0 +1,71 @@
+import os
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from posts.transfer import (FIELDS, FORMATS, Importer, guess_format,
+                            load_post_ids, read_records, save_post_ids)
+
+
+class Command(BaseCommand):
+    help = (
+        'Потоково загружает группы, посты, комментарии или подписки '
+        'из JSON Lines или CSV. Грузите в порядке groups, posts, '
+        'comments, follows: посты ссылаются на группы, комментарии '
+        'на id постов. Посты получают новые id, их соответствие id из '
+        'выгрузки сохраняется в --post-ids и нужно для комментариев. '
+        'Каждая пачка пишется своей транзакцией; прерванную загрузку '
+        'постов можно повторить с тем же --post-ids. '
+        'Недостающие авторы создаются без пароля.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('kind', choices=FIELDS)
+        parser.add_argument('path', help='Файл или - для stdin.')
+        parser.add_argument('--format', choices=FORMATS)
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument(
+            '--pause', type=float, default=0.1,
+            help='Пауза между пачками в секундах, чтобы успевали писатели.'
+        )
+        parser.add_argument(
+            '--post-ids',
+            help='JSON с id постов: обязателен для posts и comments, '
+                 'пишется при загрузке posts, читается при загрузке comments.'
+        )
+
+    def handle(self, *args, **options):
+        kind, path = options['kind'], options['path']
+        file_format = options['format'] or guess_format(path)
+        importer = Importer(
+            kind, options['batch_size'], self.read_post_ids(kind, options),
+            options['pause']
+        )
+        try:
+            if path == '-':
+                count = importer.run(read_records(sys.stdin, file_format))
+            else:
+                with open(path, newline='', encoding='utf-8') as file:
+                    count = importer.run(read_records(file, file_format))
+        finally:
+            # Пачки уже в базе, даже если загрузка прервалась.
+            if kind == 'posts':
+                with open(options['post_ids'], 'w', encoding='utf-8') as file:
+                    save_post_ids(file, importer.post_ids)
+        self.stdout.write(self.style.SUCCESS(
+            f'Загружено записей: {count}, пропущено: {importer.skipped}.'
+        ))
+
+    @staticmethod
+    def read_post_ids(kind, options):
+        if kind not in ('posts', 'comments'):
+            return None
+        if not options['post_ids']:
+            raise CommandError(
+                'Для постов и комментариев нужен --post-ids: файл, куда '
+                'загрузка постов пишет новые id постов.'
+            )
+        if kind == 'posts' and not os.path.exists(options['post_ids']):
+            return {}
+        with open(options['post_ids'], encoding='utf-8') as file:
+            return load_post_ids(file)
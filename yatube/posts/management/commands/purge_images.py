@@ -0,0 +1,45 @@
+import os
+
+from django.core.management.base import BaseCommand
+
+from posts.images import release_image
+from posts.models import Post
+
+
+def walk(storage, directory):
+    directories, files = storage.listdir(directory)
+    for name in files:
+        yield f'{directory}/{name}'
+    for name in directories:
+        yield from walk(storage, f'{directory}/{name}')
+
+
+class Command(BaseCommand):
+    help = (
+        'Удаляет картинки постов, на которые не ссылается ни один пост, '
+        'кроме загруженных за последние POST_IMAGE_RELEASE_GRACE секунд.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        field = Post._meta.get_field('image')
+        directory = field.upload_to.rstrip('/')
+        total = 0
+        if os.path.isdir(field.storage.path(directory)):
+            names = [
+                name for name in walk(field.storage, directory)
+                if not name.endswith('.tmp')
+            ]
+            for start in range(0, len(names), options['batch_size']):
+                batch = names[start:start + options['batch_size']]
+                used = set(Post.objects.filter(
+                    image__in=batch
+                ).values_list('image', flat=True))
+                total += sum(
+                    release_image(name) for name in batch if name not in used
+                )
+        self.stdout.write(self.style.SUCCESS(
+            f'Удалено картинок без постов: {total}.'
+        ))
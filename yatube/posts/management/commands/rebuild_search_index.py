@@ -0,0 +1,28 @@
+import itertools
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from posts.models import Post
+from posts.search import get_backend
+
+BATCH_SIZE = 1000
+
+
+class Command(BaseCommand):
+    help = 'Перестраивает поисковый индекс постов.'
+
+    def handle(self, *args, **options):
+        backend = get_backend()
+        with transaction.atomic():
+            backend.clear()
+            posts = Post.objects.only('text').order_by().iterator()
+            count = 0
+            for batch in iter(
+                lambda: list(itertools.islice(posts, BATCH_SIZE)), []
+            ):
+                backend.index_posts(batch)
+                count += len(batch)
+        self.stdout.write(self.style.SUCCESS(
+            f'Проиндексировано постов: {count}.'
+        ))
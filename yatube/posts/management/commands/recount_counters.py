@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from posts.counters import recount_posts, recount_users
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает счётчики постов, комментариев и подписок.'
+
+    def handle(self, *args, **options):
+        users = recount_users()
+        posts = recount_posts()
+        self.stdout.write(self.style.SUCCESS(
+            f'Пересчитаны счётчики: пользователей {users}, постов {posts}.'
+        ))
@@ -0,0 +1,162 @@
+import itertools
+import random
+
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from faker import Faker
+
+from posts.counters import recount_posts, recount_users
+from posts.feed import rebuild_feeds
+from posts.models import Comment, Follow, Group, Post, User
+
+
+def zipf_weights(size, exponent=1.1):
+    """Накопленные веса распределения Ципфа: первые элементы популярнее."""
+    return list(itertools.accumulate(
+        1 / (rank ** exponent) for rank in range(1, size + 1)
+    ))
+
+
+class Command(BaseCommand):
+    help = (
+        'Заполняет базу синтетическими пользователями, постами, '
+        'комментариями и подписками для замеров производительности.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--groups', type=int, default=20)
+        parser.add_argument('--posts', type=int, default=10000)
+        parser.add_argument('--comments', type=int, default=20000)
+        parser.add_argument(
+            '--follows', type=int, default=20,
+            help='Среднее число подписок на пользователя.'
+        )
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument(
+            '--prefix', default='bench',
+            help='Префикс имён пользователей и адресов групп.'
+        )
+
+    def handle(self, *args, **options):
+        self.rng = random.Random(options['seed'])
+        self.batch_size = options['batch_size']
+        fake = Faker('ru_RU')
+        fake.seed_instance(options['seed'])
+        self.sentences = [fake.sentence(nb_words=12) for _ in range(1000)]
+        self.names = [
+            (fake.first_name(), fake.last_name()) for _ in range(500)
+        ]
+        prefix = options['prefix']
+        with transaction.atomic():
+            user_ids = self.create_users(prefix, options['users'])
+            group_ids = self.create_groups(prefix, options['groups'])
+            post_ids = self.create_posts(
+                user_ids, group_ids, options['posts']
+            )
+            self.create_comments(user_ids, post_ids, options['comments'])
+            self.create_follows(user_ids, options['follows'])
+        recount_users()
+        recount_posts()
+        feed_items = rebuild_feeds()
+        self.stdout.write(self.style.SUCCESS(
+            f'Создано: пользователей {len(user_ids)}, групп '
+            f'{len(group_ids)}, постов {len(post_ids)}, записей в лентах '
+            f'{feed_items}. Для поиска запустите rebuild_search_index.'
+        ))
+
+    def bulk_create(self, model, objects):
+        for batch in iter(
+            lambda: list(itertools.islice(objects, self.batch_size)), []
+        ):
+            model.objects.bulk_create(batch, ignore_conflicts=True)
+
+    def create_users(self, prefix, count):
+        password = make_password(None)
+        start = User.objects.filter(username__startswith=prefix).count()
+        self.bulk_create(User, (
+            User(
+                username=f'{prefix}_{number}',
+                first_name=first_name,
+                last_name=last_name,
+                password=password,
+            )
+            for number, (first_name, last_name) in zip(
+                range(start, start + count), itertools.cycle(self.names)
+            )
+        ))
+        return list(User.objects.filter(
+            username__startswith=f'{prefix}_'
+        ).order_by('pk').values_list('pk', flat=True))
+
+    def create_groups(self, prefix, count):
+        self.bulk_create(Group, (
+            Group(
+                title=f'Группа {number}',
+                slug=f'{prefix}-{number}',
+                description=self.rng.choice(self.sentences),
+            )
+            for number in range(count)
+        ))
+        return list(Group.objects.filter(
+            slug__startswith=f'{prefix}-'
+        ).order_by('pk').values_list('pk', flat=True))
+
+    def create_posts(self, user_ids, group_ids, count):
+        weights = zipf_weights(len(user_ids))
+        last_pk = Post.objects.order_by('-pk').values_list(
+            'pk', flat=True
+        ).first() or 0
+        self.bulk_create(Post, (
+            Post(
+                author_id=self.rng.choices(user_ids, cum_weights=weights)[0],
+                group_id=(
+                    self.rng.choice(group_ids)
+                    if group_ids and self.rng.random() < 0.7 else None
+                ),
+                text=' '.join(self.rng.sample(self.sentences, 3)),
+            )
+            for _ in range(count)
+        ))
+        return list(Post.objects.filter(pk__gt=last_pk).order_by(
+            'pk'
+        ).values_list('pk', flat=True))
+
+    def create_comments(self, user_ids, post_ids, count):
+        if not post_ids:
+            return
+        hot_posts = post_ids[-1000:]
+        hot_weights = zipf_weights(len(hot_posts))
+        self.bulk_create(Comment, (
+            Comment(
+                author_id=self.rng.choice(user_ids),
+                post_id=(
+                    self.rng.choices(hot_posts, cum_weights=hot_weights)[0]
+                    if self.rng.random() < 0.5
+                    else self.rng.choice(post_ids)
+                ),
+                text=self.rng.choice(self.sentences),
+            )
+            for _ in range(count)
+        ))
+
+    def create_follows(self, user_ids, average):
+        """Подписки по степенному закону: у немногих авторов их много."""
+        weights = zipf_weights(len(user_ids))
+
+        def follows():
+            for user_id in user_ids:
+                count = min(
+                    int(self.rng.paretovariate(1.5) * average / 3),
+                    len(user_ids) - 1
+                )
+                authors = set(self.rng.choices(
+                    user_ids, cum_weights=weights, k=count
+                ))
+                authors.discard(user_id)
+                for author_id in authors:
+                    yield Follow(user_id=user_id, author_id=author_id)
+
+        self.bulk_create(Follow, follows())
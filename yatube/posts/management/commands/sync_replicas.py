@@ -0,0 +1,51 @@
+import sqlite3
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+
+class Command(BaseCommand):
+    help = (
+        'Копирует основную базу SQLite в реплики из DATABASE_REPLICAS. '
+        'С --interval повторяет копирование, имитируя отстающую репликацию.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--interval', type=float,
+            help='Пауза между копированиями в секундах.'
+        )
+
+    def handle(self, *args, **options):
+        if not settings.DATABASE_REPLICAS:
+            raise CommandError(
+                'Реплик нет: задайте переменную окружения YATUBE_REPLICAS.'
+            )
+        primary = settings.DATABASES['default']
+        if primary['ENGINE'] != 'django.db.backends.sqlite3':
+            raise CommandError('Копирование реплик рассчитано на SQLite.')
+        while True:
+            started = time.perf_counter()
+            self.sync(primary['NAME'])
+            self.stdout.write(
+                f'Реплики обновлены за '
+                f'{(time.perf_counter() - started) * 1000:.0f} мс.'
+            )
+            if options['interval'] is None:
+                return
+            time.sleep(options['interval'])
+
+    @staticmethod
+    def sync(primary_name):
+        """Онлайн-копия через backup API: писатели основной базы не ждут."""
+        source = sqlite3.connect(primary_name)
+        try:
+            for alias in settings.DATABASE_REPLICAS:
+                target = sqlite3.connect(settings.DATABASES[alias]['NAME'])
+                try:
+                    source.backup(target)
+                finally:
+                    target.close()
+        finally:
+            source.close()
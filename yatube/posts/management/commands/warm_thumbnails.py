@@ -0,0 +1,42 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from posts.models import Post
+from posts.thumbnails import (generate_thumbnails_in_worker,
+                              generate_thumbnails_safely)
+
+
+class Command(BaseCommand):
+    help = 'Создаёт недостающие миниатюры картинок постов.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=os.cpu_count(),
+            help='Число процессов, по умолчанию по числу ядер.'
+        )
+
+    def handle(self, *args, **options):
+        image_names = Post.objects.exclude(image='').values_list(
+            'image', flat=True
+        ).order_by().distinct()
+        if options['workers'] > 1:
+            image_names = list(image_names)
+            connections.close_all()
+            with ProcessPoolExecutor(options['workers']) as pool:
+                results = list(pool.map(
+                    generate_thumbnails_in_worker, image_names, chunksize=64
+                ))
+        else:
+            results = [
+                generate_thumbnails_safely(image_name)
+                for image_name in image_names.iterator()
+            ]
+        self.stdout.write(self.style.SUCCESS(
+            f'Обработано картинок: {len(results)}, '
+            f'с ошибками: {results.count(False)}.'
+        ))
@@ -0,0 +1,58 @@
+# Generated by Django 2.2.16 on 2026-10-18 16:39
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def backfill_feeds(apps, schema_editor):
+    Follow = apps.get_model('posts', 'Follow')
+    Post = apps.get_model('posts', 'Post')
+    FeedItem = apps.get_model('posts', 'FeedItem')
+    db = schema_editor.connection.alias
+    for follow in Follow.objects.using(db).iterator():
+        posts = Post.objects.using(db).filter(
+            author_id=follow.author_id
+        ).order_by('-pub_date')[:settings.FEED_BACKFILL_LIMIT]
+        FeedItem.objects.using(db).bulk_create(
+            [
+                FeedItem(
+                    user_id=follow.user_id,
+                    post_id=post.pk,
+                    pub_date=post.pub_date
+                ) for post in posts
+            ],
+            ignore_conflicts=True
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('posts', '0005_auto_20230209_0826'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FeedItem',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('pub_date', models.DateTimeField(verbose_name='Дата публикации')),
+                ('post', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='feed_items', to='posts.Post', verbose_name='Пост')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='feed_items', to=settings.AUTH_USER_MODEL, verbose_name='Читатель')),
+            ],
+            options={
+                'verbose_name_plural': 'Ленты подписок',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='feeditem',
+            index=models.Index(fields=['user', '-pub_date'], name='feed_user_pub_date_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='feeditem',
+            constraint=models.UniqueConstraint(fields=('user', 'post'), name='unique_feed_item'),
+        ),
+        migrations.RunPython(backfill_feeds, migrations.RunPython.noop),
+    ]
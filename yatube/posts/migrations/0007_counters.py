@@ -0,0 +1,68 @@
+# Generated by Django 2.2.16 on 2026-10-18 16:41
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def count_related(model, field, outer='pk'):
+    return Coalesce(
+        Subquery(
+            model.objects.filter(**{field: OuterRef(outer)}).order_by(
+            ).values(field).annotate(count=Count('pk')).values('count')
+        ),
+        0
+    )
+
+
+def fill_counters(apps, schema_editor):
+    User = apps.get_model(*settings.AUTH_USER_MODEL.split('.'))
+    Post = apps.get_model('posts', 'Post')
+    Comment = apps.get_model('posts', 'Comment')
+    Follow = apps.get_model('posts', 'Follow')
+    UserStats = apps.get_model('posts', 'UserStats')
+    db = schema_editor.connection.alias
+    UserStats.objects.using(db).bulk_create(
+        [UserStats(user_id=pk) for pk in User.objects.using(
+            db
+        ).values_list('pk', flat=True).iterator()]
+    )
+    UserStats.objects.using(db).update(
+        posts_count=count_related(Post, 'author', 'user'),
+        followers_count=count_related(Follow, 'author', 'user'),
+        following_count=count_related(Follow, 'user', 'user'),
+    )
+    Post.objects.using(db).update(
+        comments_count=count_related(Comment, 'post')
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0011_update_proxy_permissions'),
+        ('posts', '0006_feeditem'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UserStats',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='stats', serialize=False, to=settings.AUTH_USER_MODEL, verbose_name='Пользователь')),
+                ('posts_count', models.PositiveIntegerField(default=0, editable=False, verbose_name='Число постов')),
+                ('followers_count', models.PositiveIntegerField(default=0, editable=False, verbose_name='Число подписчиков')),
+                ('following_count', models.PositiveIntegerField(default=0, editable=False, verbose_name='Число подписок')),
+            ],
+            options={
+                'verbose_name_plural': 'Счётчики пользователей',
+            },
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='comments_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Число комментариев'),
+        ),
+        migrations.RunPython(fill_counters, migrations.RunPython.noop),
+    ]
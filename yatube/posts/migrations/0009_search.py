@@ -0,0 +1,75 @@
+# Generated by Django 2.2.16 on 2026-10-18 16:48
+
+import itertools
+from collections import Counter
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+from posts.search import FTS_TABLE, tokenize
+
+BATCH_SIZE = 1000
+
+
+def create_fts_table(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    schema_editor.execute(
+        'CREATE VIRTUAL TABLE IF NOT EXISTS posts_search USING fts5('
+        "body, tokenize='unicode61 remove_diacritics 2')"
+    )
+
+
+def index_existing_posts(apps, schema_editor):
+    Post = apps.get_model('posts', 'Post')
+    SearchTerm = apps.get_model('posts', 'SearchTerm')
+    db = schema_editor.connection.alias
+    posts = Post.objects.using(db).only('text').order_by().iterator()
+    for batch in iter(lambda: list(itertools.islice(posts, BATCH_SIZE)), []):
+        if schema_editor.connection.vendor == 'sqlite':
+            with schema_editor.connection.cursor() as cursor:
+                cursor.executemany(
+                    f'INSERT INTO {FTS_TABLE} (rowid, body) VALUES (%s, %s)',
+                    [(post.pk, ' '.join(tokenize(post.text)))
+                     for post in batch]
+                )
+            continue
+        SearchTerm.objects.using(db).bulk_create([
+            SearchTerm(term=term[:64], post_id=post.pk, frequency=frequency)
+            for post in batch
+            for term, frequency in Counter(tokenize(post.text)).items()
+        ])
+
+
+def drop_fts_table(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    schema_editor.execute('DROP TABLE IF EXISTS posts_search')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0008_post_updated'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SearchTerm',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('term', models.CharField(max_length=64, verbose_name='Основа')),
+                ('frequency', models.PositiveIntegerField(default=1, verbose_name='Число вхождений')),
+                ('post', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='search_terms', to='posts.Post', verbose_name='Пост')),
+            ],
+            options={
+                'verbose_name_plural': 'Поисковый индекс',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='searchterm',
+            index=models.Index(fields=['term', 'post'], name='search_term_post_idx'),
+        ),
+        migrations.RunPython(create_fts_table, drop_fts_table),
+        migrations.RunPython(index_existing_posts, migrations.RunPython.noop),
+    ]
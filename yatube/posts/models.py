@@ -3,6 +3,7 @@ from django.contrib.auth import get_user_model
 
 from yatube.settings import LEN_POST
 from core.models import PubDatedModel
+from core.storage import ContentAddressedStorage
 
 
 User = get_user_model()
@@ -20,6 +21,26 @@ class Group(models.Model):
         verbose_name_plural = 'Группы'
 
 
+class PostQuerySet(models.QuerySet):
+    def for_list(self):
+        """Только то, что выводят карточки постов в лентах."""
+        return self.select_related('author', 'group').only(
+            'text',
+            'pub_date',
+            'updated',
+            'image',
+            'author',
+            'group',
+            'author__username',
+            'author__first_name',
+            'author__last_name',
+            'group__slug',
+        )
+
+    def for_detail(self):
+        return self.select_related('author__stats', 'group')
+
+
 class Post(PubDatedModel):
     text = models.TextField(verbose_name='Текст поста',
                             help_text='Введите текст поста')
@@ -41,15 +62,54 @@ class Post(PubDatedModel):
     image = models.ImageField(
         verbose_name='Картинка',
         upload_to='posts/',
-        blank=True
+        storage=ContentAddressedStorage(),
+        blank=True,
+        db_index=True
+    )
+    comments_count = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name='Число комментариев'
+    )
+    updated = models.DateTimeField(
+        auto_now=True,
+        verbose_name='Дата изменения'
     )
 
+    objects = PostQuerySet.as_manager()
+
     def __str__(self) -> str:
         return self.text[:LEN_POST]
 
     class Meta():
         ordering = ['-pub_date']
         verbose_name_plural = 'Посты'
+        indexes = [
+            models.Index(
+                fields=['author', '-pub_date'],
+                name='post_author_pub_date_idx'
+            ),
+            models.Index(
+                fields=['group', '-pub_date'],
+                name='post_group_pub_date_idx'
+            ),
+            models.Index(
+                fields=['-pub_date', '-id'],
+                name='post_pub_date_id_idx'
+            ),
+        ]
+
+
+class CommentQuerySet(models.QuerySet):
+    def for_list(self):
+        """Комментарии вместе с именами авторов."""
+        return self.select_related('author').only(
+            'text',
+            'created',
+            'post',
+            'author',
+            'author__username',
+        )
 
 
 class Comment(models.Model):
@@ -72,11 +132,20 @@ class Comment(models.Model):
     created = models.DateTimeField(auto_now_add=True,
                                    verbose_name='Дата публикации')
 
+    objects = CommentQuerySet.as_manager()
+
     def __str__(self) -> str:
         return self.text
 
     class Meta:
+        ordering = ['created']
         verbose_name_plural = 'Комментарии'
+        indexes = [
+            models.Index(
+                fields=['post', 'created'],
+                name='comment_post_created_idx'
+            ),
+        ]
 
 
 class Follow(models.Model):
@@ -98,6 +167,12 @@ class Follow(models.Model):
 
     class Meta:
         verbose_name_plural = 'Подписки'
+        indexes = [
+            models.Index(
+                fields=['author', 'user'],
+                name='follow_author_user_idx'
+            ),
+        ]
         constraints = [
             models.UniqueConstraint(
                 fields=['user', 'author'],
@@ -108,3 +183,96 @@ class Follow(models.Model):
                 name='check_not_self_follow'
             )
         ]
+
+
+class FeedItem(models.Model):
+    """Запись материализованной ленты подписок пользователя."""
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='feed_items',
+        verbose_name='Читатель'
+    )
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name='feed_items',
+        verbose_name='Пост'
+    )
+    pub_date = models.DateTimeField(verbose_name='Дата публикации')
+
+    def __str__(self) -> str:
+        return f'Пост {self.post_id} в ленте {self.user_id}'
+
+    class Meta:
+        verbose_name_plural = 'Ленты подписок'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'post'],
+                name='unique_feed_item'
+            ),
+        ]
+        indexes = [
+            models.Index(
+                fields=['user', '-pub_date'],
+                name='feed_user_pub_date_idx'
+            ),
+        ]
+
+
+class UserStats(models.Model):
+    """Счётчики пользователя, чтобы не считать их на каждой странице."""
+    user = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='stats',
+        verbose_name='Пользователь'
+    )
+    posts_count = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name='Число постов'
+    )
+    followers_count = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name='Число подписчиков'
+    )
+    following_count = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name='Число подписок'
+    )
+
+    def __str__(self) -> str:
+        return f'Счётчики {self.user_id}'
+
+    class Meta:
+        verbose_name_plural = 'Счётчики пользователей'
+
+
+class SearchTerm(models.Model):
+    """Запись обратного индекса поиска: основа слова и пост с ней."""
+    TERM_LENGTH = 64
+
+    term = models.CharField(max_length=TERM_LENGTH, verbose_name='Основа')
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name='search_terms',
+        verbose_name='Пост'
+    )
+    frequency = models.PositiveIntegerField(
+        default=1,
+        verbose_name='Число вхождений'
+    )
+
+    def __str__(self) -> str:
+        return self.term
+
+    class Meta:
+        verbose_name_plural = 'Поисковый индекс'
+        indexes = [
+            models.Index(fields=['term', 'post'], name='search_term_post_idx'),
+        ]
@@ -0,0 +1,256 @@
+import hashlib
+import logging
+import math
+import random
+import time
+from contextlib import nullcontext
+from functools import wraps
+from http import HTTPStatus
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DatabaseError
+from django.utils.cache import add_never_cache_headers
+
+from core import locks
+from core.fragments import render_shell, splice
+from core.routers import is_recent, pin_primary
+from core.sqlite import query_deadline
+
+from .models import Post
+
+POSTS_SCOPE = 'posts'
+LOCK_POLL_INTERVAL = 0.05
+
+logger = logging.getLogger(__name__)
+
+
+def group_scope(slug):
+    return f'group:{slug}'
+
+
+def author_scope(username):
+    return f'author:{username}'
+
+
+def post_scope(post_id):
+    return f'post:{post_id}'
+
+
+def generation_key(scope):
+    return f'generation:{scope}'
+
+
+def post_author_key(post_id):
+    return f'post_author:{post_id}'
+
+
+def bump(*scopes):
+    """Сбрасывает кеш страниц, зависящих от scopes, сменой поколения."""
+    generation = time.time_ns()
+    cache.set_many(
+        {generation_key(scope): generation for scope in scopes}, None
+    )
+
+
+def get_post_scopes(post):
+    """Все страницы, на которых выводится пост."""
+    scopes = [POSTS_SCOPE, post_scope(post.pk)]
+    scopes.append(author_scope(post.author.username))
+    if post.group_id:
+        scopes.append(group_scope(post.group.slug))
+    return scopes
+
+
+def get_saved_post_scopes(post_id):
+    """Страницы, на которых пост выводится в сохранённом в базе виде."""
+    saved = Post.objects.filter(pk=post_id).values_list(
+        'author__username', 'group__slug'
+    ).first()
+    if saved is None:
+        return []
+    username, slug = saved
+    scopes = [author_scope(username)]
+    if slug is not None:
+        scopes.append(group_scope(slug))
+    return scopes
+
+
+def get_generations(scopes):
+    keys = [generation_key(scope) for scope in scopes]
+    generations = cache.get_many(keys)
+    for key in keys:
+        if key not in generations:
+            cache.add(key, time.time_ns(), None)
+            generations[key] = cache.get(key)
+    return [generations[key] for key in keys]
+
+
+def index_scopes():
+    return [POSTS_SCOPE]
+
+
+def group_scopes(slug):
+    return [group_scope(slug)]
+
+
+def profile_scopes(username):
+    return [author_scope(username)]
+
+
+def post_detail_scopes(post_id):
+    """Пост и его автор: на странице выводится число постов автора."""
+    username = cache.get(post_author_key(post_id))
+    if username is None:
+        username = Post.objects.filter(pk=post_id).values_list(
+            'author__username', flat=True
+        ).first()
+        if username is not None:
+            cache.set(post_author_key(post_id), username, None)
+    return [post_scope(post_id), author_scope(username)]
+
+
+def post_comments_scopes(post_id):
+    return [post_scope(post_id)]
+
+
+class CachedPage:
+    """Ответ в кеше страниц со сроком свежести и временем сборки."""
+
+    def __init__(self, response, expires, build_time):
+        self.response = response
+        self.expires = expires
+        self.build_time = build_time
+
+    def should_refresh(self, now=None):
+        """Вероятностное раннее обновление (XFetch).
+
+        Чем ближе срок и чем дольше собиралась страница, тем вероятнее,
+        что один из запросов пересоберёт её заранее, а не все разом.
+        """
+        now = time.time() if now is None else now
+        early = self.build_time * settings.PAGE_CACHE_EARLY_BETA * math.log(
+            1 - random.random()
+        )
+        return now - early >= self.expires
+
+
+def url_digest(request):
+    return hashlib.md5(request.build_absolute_uri().encode()).hexdigest()
+
+
+def page_key(key_prefix, request, generations):
+    generations = '.'.join(str(gen) for gen in generations)
+    return f'cached_page:{key_prefix}:{url_digest(request)}:{generations}'
+
+
+def latest_page_key(key_prefix, request):
+    """Указатель на последнюю собранную версию страницы любого поколения."""
+    return f'page_latest:{key_prefix}:{url_digest(request)}'
+
+
+def serve_stale(page):
+    """Устаревшая копия, которую клиент не должен сохранять у себя."""
+    response = page.response
+    add_never_cache_headers(response)
+    return response
+
+
+def wait_for_page(key):
+    """Ждёт, пока страницу соберёт держатель блокировки."""
+    deadline = time.monotonic() + settings.PAGE_CACHE_LOCK_WAIT
+    while time.monotonic() < deadline:
+        time.sleep(LOCK_POLL_INTERVAL)
+        page = cache.get(key)
+        if page is not None:
+            return page
+    return None
+
+
+def find_stale(page, latest_key):
+    """Прошлая версия страницы: просроченная или прошлого поколения."""
+    if page is not None:
+        return page
+    previous = cache.get(latest_key)
+    return cache.get(previous) if previous else None
+
+
+def build_coalesced(build, key, stale, path):
+    """Собирает страницу один раз на всех, кто пришёл за ней одновременно.
+
+    Блокировку берёт первый запрос, остальные получают устаревшую копию,
+    а без неё ждут собранную страницу. Если база недоступна или не
+    успевает за PAGE_CACHE_BUILD_DEADLINE, отдаём устаревшую копию.
+    """
+    lock = f'lock:{key}'
+    token = locks.acquire(lock, settings.PAGE_CACHE_LOCK_TIMEOUT)
+    if token is None:
+        if stale is not None:
+            return serve_stale(stale)
+        page = wait_for_page(key)
+        return build() if page is None else page.response
+    try:
+        if stale is None:
+            return build()
+        with query_deadline(settings.PAGE_CACHE_BUILD_DEADLINE):
+            return build()
+    except DatabaseError:
+        if stale is None:
+            raise
+        logger.warning(
+            'База недоступна, отдаём устаревшую %s', path, exc_info=True
+        )
+        return serve_stale(stale)
+    finally:
+        locks.release(lock, token)
+
+
+def cache_page_by_generation(get_scopes, key_prefix, personalized=False):
+    """Кеширует страницу для гостей, пока не сменится поколение её данных.
+
+    Запросы с сессионной кукой и не-GET запросы идут мимо кеша. Страницу
+    со свежими изменениями строим по основной базе: реплика может отставать.
+
+    С personalized кеш общий и для вошедших пользователей: страница
+    рендерится с метками на месте частей, зависящих от пользователя
+    (см. core.fragments), а сами части подставляются в каждый ответ.
+    Устаревшие копии таким пользователям не отдаются: они могли только
+    что изменить данные страницы.
+    """
+    def decorator(view_func):
+        @wraps(view_func)
+        def wrapper(request, *args, **kwargs):
+            anonymous = settings.SESSION_COOKIE_NAME not in request.COOKIES
+            if request.method not in ('GET', 'HEAD') or not (
+                anonymous or personalized
+            ):
+                return view_func(request, *args, **kwargs)
+            generations = get_generations(get_scopes(**kwargs))
+            key = page_key(key_prefix, request, generations)
+            latest_key = latest_page_key(key_prefix, request)
+
+            def build():
+                if is_recent(max(generations)):
+                    pin_primary()
+                started = time.monotonic()
+                with render_shell(request) if personalized else nullcontext():
+                    response = view_func(request, *args, **kwargs)
+                if response.status_code == HTTPStatus.OK:
+                    timeout = settings.PAGE_CACHE_TIMEOUT
+                    keep = timeout + settings.PAGE_CACHE_STALE_TIMEOUT
+                    cache.set(key, CachedPage(
+                        response, time.time() + timeout,
+                        time.monotonic() - started
+                    ), keep)
+                    cache.set(latest_key, key, keep)
+                return response
+
+            page = cache.get(key)
+            if page is not None and not page.should_refresh():
+                response = page.response
+            else:
+                stale = find_stale(page, latest_key) if anonymous else None
+                response = build_coalesced(build, key, stale, request.path)
+            return splice(request, response) if personalized else response
+        return wrapper
+    return decorator
@@ -0,0 +1,197 @@
+import re
+from collections import Counter
+from functools import lru_cache
+
+from django.db import connection
+from django.db.models import Count, Sum
+
+from .models import Post, SearchTerm
+
+FTS_TABLE = 'posts_search'
+
+WORD = re.compile(r'\w+')
+RVRE = re.compile(r'^(.*?[аеиоуыэюя])(.*)$')
+PERFECTIVE_GERUND = re.compile(
+    r'((ив|ивши|ившись|ыв|ывши|ывшись)|((?<=[ая])(в|вши|вшись)))$'
+)
+REFLEXIVE = re.compile(r'(с[яь])$')
+ADJECTIVE = re.compile(
+    r'(ее|ие|ые|ое|ими|ыми|ей|ий|ый|ой|ем|им|ым|ом|его|ого|ему|ому|их|ых'
+    r'|ую|юю|ая|яя|ою|ею)$'
+)
+PARTICIPLE = re.compile(r'((ивш|ывш|ующ)|((?<=[ая])(ем|нн|вш|ющ|щ)))$')
+VERB = re.compile(
+    r'((ила|ыла|ена|ейте|уйте|ите|или|ыли|ей|уй|ил|ыл|им|ым|ен|ило|ыло'
+    r'|ено|ят|ует|уют|ит|ыт|ены|ить|ыть|ишь|ую|ю)|((?<=[ая])(ла|на|ете'
+    r'|йте|ли|й|л|ем|н|ло|но|ет|ют|ны|ть|ешь|нно)))$'
+)
+NOUN = re.compile(
+    r'(а|ев|ов|ие|ье|е|иями|ями|ами|еи|ии|и|ией|ей|ой|ий|й|иям|ям|ием|ем'
+    r'|ам|ом|о|у|ах|иях|ях|ы|ь|ию|ью|ю|ия|ья|я)$'
+)
+DERIVATIONAL = re.compile(r'.*[^аеиоуыэюя]+[аеиоуыэюя].*ость?$')
+DER = re.compile(r'ость?$')
+SUPERLATIVE = re.compile(r'(ейше|ейш)$')
+I_ENDING = re.compile(r'и$')
+SOFT_SIGN = re.compile(r'ь$')
+DOUBLE_N = re.compile(r'нн$')
+
+
+@lru_cache(maxsize=100000)
+def stem(word):
+    """Стеммер Портера для русского языка. Прочие слова не меняет.
+
+    Слова в текстах повторяются, поэтому основы кешируются.
+    """
+    word = word.lower().replace('ё', 'е')
+    match = RVRE.match(word)
+    if match is None:
+        return word
+    prefix, rv = match.groups()
+    temp = PERFECTIVE_GERUND.sub('', rv, 1)
+    if temp == rv:
+        rv = REFLEXIVE.sub('', rv, 1)
+        temp = ADJECTIVE.sub('', rv, 1)
+        if temp != rv:
+            rv = PARTICIPLE.sub('', temp, 1)
+        else:
+            temp = VERB.sub('', rv, 1)
+            rv = NOUN.sub('', rv, 1) if temp == rv else temp
+    else:
+        rv = temp
+    rv = I_ENDING.sub('', rv, 1)
+    if DERIVATIONAL.match(rv):
+        rv = DER.sub('', rv, 1)
+    temp = SOFT_SIGN.sub('', rv, 1)
+    if temp == rv:
+        rv = SUPERLATIVE.sub('', rv, 1)
+        rv = DOUBLE_N.sub('н', rv, 1)
+    else:
+        rv = temp
+    return prefix + rv
+
+
+def tokenize(text):
+    return [stem(word) for word in WORD.findall(text.lower())]
+
+
+class FTS5Backend:
+    """Индекс во встроенной в SQLite таблице FTS5 с ранжированием bm25."""
+
+    @staticmethod
+    def match_expression(terms):
+        return ' '.join(f'"{term}"*' for term in terms)
+
+    def index_posts(self, posts):
+        rows = [(post.pk, ' '.join(tokenize(post.text))) for post in posts]
+        with connection.cursor() as cursor:
+            cursor.executemany(
+                f'DELETE FROM {FTS_TABLE} WHERE rowid = %s',
+                [(pk,) for pk, body in rows]
+            )
+            cursor.executemany(
+                f'INSERT INTO {FTS_TABLE} (rowid, body) VALUES (%s, %s)',
+                rows
+            )
+
+    def remove_post(self, post_id):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'DELETE FROM {FTS_TABLE} WHERE rowid = %s', [post_id]
+            )
+
+    def clear(self):
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {FTS_TABLE}')
+
+    def count(self, terms):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'SELECT count(*) FROM {FTS_TABLE} WHERE {FTS_TABLE} '
+                f'MATCH %s',
+                [self.match_expression(terms)]
+            )
+            return cursor.fetchone()[0]
+
+    def search(self, terms, offset, limit):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s '
+                f'ORDER BY bm25({FTS_TABLE}), rowid DESC LIMIT %s OFFSET %s',
+                [self.match_expression(terms), limit, offset]
+            )
+            return [row[0] for row in cursor.fetchall()]
+
+
+class TableBackend:
+    """Обратный индекс в обычной таблице для баз без FTS5."""
+
+    def index_posts(self, posts):
+        SearchTerm.objects.filter(post__in=posts).delete()
+        SearchTerm.objects.bulk_create([
+            SearchTerm(term=term[:SearchTerm.TERM_LENGTH], post=post,
+                       frequency=frequency)
+            for post in posts
+            for term, frequency in Counter(tokenize(post.text)).items()
+        ])
+
+    def remove_post(self, post_id):
+        SearchTerm.objects.filter(post_id=post_id).delete()
+
+    def clear(self):
+        SearchTerm.objects.all().delete()
+
+    @staticmethod
+    def matches(terms):
+        terms = set(terms)
+        return SearchTerm.objects.filter(term__in=terms).values(
+            'post'
+        ).annotate(
+            hits=Count('term', distinct=True), score=Sum('frequency')
+        ).filter(hits=len(terms))
+
+    def count(self, terms):
+        return self.matches(terms).count()
+
+    def search(self, terms, offset, limit):
+        return list(self.matches(terms).order_by(
+            '-score', '-post'
+        ).values_list('post', flat=True)[offset:offset + limit])
+
+
+def get_backend():
+    if connection.vendor == 'sqlite':
+        return FTS5Backend()
+    return TableBackend()
+
+
+def index_post(post):
+    get_backend().index_posts([post])
+
+
+def remove_post(post_id):
+    get_backend().remove_post(post_id)
+
+
+class SearchResults:
+    """Ленивый список найденных постов для Paginator."""
+
+    def __init__(self, query):
+        self.terms = tokenize(query)
+        self.backend = get_backend()
+
+    def count(self):
+        return self.backend.count(self.terms) if self.terms else 0
+
+    def __len__(self):
+        return self.count()
+
+    def __getitem__(self, item):
+        if not isinstance(item, slice):
+            return self[item:item + 1][0]
+        if not self.terms:
+            return []
+        start = item.start or 0
+        ids = self.backend.search(self.terms, start, item.stop - start)
+        posts = Post.objects.for_list().in_bulk(ids)
+        return [posts[pk] for pk in ids if pk in posts]
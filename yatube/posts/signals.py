@@ -0,0 +1,167 @@
+from functools import partial
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from . import page_cache, search
+from .counters import change_comments_count, change_user_counters
+from .feed import (backfill_feed, backfill_skipped_posts, fan_out_post,
+                   trim_feed)
+from .images import release_image
+from .models import Comment, Follow, Group, Post, User, UserStats
+
+
+# Поля пользователя, которые выводятся на страницах с его постами.
+USER_NAME_FIELDS = ('username', 'first_name', 'last_name')
+
+
+@receiver(pre_save, sender=User)
+def user_saving(sender, instance, update_fields, **kwargs):
+    instance._saved_names = None
+    if instance.pk is None or update_fields is not None and not (
+        set(update_fields) & set(USER_NAME_FIELDS)
+    ):
+        return
+    instance._saved_names = User.objects.filter(pk=instance.pk).values_list(
+        *USER_NAME_FIELDS
+    ).first()
+
+
+@receiver(post_save, sender=User)
+def user_saved(sender, instance, created, **kwargs):
+    if created:
+        UserStats.objects.get_or_create(user=instance)
+    saved = getattr(instance, '_saved_names', None)
+    names = tuple(getattr(instance, field) for field in USER_NAME_FIELDS)
+    if saved is None or saved == names:
+        return
+    scopes = [
+        page_cache.POSTS_SCOPE,
+        page_cache.author_scope(instance.username),
+        page_cache.author_scope(saved[0]),
+    ]
+    scopes.extend(
+        page_cache.group_scope(slug)
+        for slug in Group.objects.filter(
+            posts__author=instance
+        ).values_list('slug', flat=True).distinct()
+    )
+    page_cache.bump(*scopes)
+    if saved[0] != instance.username:
+        # Страницы постов находят автора по этим ключам.
+        cache.delete_many([
+            page_cache.post_author_key(post_id)
+            for post_id in instance.posts.values_list('pk', flat=True)
+        ])
+
+
+@receiver(pre_save, sender=Post)
+def post_saving(sender, instance, **kwargs):
+    instance._saved_scopes = (
+        page_cache.get_saved_post_scopes(instance.pk) if instance.pk else []
+    )
+    instance._saved_image = None
+    if instance.pk:
+        instance._saved_image = Post.objects.filter(
+            pk=instance.pk
+        ).values_list('image', flat=True).first()
+
+
+@receiver(post_save, sender=Post)
+def post_saved(sender, instance, created, **kwargs):
+    if created:
+        change_user_counters(instance.author_id, posts_count=1)
+        fan_out_post(instance)
+    else:
+        cache.delete(page_cache.post_author_key(instance.pk))
+    search.index_post(instance)
+    page_cache.bump(
+        *instance._saved_scopes, *page_cache.get_post_scopes(instance)
+    )
+    if instance._saved_image and instance._saved_image != instance.image.name:
+        transaction.on_commit(partial(release_image, instance._saved_image))
+
+
+@receiver(post_delete, sender=Post)
+def post_deleted(sender, instance, **kwargs):
+    change_user_counters(instance.author_id, posts_count=-1)
+    search.remove_post(instance.pk)
+    cache.delete(page_cache.post_author_key(instance.pk))
+    page_cache.bump(*page_cache.get_post_scopes(instance))
+    if instance.image:
+        transaction.on_commit(partial(release_image, instance.image.name))
+
+
+@receiver(post_save, sender=Comment)
+def comment_saved(sender, instance, created, **kwargs):
+    if created:
+        change_comments_count(instance.post_id, 1)
+    page_cache.bump(page_cache.post_scope(instance.post_id))
+
+
+@receiver(post_delete, sender=Comment)
+def comment_deleted(sender, instance, **kwargs):
+    change_comments_count(instance.post_id, -1)
+    page_cache.bump(page_cache.post_scope(instance.post_id))
+
+
+@receiver(post_save, sender=Follow)
+def follow_saved(sender, instance, created, **kwargs):
+    if created:
+        change_user_counters(instance.author_id, followers_count=1)
+        change_user_counters(instance.user_id, following_count=1)
+        backfill_feed(instance.user_id, instance.author_id)
+    page_cache.bump(
+        page_cache.author_scope(instance.author.username),
+        page_cache.author_scope(instance.user.username),
+    )
+
+
+@receiver(post_delete, sender=Follow)
+def follow_deleted(sender, instance, **kwargs):
+    change_user_counters(instance.author_id, followers_count=-1)
+    change_user_counters(instance.user_id, following_count=-1)
+    trim_feed(instance.user_id, instance.author_id)
+    if UserStats.objects.filter(
+        user_id=instance.author_id,
+        followers_count=settings.FEED_FANOUT_LIMIT
+    ).exists():
+        # Автор только что опустился до лимита раскладки.
+        backfill_skipped_posts(instance.author_id)
+    page_cache.bump(
+        page_cache.author_scope(instance.author.username),
+        page_cache.author_scope(instance.user.username),
+    )
+
+
+@receiver(pre_save, sender=Group)
+def group_saving(sender, instance, **kwargs):
+    instance._saved_slug = Group.objects.filter(pk=instance.pk).values_list(
+        'slug', flat=True
+    ).first() if instance.pk else None
+
+
+@receiver(post_save, sender=Group)
+def group_saved(sender, instance, **kwargs):
+    scopes = [page_cache.group_scope(instance.slug)]
+    if instance._saved_slug not in (None, instance.slug):
+        # Карточки постов группы на других страницах ссылаются на адрес.
+        scopes.append(page_cache.group_scope(instance._saved_slug))
+        scopes.append(page_cache.POSTS_SCOPE)
+        scopes.extend(
+            page_cache.author_scope(username)
+            for username in User.objects.filter(
+                posts__group=instance
+            ).values_list('username', flat=True).distinct()
+        )
+    page_cache.bump(*scopes)
+
+
+@receiver(post_delete, sender=Group)
+def group_deleted(sender, instance, **kwargs):
+    page_cache.bump(
+        page_cache.POSTS_SCOPE, page_cache.group_scope(instance.slug)
+    )
@@ -0,0 +1,77 @@
+import json
+import os
+import shutil
+import tempfile
+from io import StringIO
+
+from django.test import TestCase
+from django.urls import reverse
+from django.core.management import call_command
+
+from ..models import FeedItem, Follow, Post, User, UserStats
+
+
+class BenchmarkCommandsTest(TestCase):
+    def test_seed_posts_and_bench_indexes(self):
+        """seed_posts наполняет базу, bench_indexes выводит планы."""
+        call_command(
+            'seed_posts', users=30, groups=3, posts=200, comments=100,
+            follows=5, stdout=StringIO()
+        )
+        self.assertEqual(Post.objects.count(), 200)
+        self.assertEqual(UserStats.objects.count(), 30)
+        self.assertTrue(Follow.objects.exists())
+        self.assertTrue(FeedItem.objects.exists())
+        out = StringIO()
+        call_command('bench_indexes', repeat=1, page=0, stdout=out)
+        self.assertIn('post_author_pub_date_idx', out.getvalue())
+
+    def test_bench_views_saves_and_compares_results(self):
+        """bench_views пишет результаты в JSON и сравнивает прогоны."""
+        call_command(
+            'seed_posts', users=10, groups=2, posts=30, comments=20,
+            follows=3, stdout=StringIO()
+        )
+        output_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, output_dir)
+        call_command(
+            'bench_views', requests=2, output_dir=output_dir,
+            stdout=StringIO()
+        )
+        baseline = os.path.join(output_dir, os.listdir(output_dir)[0])
+        with open(baseline, encoding='utf-8') as file:
+            report = json.load(file)
+        self.assertEqual(report['database']['posts'], 30)
+        self.assertEqual(report['views']['index']['status'], 200)
+        self.assertEqual(report['views']['post_create']['status'], 302)
+        self.assertEqual(Post.objects.count(), 30)
+        out = StringIO()
+        call_command(
+            'bench_views', requests=2, output_dir=output_dir,
+            compare=baseline, stdout=out
+        )
+        self.assertIn('follow_index: p50', out.getvalue())
+
+    def test_bench_servers_compares_wsgi_and_asgi(self):
+        """bench_servers прогоняет одну страницу через WSGI и ASGI."""
+        out = StringIO()
+        call_command(
+            'bench_servers', connections=4, threads=2, client_delay=1,
+            path=reverse('about:author'), stdout=out
+        )
+        for name in ('WSGI', 'ASGI'):
+            self.assertIn(f'{name}: ', out.getvalue())
+        self.assertIn('ответов не 200: 0', out.getvalue())
+
+    def test_bench_auth_reports_logins_and_signups(self):
+        """bench_auth меряет входы и регистрации и убирает за собой."""
+        out = StringIO()
+        call_command(
+            'bench_auth', workers=[1, 2], clients=1, requests=2, stdout=out
+        )
+        for line in ('1 потоков: ', '2 потоков: '):
+            self.assertEqual(out.getvalue().count(line), 2)
+        self.assertNotIn('успешных 0', out.getvalue())
+        self.assertFalse(
+            User.objects.filter(username__startswith='bench_auth_').exists()
+        )
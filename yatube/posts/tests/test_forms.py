@@ -1,19 +1,23 @@
 import shutil
 import tempfile
+from io import BytesIO
 
 from django.test import Client, TestCase, override_settings
 from django.urls import reverse
 from django.conf import settings
 from django.core.files.uploadedfile import SimpleUploadedFile
 from http import HTTPStatus
+from PIL import Image
 
 from posts.forms import PostForm
 from posts.models import Post, Group, Comment, User
 
 TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+# Картинки хранятся под SHA-256 содержимого, см. core.storage.
+IMAGE_NAME = r'^posts/[0-9a-f]{2}/[0-9a-f]{64}\.jpg$'
 
 
-@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT, THUMBNAIL_PREGENERATE=False)
 class PostFormTests(TestCase):
     @classmethod
     def setUpClass(cls) -> None:
@@ -93,11 +97,7 @@ class PostFormTests(TestCase):
         new_post = Post.objects.last()
         self.assertEqual(new_post.author, self.user)
         self.assertEqual(new_post.group, self.group)
-        self.assertTrue(
-            Post.objects.filter(
-                image='posts/small.gif'
-            ).exists()
-        )
+        self.assertRegex(Post.objects.latest('pk').image.name, IMAGE_NAME)
 
     def test_post_edit(self) -> None:
         """Валидная форма редактирует пост и меняет группу."""
@@ -131,11 +131,7 @@ class PostFormTests(TestCase):
         self.assertEqual(post.text, form_data['text'])
         self.assertEqual(post.author.username, self.user.username)
         self.assertEqual(post.group, self.group_2)
-        self.assertTrue(
-            Post.objects.filter(
-                image='posts/small_3.gif'
-            ).exists()
-        )
+        self.assertRegex(post.image.name, IMAGE_NAME)
         old_group_response = self.authorized_client.get(
             reverse('posts:group_list', args=(self.group.slug,))
         )
@@ -172,3 +168,58 @@ class PostFormTests(TestCase):
                 author=self.user
             )
         )
+
+
+@override_settings(
+    POST_IMAGE_MAX_SIDE=100, POST_IMAGE_MAX_PIXELS=10 ** 6,
+    POST_IMAGE_MAX_BYTES=10 ** 5
+)
+class PostImageProcessingTests(TestCase):
+    @staticmethod
+    def make_upload(name, size, mode='RGB', image_format='JPEG', **options):
+        image = Image.new(mode, size, 'red')
+        content = BytesIO()
+        image.save(content, image_format, **options)
+        return SimpleUploadedFile(name, content.getvalue())
+
+    def clean_image(self, upload):
+        form = PostForm({'text': 'Текст'}, {'image': upload})
+        form.is_valid()
+        return form
+
+    def test_large_jpeg_is_downsized_without_metadata(self):
+        """Большой JPEG уменьшается, поворачивается по EXIF и теряет
+        метаданные, а сохраняется как прогрессивный JPEG."""
+        exif = Image.Exif()
+        exif[0x0112] = 6
+        exif[0x010F] = 'Камера'
+        upload = self.make_upload(
+            'photo.jpeg', (400, 200), exif=exif.tobytes()
+        )
+        image_file = self.clean_image(upload).cleaned_data['image']
+        self.assertEqual(image_file.name, 'photo.jpg')
+        with Image.open(image_file) as image:
+            self.assertEqual(image.format, 'JPEG')
+            self.assertEqual(image.size, (50, 100))
+            self.assertNotIn('exif', image.info)
+            self.assertTrue(image.info.get('progressive'))
+
+    def test_transparent_image_stays_png(self):
+        """Картинка с прозрачностью сохраняется в PNG."""
+        upload = self.make_upload(
+            'logo.gif', (20, 20), mode='RGBA', image_format='PNG'
+        )
+        image_file = self.clean_image(upload).cleaned_data['image']
+        with Image.open(image_file) as image:
+            self.assertEqual((image.format, image.mode), ('PNG', 'RGBA'))
+
+    def test_limits(self):
+        """Слишком тяжёлый файл и слишком большая картинка отклоняются."""
+        uploads = (
+            self.make_upload('huge.png', (2000, 1000), image_format='PNG'),
+            self.make_upload('heavy.bmp', (200, 200), image_format='BMP'),
+        )
+        for upload in uploads:
+            with self.subTest(name=upload.name):
+                form = self.clean_image(upload)
+                self.assertIn('image', form.errors)
@@ -1,6 +1,13 @@
-from django.test import TestCase
+import os
+import shutil
+import tempfile
+from io import StringIO
 
-from ..models import Group, Post, User
+from django.core.files.base import ContentFile
+from django.core.management import call_command
+from django.test import TestCase, TransactionTestCase, override_settings
+
+from ..models import Comment, Follow, Group, Post, User, UserStats
 
 
 class PostModelTest(TestCase):
@@ -65,3 +72,113 @@ class PostModelTest(TestCase):
             with self.subTest(value=value):
                 self.assertEqual(
                     post._meta.get_field(value).help_text, expected)
+
+
+class CountersTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='HasNoName')
+        cls.author = User.objects.create_user(username='Author')
+
+    def test_counters_follow_writes(self):
+        """Счётчики меняются вместе с постами, комментариями и подписками."""
+        post = Post.objects.create(author=self.author, text='Тестовый пост')
+        comment = Comment.objects.create(
+            post=post, author=self.user, text='Комментарий'
+        )
+        follow = Follow.objects.create(user=self.user, author=self.author)
+        post.refresh_from_db()
+        self.assertEqual(post.comments_count, 1)
+        self.assertEqual(
+            UserStats.objects.get(user=self.author).posts_count, 1
+        )
+        self.assertEqual(
+            UserStats.objects.get(user=self.author).followers_count, 1
+        )
+        self.assertEqual(
+            UserStats.objects.get(user=self.user).following_count, 1
+        )
+        comment.delete()
+        follow.delete()
+        post.refresh_from_db()
+        self.assertEqual(post.comments_count, 0)
+        self.assertEqual(
+            UserStats.objects.get(user=self.author).followers_count, 0
+        )
+        self.assertEqual(
+            UserStats.objects.get(user=self.user).following_count, 0
+        )
+
+    def test_recount_counters_command(self):
+        """Команда recount_counters чинит рассинхронизированные счётчики."""
+        post = Post.objects.create(author=self.author, text='Тестовый пост')
+        Comment.objects.create(post=post, author=self.user, text='Текст')
+        UserStats.objects.filter(user=self.author).delete()
+        Post.objects.update(comments_count=10)
+        call_command('recount_counters', stdout=StringIO())
+        post.refresh_from_db()
+        self.assertEqual(post.comments_count, 1)
+        self.assertEqual(
+            UserStats.objects.get(user=self.author).posts_count, 1
+        )
+
+
+class SharedImageTest(TransactionTestCase):
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        settings_override = override_settings(
+            MEDIA_ROOT=media_root, POST_IMAGE_RELEASE_GRACE=0
+        )
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.user = User.objects.create_user(username='author')
+
+    def create_post(self, content):
+        post = Post(author=self.user, text='Пост с картинкой')
+        post.image.save('photo.jpg', ContentFile(content))
+        return post
+
+    def test_identical_uploads_share_one_file(self):
+        """Одинаковые картинки хранятся одним файлом, пока он кому-то нужен."""
+        first = self.create_post(b'image')
+        second = self.create_post(b'image')
+        self.assertEqual(first.image.name, second.image.name)
+        storage = first.image.storage
+        name = first.image.name
+        first.delete()
+        self.assertTrue(storage.exists(name))
+        second.delete()
+        self.assertFalse(storage.exists(name))
+
+    def test_replaced_image_is_released(self):
+        """Заменённая картинка удаляется, если других ссылок на неё нет."""
+        post = self.create_post(b'old')
+        old_name = post.image.name
+        post.image.save('photo.jpg', ContentFile(b'new'))
+        self.assertFalse(post.image.storage.exists(old_name))
+        self.assertTrue(post.image.storage.exists(post.image.name))
+
+    @override_settings(POST_IMAGE_RELEASE_GRACE=600)
+    def test_recent_upload_kept_until_purge(self):
+        """Недавно загруженный файл не удаляется вместе с постом: такую
+        же картинку может сейчас сохранять другой пост. Позже его убирает
+        purge_images."""
+        post = self.create_post(b'image')
+        storage = post.image.storage
+        name = post.image.name
+        path = storage.path(name)
+        os.utime(path, (0, 0))
+        storage.save('posts/again.jpg', ContentFile(b'image'))
+        post.delete()
+        self.assertTrue(storage.exists(name))
+        out = StringIO()
+        call_command('purge_images', stdout=out)
+        self.assertIn('Удалено картинок без постов: 0', out.getvalue())
+        os.utime(path, (0, 0))
+        self.create_post(b'used')
+        out = StringIO()
+        call_command('purge_images', stdout=out)
+        self.assertIn('Удалено картинок без постов: 1', out.getvalue())
+        self.assertFalse(storage.exists(name))
@@ -0,0 +1,33 @@
+from django.test import TestCase
+
+from ..models import Post, User
+from ..search import TableBackend, stem
+
+
+class SearchIndexTest(TestCase):
+    def test_stem(self):
+        """Стеммер сводит формы слова к одной основе."""
+        for words in (
+            ('кошка', 'кошки', 'кошками'),
+            ('гулять', 'гуляли', 'гуляет'),
+            ('тёплый', 'теплых', 'теплая'),
+        ):
+            with self.subTest(words=words):
+                self.assertEqual(len({stem(word) for word in words}), 1)
+        self.assertEqual(stem('Django'), 'django')
+
+    def test_table_backend(self):
+        """Табличный индекс ищет по всем словам и ранжирует по частоте."""
+        user = User.objects.create_user(username='Petr')
+        backend = TableBackend()
+        post_once = Post.objects.create(author=user, text='кот на окне')
+        post_twice = Post.objects.create(
+            author=user, text='кот и коты на окнах'
+        )
+        Post.objects.create(author=user, text='кот во дворе')
+        backend.index_posts(list(Post.objects.all()))
+        terms = [stem('кот'), stem('окно')]
+        self.assertEqual(backend.count(terms), 2)
+        self.assertEqual(
+            backend.search(terms, 0, 10), [post_twice.pk, post_once.pk]
+        )
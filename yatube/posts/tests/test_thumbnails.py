@@ -0,0 +1,90 @@
+import os
+import shutil
+import tempfile
+from io import BytesIO, StringIO
+from unittest import mock
+
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection
+from PIL import Image
+
+from ..models import Post, User
+
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class WarmThumbnailsTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='Petr')
+        small_gif = (
+            b'\x47\x49\x46\x38\x39\x61\x02\x00'
+            b'\x01\x00\x80\x00\x00\x00\x00\x00'
+            b'\xFF\xFF\xFF\x21\xF9\x04\x00\x00'
+            b'\x00\x00\x00\x2C\x00\x00\x00\x00'
+            b'\x02\x00\x01\x00\x00\x02\x02\x0C'
+            b'\x0A\x00\x3B'
+        )
+        Post.objects.create(
+            author=cls.user,
+            text='Тестовый пост',
+            image=SimpleUploadedFile(
+                name='small.gif',
+                content=small_gif,
+                content_type='image/gif'
+            )
+        )
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        cache.clear()
+
+    def test_warm_thumbnails_command(self):
+        """Команда warm_thumbnails создаёт миниатюры картинок постов."""
+        out = StringIO()
+        call_command('warm_thumbnails', workers=1, stdout=out)
+        self.assertIn('Обработано картинок: 1, с ошибками: 0', out.getvalue())
+        thumbnails = [
+            name for _, _, names in os.walk(
+                os.path.join(TEMP_MEDIA_ROOT, 'cache')
+            ) for name in names
+        ]
+        self.assertEqual(len(thumbnails), len(settings.POST_THUMBNAILS))
+
+
+class WarmThumbnailsInlineTest(TransactionTestCase):
+    def setUp(self):
+        cache.clear()
+        media_root = tempfile.mkdtemp(dir=settings.BASE_DIR)
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        settings_override = override_settings(MEDIA_ROOT=media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        user = User.objects.create_user(username='Petr')
+        for color in ('red', 'green', 'blue'):
+            content = BytesIO()
+            Image.new('RGB', (4, 4), color).save(content, 'PNG')
+            Post.objects.create(
+                author=user, text=f'Пост {color}',
+                image=SimpleUploadedFile(f'{color}.png', content.getvalue())
+            )
+
+    def test_single_process_run_outside_transaction(self):
+        """В одном процессе команда обходит все картинки, не закрывая
+        соединение, из которого читает их список."""
+        out = StringIO()
+        with mock.patch.object(connection, 'close') as close:
+            call_command('warm_thumbnails', workers=1, stdout=out)
+        close.assert_not_called()
+        self.assertIn('Обработано картинок: 3, с ошибками: 0', out.getvalue())
@@ -0,0 +1,142 @@
+import json
+import os
+import shutil
+import tempfile
+from io import StringIO
+
+from django.test import TestCase
+from django.urls import reverse
+from django.core.management import CommandError, call_command
+
+from ..models import Comment, FeedItem, Follow, Post, Group, User
+
+
+class ContentTransferTest(TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        author = User.objects.create_user(username='author')
+        reader = User.objects.create_user(username='reader')
+        group = Group.objects.create(
+            title='Группа', slug='group', description='Описание'
+        )
+        self.post = Post.objects.create(
+            author=author, group=group, text='Кот смотрит в окно'
+        )
+        Post.objects.filter(pk=self.post.pk).update(
+            pub_date='2020-01-02T03:04:05Z'
+        )
+        Post.objects.create(author=reader, text='Пост без группы')
+        Comment.objects.create(post=self.post, author=reader, text='Мяу')
+        Follow.objects.create(user=reader, author=author)
+
+    def test_export_and_import_round_trip(self):
+        """Выгрузка и загрузка сохраняют связи, даты, счётчики и ленты."""
+        paths = {}
+        for kind, extension in (
+            ('groups', 'csv'), ('posts', 'jsonl'),
+            ('comments', 'csv'), ('follows', 'jsonl'),
+        ):
+            paths[kind] = os.path.join(self.directory, f'{kind}.{extension}')
+            call_command('export_content', kind, paths[kind],
+                         stdout=StringIO())
+        Group.objects.all().delete()
+        User.objects.all().delete()
+        post_ids = os.path.join(self.directory, 'post_ids.json')
+        for kind in ('groups', 'posts', 'comments', 'follows'):
+            call_command('import_content', kind, paths[kind], batch_size=1,
+                         post_ids=post_ids, stdout=StringIO())
+        post = Post.objects.get(text=self.post.text)
+        self.assertEqual(post.group.slug, 'group')
+        self.assertEqual(post.author.username, 'author')
+        self.assertEqual(post.pub_date.year, 2020)
+        self.assertEqual(post.comments_count, 1)
+        self.assertEqual(post.comments.get().author.username, 'reader')
+        self.assertEqual(post.author.stats.followers_count, 1)
+        self.assertTrue(FeedItem.objects.filter(
+            user__username='reader', post=post
+        ).exists())
+        self.assertEqual(
+            self.client.get(reverse('posts:search'), {'q': 'кот'}).context[
+                'page_obj'
+            ].paginator.count,
+            1
+        )
+
+    def write_records(self, name, *records):
+        path = os.path.join(self.directory, name)
+        with open(path, 'w', encoding='utf-8') as file:
+            for record in records:
+                file.write(json.dumps(record) + '\n')
+        return path
+
+    def test_import_skips_unknown_groups_and_posts(self):
+        """Записи со ссылками на отсутствующие группы и посты пропускаются."""
+        path = self.write_records('comments.jsonl', {
+            'post': 999, 'author': 'reader', 'text': 'Мимо',
+            'created': '2020-01-02T03:04:05+00:00',
+        })
+        post_ids = self.write_records('post_ids.json', {})
+        out = StringIO()
+        call_command('import_content', 'comments', path, post_ids=post_ids,
+                     stdout=out)
+        self.assertIn('Загружено записей: 0, пропущено: 1', out.getvalue())
+        with self.assertRaises(CommandError):
+            call_command('import_content', 'comments', path)
+
+    def test_import_into_non_empty_database(self):
+        """Посты получают новые id, и комментарии идут к своему посту,
+        даже если id из выгрузки уже занят."""
+        posts = self.write_records('posts.jsonl', {
+            'id': self.post.pk, 'author': 'newcomer', 'group': '',
+            'text': 'Импортированный пост', 'image': '',
+            'pub_date': '2020-01-02T03:04:05+00:00',
+        })
+        comments = self.write_records('comments.jsonl', {
+            'post': self.post.pk, 'author': 'newcomer',
+            'text': 'Комментарий к импортированному посту',
+            'created': '2020-01-02T03:04:05+00:00',
+        })
+        post_ids = os.path.join(self.directory, 'post_ids.json')
+        for kind, path in (('posts', posts), ('comments', comments)):
+            out = StringIO()
+            call_command('import_content', kind, path, post_ids=post_ids,
+                         stdout=out)
+            self.assertIn('Загружено записей: 1, пропущено: 0',
+                          out.getvalue())
+        imported = Post.objects.get(text='Импортированный пост')
+        self.assertNotEqual(imported.pk, self.post.pk)
+        self.assertEqual(
+            imported.comments.get().text,
+            'Комментарий к импортированному посту'
+        )
+        self.assertEqual(
+            list(self.post.comments.values_list('text', flat=True)), ['Мяу']
+        )
+
+    def test_posts_import_resumes_with_post_ids(self):
+        """Загрузка постов требует --post-ids, повтор с ним пропускает
+        загруженное, а новые посты получают id после загруженных."""
+        posts = self.write_records('posts.jsonl', *(
+            {
+                'id': number, 'author': 'newcomer', 'group': '',
+                'text': f'Пост {number}', 'image': '',
+                'pub_date': '2020-01-02T03:04:05+00:00',
+            }
+            for number in (1, 2)
+        ))
+        with self.assertRaises(CommandError):
+            call_command('import_content', 'posts', posts)
+        post_ids = os.path.join(self.directory, 'post_ids.json')
+        for loaded, skipped in ((2, 0), (0, 2)):
+            out = StringIO()
+            call_command('import_content', 'posts', posts, batch_size=1,
+                         post_ids=post_ids, stdout=out)
+            self.assertIn(
+                f'Загружено записей: {loaded}, пропущено: {skipped}',
+                out.getvalue()
+            )
+        with open(post_ids, encoding='utf-8') as file:
+            imported = json.load(file).values()
+        post = Post.objects.create(author=self.post.author, text='Новый')
+        self.assertGreater(post.pk, max(imported))
@@ -1,4 +1,4 @@
-from django.test import Client, TestCase
+from django.test import Client, TestCase, override_settings
 from django.urls import reverse
 from django.core.cache import cache
 
@@ -44,3 +44,44 @@ class PaginatorViewsTest(TestCase):
         for reversing in self.list_of_reverses:
             response = self.guest_client.get(reversing + '?page=2')
             self.assertEqual(len(response.context['page_obj']), 3)
+
+
+@override_settings(PAGINATION_MODE='cursor')
+class CursorPaginatorViewsTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='Petr')
+        Post.objects.bulk_create([
+            Post(author=cls.user, text=f'Тестовый пост {num_of_post}')
+            for num_of_post in range(13)
+        ])
+
+    def setUp(self):
+        cache.clear()
+        self.guest_client = Client()
+
+    def test_cursor_pages(self):
+        """Курсор ведёт на следующую страницу и обратно."""
+        url = reverse('posts:profile', kwargs={'username': self.user})
+        expected = list(Post.objects.order_by('-pub_date', '-pk'))
+        first_page = self.guest_client.get(url).context['page_obj']
+        self.assertEqual(list(first_page), expected[:10])
+        self.assertFalse(first_page.has_previous())
+        second_page = self.guest_client.get(
+            url, {'cursor': first_page.next_cursor}
+        ).context['page_obj']
+        self.assertEqual(list(second_page), expected[10:])
+        self.assertFalse(second_page.has_next())
+        previous_page = self.guest_client.get(
+            url, {'cursor': second_page.previous_cursor}
+        ).context['page_obj']
+        self.assertEqual(list(previous_page), expected[:10])
+        self.assertFalse(previous_page.has_previous())
+
+    def test_broken_cursor_shows_first_page(self):
+        """Испорченный курсор открывает первую страницу."""
+        response = self.guest_client.get(
+            reverse('posts:index'), {'cursor': 'broken!'}
+        )
+        self.assertEqual(len(response.context['page_obj']), 10)
@@ -1,20 +1,29 @@
 import shutil
 import tempfile
 
-from django.test import Client, TestCase, override_settings
+from django.db import OperationalError, connection
+from django.http import HttpResponse
+from django.test import (Client, RequestFactory, SimpleTestCase, TestCase,
+                         override_settings)
 from django.urls import reverse
 from django.conf import settings
 from django.core.files.uploadedfile import SimpleUploadedFile
 from time import sleep
 from django.core.cache import cache
 
-from ..models import Post, Group, Follow, User
+from core import locks
+from core.fragments import render_fragment
+
+from ..models import Post, Group, Comment, Follow, FeedItem, User
 from ..forms import PostForm
+from .. import page_cache
+from ..feed import FEED_DATE, get_follow_feed
+from ..utils import get_cursor_page
 
 TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
 
 
-@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT, THUMBNAIL_PREGENERATE=False)
 class PostPagesTests(TestCase):
     @classmethod
     def setUpClass(cls) -> None:
@@ -153,20 +162,85 @@ class PostPagesTests(TestCase):
                 self.assertEqual(response.context['page_obj'][0], self.post_2)
 
     def test_index_page_cache(self) -> None:
-        """Страница index/ формируется с использованием кеширования."""
+        """Страница index/ берётся из кеша, пока посты не изменились."""
         response = self.guest_client.get(reverse('posts:index'))
         posts = response.content
+        Post.objects.filter(pk=self.post.pk).update(text='test_silent_edit')
+        response_old = self.guest_client.get(reverse('posts:index'))
+        old_posts = response_old.content
+        self.assertEqual(old_posts, posts)
         Post.objects.create(
             text='test_new_post',
             author=self.user,
         )
-        response_old = self.guest_client.get(reverse('posts:index'))
-        old_posts = response_old.content
-        self.assertEqual(old_posts, posts)
-        cache.clear()
         response_new = self.guest_client.get(reverse('posts:index'))
         new_posts = response_new.content
         self.assertNotEqual(old_posts, new_posts)
+        self.assertIn('test_new_post'.encode(), new_posts)
+
+    def test_pages_cache_invalidated_by_comment(self) -> None:
+        """Новый комментарий сразу сбрасывает кеш страницы поста."""
+        url = reverse('posts:post_detail', kwargs={'post_id': self.post.id})
+        self.guest_client.get(url)
+        self.authorized_client.post(
+            reverse('posts:add_comment', kwargs={'post_id': self.post.id}),
+            data={'text': 'Свежий комментарий'},
+        )
+        response = self.guest_client.get(url)
+        self.assertIn('Свежий комментарий'.encode(), response.content)
+
+    def test_post_card_fragment_cache(self) -> None:
+        """Карточка поста кешируется до редактирования поста."""
+        url = reverse('posts:group_list', kwargs={'slug': self.group.slug})
+        self.authorized_client.get(url)
+        Post.objects.filter(pk=self.post.pk).update(text='test_silent_edit')
+        response = self.authorized_client.get(url)
+        self.assertNotIn('test_silent_edit'.encode(), response.content)
+        self.authorized_client.post(
+            reverse('posts:post_edit', kwargs={'post_id': self.post.id}),
+            data={'text': 'test_edited_text', 'group': self.group.id},
+        )
+        response = self.authorized_client.get(url)
+        self.assertIn('test_edited_text'.encode(), response.content)
+
+    def test_post_card_follows_author_and_group(self) -> None:
+        """Карточка поста обновляется при смене имени автора и адреса
+        группы."""
+        url = reverse('posts:index')
+        self.guest_client.get(url)
+        author = User.objects.get(pk=self.post.author_id)
+        author.first_name = 'Новоеимя'
+        author.save()
+        group = Group.objects.get(pk=self.post.group_id)
+        group.slug = 'new-slug'
+        group.save()
+        response = self.guest_client.get(url)
+        self.assertIn('Новоеимя'.encode(), response.content)
+        self.assertIn(b'/group/new-slug/', response.content)
+
+    def test_user_changes_reset_only_affected_pages(self) -> None:
+        """Регистрация и вход не сбрасывают кеш главной, а смена имени
+        пользователя сбрасывает и страницу профиля по старому имени."""
+        generation = page_cache.get_generations([page_cache.POSTS_SCOPE])
+        User.objects.create_user(username='newcomer')
+        self.client.force_login(self.user)
+        user = User.objects.get(pk=self.user.pk)
+        user.email = 'petr@example.com'
+        user.save()
+        self.assertEqual(
+            page_cache.get_generations([page_cache.POSTS_SCOPE]), generation
+        )
+        old_url = reverse('posts:profile', args=(user.username,))
+        post_url = reverse('posts:post_detail', args=(self.post.pk,))
+        self.assertEqual(self.guest_client.get(old_url).status_code, 200)
+        self.guest_client.get(post_url)
+        user.username = 'Renamed'
+        user.save()
+        self.assertNotEqual(
+            page_cache.get_generations([page_cache.POSTS_SCOPE]), generation
+        )
+        self.assertEqual(self.guest_client.get(old_url).status_code, 404)
+        self.assertContains(self.guest_client.get(post_url), 'Renamed')
 
     def test_authorized_can_follow(self) -> None:
         """Авторизованный пользователь может подписаться и отписаться."""
@@ -197,3 +271,387 @@ class PostPagesTests(TestCase):
             reverse('posts:profile_follow',
                     kwargs={'username': self.user_following.username}))
         self.assertEqual(self.user.follower.count(), 1)
+
+
+class FollowFeedTests(TestCase):
+    @classmethod
+    def setUpClass(cls) -> None:
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='Petr')
+        cls.author = User.objects.create_user(username='Gleb')
+        cls.old_post = Post.objects.create(
+            author=cls.author,
+            text='Старый пост',
+        )
+
+    def setUp(self) -> None:
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.user)
+
+    def get_feed(self) -> list:
+        response = self.authorized_client.get(reverse('posts:follow_index'))
+        return list(response.context['page_obj'])
+
+    def test_follow_backfills_and_unfollow_trims_feed(self) -> None:
+        """Подписка заполняет ленту, отписка очищает её."""
+        self.authorized_client.get(
+            reverse('posts:profile_follow',
+                    kwargs={'username': self.author.username}))
+        self.assertEqual(self.get_feed(), [self.old_post])
+        self.authorized_client.get(
+            reverse('posts:profile_unfollow',
+                    kwargs={'username': self.author.username}))
+        self.assertFalse(FeedItem.objects.filter(user=self.user).exists())
+        self.assertEqual(self.get_feed(), [])
+
+    def test_new_post_fans_out_to_followers(self) -> None:
+        """Новый пост попадает в ленты подписчиков автора."""
+        Follow.objects.create(user=self.user, author=self.author)
+        new_post = Post.objects.create(author=self.author, text='Новый пост')
+        self.assertTrue(
+            FeedItem.objects.filter(user=self.user, post=new_post).exists()
+        )
+        self.assertEqual(self.get_feed(), [new_post, self.old_post])
+
+    def test_feed_pages_read_feed_index(self) -> None:
+        """Лента листается по индексу ленты, без сортировки всех постов."""
+        Follow.objects.create(user=self.user, author=self.author)
+        for num_of_post in range(3):
+            Post.objects.create(author=self.author, text=f'Пост {num_of_post}')
+        posts = get_follow_feed(self.user).for_list()
+        first = get_cursor_page(posts, None, 2, FEED_DATE)
+        second = get_cursor_page(posts, first.next_cursor, 2, FEED_DATE)
+        self.assertEqual(
+            list(first) + list(second),
+            list(Post.objects.order_by('-pub_date', '-pk'))
+        )
+        sql, params = posts.query.sql_with_params()
+        with connection.cursor() as cursor:
+            cursor.execute(f'EXPLAIN QUERY PLAN {sql}', params)
+            plan = ' '.join(row[-1] for row in cursor.fetchall())
+        self.assertIn('USING INDEX feed_user_pub_date_idx', plan)
+        self.assertNotIn('TEMP B-TREE FOR ORDER BY', plan)
+
+    @override_settings(FEED_FANOUT_LIMIT=0)
+    def test_popular_author_posts_are_read_on_demand(self) -> None:
+        """Посты популярного автора подмешиваются в ленту при чтении."""
+        Follow.objects.create(user=self.user, author=self.author)
+        new_post = Post.objects.create(author=self.author, text='Новый пост')
+        self.assertFalse(
+            FeedItem.objects.filter(user=self.user, post=new_post).exists()
+        )
+        self.assertEqual(self.get_feed(), [new_post, self.old_post])
+
+    @override_settings(FEED_FANOUT_LIMIT=1)
+    def test_skipped_posts_kept_when_author_drops_under_limit(self) -> None:
+        """Посты, пропущенные раскладкой, остаются в ленте после отписок."""
+        other = User.objects.create_user(username='Ivan')
+        Follow.objects.create(user=self.user, author=self.author)
+        Follow.objects.create(user=other, author=self.author)
+        new_post = Post.objects.create(author=self.author, text='Новый пост')
+        self.assertFalse(FeedItem.objects.filter(post=new_post).exists())
+        Follow.objects.filter(user=other).delete()
+        self.assertTrue(
+            FeedItem.objects.filter(user=self.user, post=new_post).exists()
+        )
+        self.assertEqual(self.get_feed(), [new_post, self.old_post])
+
+
+class QueryBudgetTests(TestCase):
+    """Число запросов страницы не зависит от числа постов на ней."""
+    @classmethod
+    def setUpClass(cls) -> None:
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='Petr')
+        cls.author = User.objects.create_user(
+            username='Gleb', first_name='Глеб', last_name='Глебов'
+        )
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test-slug',
+            description='Тестовое описание',
+        )
+        Follow.objects.create(user=cls.user, author=cls.author)
+        for num_of_post in range(5):
+            Post.objects.create(
+                author=cls.author,
+                text=f'Тестовый пост {num_of_post}',
+                group=cls.group,
+            )
+        cls.post = Post.objects.first()
+        for num_of_comment in range(5):
+            Comment.objects.create(
+                post=cls.post,
+                author=cls.user,
+                text=f'Комментарий {num_of_comment}',
+            )
+
+    def setUp(self) -> None:
+        cache.clear()
+        self.guest_client = Client()
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.user)
+
+    def test_guest_pages_query_budget(self) -> None:
+        """Страницы для гостя укладываются в бюджет запросов."""
+        budgets = {
+            reverse('posts:index'): 2,
+            reverse('posts:group_list', kwargs={'slug': self.group.slug}): 3,
+            reverse('posts:profile', kwargs={'username': self.author}): 3,
+            reverse('posts:post_detail', kwargs={'post_id': self.post.id}): 3,
+        }
+        for url, budget in budgets.items():
+            with self.subTest(url=url), self.assertNumQueries(budget):
+                self.guest_client.get(url)
+            with self.subTest(url=url, cached=True), self.assertNumQueries(0):
+                self.guest_client.get(url)
+
+    def test_follow_index_query_budget(self) -> None:
+        """Лента подписок укладывается в бюджет запросов: сессия
+        и пользователь после первого запроса берутся из кеша."""
+        with self.assertNumQueries(4):
+            self.authorized_client.get(reverse('posts:follow_index'))
+        with self.assertNumQueries(3):
+            self.authorized_client.get(reverse('posts:follow_index'))
+
+
+class SearchViewTests(TestCase):
+    @classmethod
+    def setUpClass(cls) -> None:
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='Petr')
+        cls.post_cats = Post.objects.create(
+            author=cls.user,
+            text='Кошки любят спать на тёплых подоконниках',
+        )
+        cls.post_dogs = Post.objects.create(
+            author=cls.user,
+            text='Собаки любят гулять, а кошка не любит собак',
+        )
+
+    def setUp(self) -> None:
+        self.guest_client = Client()
+
+    def search(self, query) -> list:
+        response = self.guest_client.get(reverse('posts:search'), {'q': query})
+        return list(response.context['page_obj'])
+
+    def test_search_finds_word_forms(self) -> None:
+        """Поиск находит посты по другим формам слова."""
+        self.assertCountEqual(
+            self.search('кошками'), [self.post_cats, self.post_dogs]
+        )
+        self.assertEqual(self.search('подоконник'), [self.post_cats])
+        self.assertEqual(self.search('собака кошка'), [self.post_dogs])
+        self.assertEqual(self.search(''), [])
+
+    def test_search_index_follows_edits(self) -> None:
+        """Отредактированный и удалённый пост переиндексируются."""
+        self.post_cats.text = 'Попугаи разговаривают'
+        self.post_cats.save()
+        self.assertEqual(self.search('подоконник'), [])
+        self.assertEqual(self.search('попугай'), [self.post_cats])
+        self.post_cats.delete()
+        self.assertEqual(self.search('попугай'), [])
+
+
+@override_settings(NUM_OF_COMMENTS=2)
+class CommentPaginationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls) -> None:
+        cls.user = User.objects.create_user(username='commenter')
+        cls.post = Post.objects.create(author=cls.user, text='Пост')
+        for num_of_comment in range(5):
+            Comment.objects.create(
+                post=cls.post,
+                author=cls.user,
+                text=f'Комментарий {num_of_comment}',
+            )
+
+    def setUp(self) -> None:
+        cache.clear()
+
+    def test_post_detail_shows_first_comments(self) -> None:
+        """На странице поста только первая пачка комментариев."""
+        response = self.client.get(
+            reverse('posts:post_detail', kwargs={'post_id': self.post.id})
+        )
+        comments = response.context['comments']
+        self.assertEqual(
+            [comment.text for comment in comments],
+            ['Комментарий 0', 'Комментарий 1']
+        )
+        self.assertTrue(comments.has_next())
+        self.assertContains(response, comments.next_cursor)
+
+    def test_post_comments_loads_next_batches(self) -> None:
+        """Эндпоинт отдаёт следующие пачки, пока комментарии не кончатся."""
+        url = reverse('posts:post_comments', kwargs={'post_id': self.post.id})
+        cursor = self.client.get(
+            reverse('posts:post_detail', kwargs={'post_id': self.post.id})
+        ).context['comments'].next_cursor
+        texts = []
+        while cursor:
+            data = self.client.get(url, {'cursor': cursor}).json()
+            texts.append(data['html'])
+            cursor = data['next_cursor']
+        self.assertEqual(len(texts), 2)
+        self.assertIn('Комментарий 2', texts[0])
+        self.assertIn('Комментарий 4', texts[1])
+        self.assertNotIn('Комментарий 1', ''.join(texts))
+
+    def test_post_comments_unknown_post(self) -> None:
+        """Для несуществующего поста эндпоинт отвечает 404."""
+        response = self.client.get(
+            reverse('posts:post_comments', kwargs={'post_id': 999})
+        )
+        self.assertEqual(response.status_code, 404)
+
+
+class PageCacheStampedeTests(SimpleTestCase):
+    databases = {'default'}
+
+    def setUp(self):
+        cache.clear()
+        self.builds = 0
+        self.failing = False
+        self.slow = False
+        self.request = RequestFactory().get('/cached/')
+        self.view = page_cache.cache_page_by_generation(
+            lambda: ['stampede'], key_prefix='stampede'
+        )(self.render)
+
+    def render(self, request):
+        if self.failing:
+            raise OperationalError('database is locked')
+        if self.slow:
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    'WITH RECURSIVE n(i) AS (SELECT 1 UNION ALL '
+                    'SELECT i + 1 FROM n WHERE i < 100000000) '
+                    'SELECT count(*) FROM n'
+                )
+        self.builds += 1
+        return HttpResponse(f'build {self.builds}')
+
+    def lock_current_page(self):
+        generations = page_cache.get_generations(['stampede'])
+        key = page_cache.page_key('stampede', self.request, generations)
+        lock = f'lock:{key}'
+        token = locks.acquire(lock, settings.PAGE_CACHE_LOCK_TIMEOUT)
+        self.assertIsNotNone(token)
+        self.addCleanup(locks.release, lock, token)
+
+    def test_stale_page_served_while_rebuild_is_locked(self):
+        """Пока страницу пересобирает другой запрос, отдаётся прошлая
+        версия, которую клиенту запрещено сохранять."""
+        self.view(self.request)
+        page_cache.bump('stampede')
+        self.lock_current_page()
+        response = self.view(self.request)
+        self.assertEqual(response.content, b'build 1')
+        self.assertIn('no-store', response['Cache-Control'])
+        self.assertEqual(self.builds, 1)
+
+    @override_settings(PAGE_CACHE_LOCK_WAIT=0)
+    def test_without_stale_copy_waiter_builds_itself(self):
+        """Без прошлой версии запрос не ждёт дольше PAGE_CACHE_LOCK_WAIT."""
+        self.lock_current_page()
+        self.assertEqual(self.view(self.request).content, b'build 1')
+
+    def test_stale_page_served_when_database_fails(self):
+        """Если база недоступна, отдаётся прошлая версия страницы."""
+        self.view(self.request)
+        page_cache.bump('stampede')
+        self.failing = True
+        with self.assertLogs('posts.page_cache', 'WARNING'):
+            response = self.view(self.request)
+        self.assertEqual(response.content, b'build 1')
+        page_cache.bump('stampede')
+        cache.delete(page_cache.latest_page_key('stampede', self.request))
+        with self.assertRaises(OperationalError):
+            self.view(self.request)
+
+    @override_settings(PAGE_CACHE_BUILD_DEADLINE=0.05)
+    def test_stale_page_served_when_database_is_slow(self):
+        """Если пересборка не укладывается в срок, отдаётся прошлая
+        версия страницы."""
+        self.view(self.request)
+        page_cache.bump('stampede')
+        self.slow = True
+        with self.assertLogs('posts.page_cache', 'WARNING'):
+            response = self.view(self.request)
+        self.assertEqual(response.content, b'build 1')
+        self.assertIn('no-store', response['Cache-Control'])
+
+    def test_probabilistic_early_refresh(self):
+        """Страница обновляется заранее тем вероятнее, чем ближе срок."""
+        page = page_cache.CachedPage(HttpResponse(), expires=100, build_time=1)
+        self.assertTrue(page.should_refresh(now=100))
+        self.assertFalse(page.should_refresh(now=-10 ** 6))
+        refreshes = sum(page.should_refresh(now=99) for _ in range(1000))
+        self.assertTrue(100 < refreshes < 900)
+
+
+class PersonalizedPageCacheTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(username='author')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.post = Post.objects.create(author=cls.author, text='Общий пост')
+        Follow.objects.create(user=cls.reader, author=cls.author)
+
+    def setUp(self):
+        cache.clear()
+        self.guest_client = Client()
+        self.author_client = Client()
+        self.author_client.force_login(self.author)
+        self.reader_client = Client()
+        self.reader_client.force_login(self.reader)
+
+    def test_users_share_cached_page_with_own_fragments(self):
+        """Вошедшие пользователи получают общую закешированную страницу
+        со своими шапкой, кнопками и формой комментария."""
+        url = reverse('posts:post_detail', args=(self.post.pk,))
+        guest = self.guest_client.get(url)
+        self.assertIn('post', guest.context)
+        author = self.author_client.get(url)
+        reader = self.reader_client.get(url)
+        self.assertNotIn('post', author.context)
+        self.assertNotIn('post', reader.context)
+        edit_url = reverse('posts:post_edit', args=(self.post.pk,))
+        self.assertContains(author, edit_url)
+        self.assertContains(author, 'Пользователь: author')
+        self.assertNotContains(reader, edit_url)
+        self.assertContains(reader, 'csrfmiddlewaretoken')
+        self.assertNotContains(guest, 'csrfmiddlewaretoken')
+        self.assertContains(guest, 'Войти')
+        for response in (guest, author, reader):
+            self.assertNotContains(response, '<!--personal')
+
+    def test_post_actions_accept_integer_author_id(self):
+        """Кнопки автора появляются и при прямом рендере с числовым id."""
+        request = RequestFactory().get('/')
+        request.user = self.author
+        html = render_fragment(
+            request, 'post_actions',
+            {'post_id': self.post.pk, 'author_id': self.author.pk}
+        )
+        self.assertIn(reverse('posts:post_edit', args=(self.post.pk,)), html)
+
+    def test_follow_button_per_user(self):
+        """Кнопка подписки в общей странице профиля своя у каждого."""
+        url = reverse('posts:profile', args=(self.author.username,))
+        unfollow = reverse('posts:profile_unfollow', args=('author',))
+        self.assertNotContains(self.guest_client.get(url), unfollow)
+        self.assertContains(self.reader_client.get(url), unfollow)
+        self.assertNotContains(self.author_client.get(url), unfollow)
+
+    def test_user_sees_own_changes_at_once(self):
+        """После своей записи пользователь сразу видит её на главной."""
+        url = reverse('posts:index')
+        self.reader_client.get(url)
+        self.reader_client.post(
+            reverse('posts:post_create'), {'text': 'Свежий пост'}
+        )
+        self.assertContains(self.reader_client.get(url), 'Свежий пост')
@@ -0,0 +1,51 @@
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import connection, transaction
+from sorl.thumbnail import get_thumbnail
+
+logger = logging.getLogger(__name__)
+
+executor = ThreadPoolExecutor(
+    max_workers=settings.THUMBNAIL_WORKERS,
+    thread_name_prefix='thumbnails'
+)
+
+
+def generate_thumbnails(image_name):
+    """Создаёт миниатюры картинки во всех размерах, которые выводит сайт."""
+    for geometry, options in settings.POST_THUMBNAILS:
+        get_thumbnail(image_name, geometry, **options)
+
+
+def generate_thumbnails_safely(image_name):
+    """Вариант для команд: ошибки пишутся в лог, а не пробрасываются."""
+    try:
+        generate_thumbnails(image_name)
+    except Exception:
+        logger.exception('Не удалось создать миниатюры для %s', image_name)
+        return False
+    return True
+
+
+def generate_thumbnails_in_worker(image_name):
+    """Вариант для пулов: соединение с базой закрывается после картинки.
+
+    Поток или процесс пула живёт долго, и открытое им соединение иначе
+    никто не закроет.
+    """
+    try:
+        return generate_thumbnails_safely(image_name)
+    finally:
+        connection.close()
+
+
+def schedule_thumbnails(post):
+    """Ставит генерацию миниатюр в фоновый пул после коммита транзакции."""
+    if not settings.THUMBNAIL_PREGENERATE or not post.image:
+        return
+    image_name = post.image.name
+    transaction.on_commit(
+        lambda: executor.submit(generate_thumbnails_in_worker, image_name)
+    )
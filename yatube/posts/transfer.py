@@ -0,0 +1,316 @@
+import csv
+import itertools
+import json
+import time
+from contextlib import contextmanager
+
+from django.contrib.auth.hashers import make_password
+from django.db import DatabaseError, NotSupportedError, connection
+from django.utils.dateparse import parse_datetime
+
+from core.sqlite import retry_on_locked
+
+from . import page_cache, search
+from .counters import recount_posts, recount_users
+from .feed import rebuild_feeds
+from .models import Comment, Follow, Group, Post, User
+
+FORMATS = ('jsonl', 'csv')
+FIELDS = {
+    'groups': ('slug', 'title', 'description'),
+    'posts': ('id', 'author', 'group', 'text', 'pub_date', 'image'),
+    'comments': ('post', 'author', 'text', 'created'),
+    'follows': ('user', 'author'),
+}
+
+
+def guess_format(path):
+    return 'csv' if path.endswith('.csv') else 'jsonl'
+
+
+def read_records(file, file_format):
+    if file_format == 'csv':
+        yield from csv.DictReader(file)
+        return
+    for line in file:
+        if line.strip():
+            yield json.loads(line)
+
+
+def write_records(file, file_format, fields, records):
+    """Пишет записи по одной, не собирая их в памяти. Возвращает число."""
+    count = 0
+    if file_format == 'csv':
+        writer = csv.DictWriter(file, fields)
+        writer.writeheader()
+        for count, record in enumerate(records, start=1):
+            writer.writerow(record)
+        return count
+    for count, record in enumerate(records, start=1):
+        file.write(json.dumps(record, ensure_ascii=False) + '\n')
+    return count
+
+
+def batches(records, batch_size):
+    records = iter(records)
+    return iter(lambda: list(itertools.islice(records, batch_size)), [])
+
+
+def export_value(value):
+    if value is None:
+        return ''
+    if hasattr(value, 'isoformat'):
+        return value.isoformat()
+    return value
+
+
+def export_records(kind):
+    """Записи выгрузки: связи по username и slug, посты со своими id."""
+    if kind == 'groups':
+        rows = Group.objects.values_list(*FIELDS['groups'])
+    elif kind == 'posts':
+        rows = Post.objects.values_list(
+            'id', 'author__username', 'group__slug', 'text', 'pub_date',
+            'image'
+        )
+    elif kind == 'comments':
+        rows = Comment.objects.values_list(
+            'post_id', 'author__username', 'text', 'created'
+        )
+    else:
+        rows = Follow.objects.values_list(
+            'user__username', 'author__username'
+        )
+    for row in rows.order_by('pk').iterator():
+        yield {
+            field: export_value(value)
+            for field, value in zip(FIELDS[kind], row)
+        }
+
+
+@contextmanager
+def explicit_dates(model):
+    """Даёт сохранить даты из выгрузки вместо auto_now_add."""
+    fields = [
+        field for field in model._meta.concrete_fields
+        if getattr(field, 'auto_now_add', False)
+    ]
+    for field in fields:
+        field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field in fields:
+            field.auto_now_add = True
+
+
+class UserMap:
+    """username → id. Отсутствующих авторов создаёт пачкой без пароля."""
+
+    def __init__(self):
+        self.ids = dict(User.objects.values_list('username', 'pk').iterator())
+        self.password = make_password(None)
+        self.created = set()
+
+    def resolve(self, usernames):
+        missing = set(usernames) - self.ids.keys()
+        if missing:
+            User.objects.bulk_create(
+                [User(username=name, password=self.password)
+                 for name in missing],
+                ignore_conflicts=True
+            )
+            self.ids.update(User.objects.filter(
+                username__in=missing
+            ).values_list('username', 'pk'))
+            self.created |= missing
+        return self.ids
+
+    def forget_created(self):
+        """Забывает авторов, созданных в откаченной транзакции."""
+        for name in self.created:
+            self.ids.pop(name, None)
+        self.created = set()
+
+
+def reserve_post_ids(count):
+    """Резервирует count id постов подряд и возвращает первый из них.
+
+    Счётчик AUTOINCREMENT сдвигается записью в sqlite_sequence, она же
+    берёт блокировку записи: параллельная вставка получит id после резерва.
+    """
+    table = Post._meta.db_table
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'UPDATE sqlite_sequence SET seq = seq + %s WHERE name = %s',
+            [count, table]
+        )
+        if cursor.rowcount == 0:
+            cursor.execute(
+                'INSERT INTO sqlite_sequence (name, seq) VALUES (%s, %s)',
+                [table, count]
+            )
+        cursor.execute(
+            'SELECT seq FROM sqlite_sequence WHERE name = %s', [table]
+        )
+        return cursor.fetchone()[0] - count + 1
+
+
+def load_post_ids(file):
+    return {int(source): pk for source, pk in json.load(file).items()}
+
+
+def save_post_ids(file, post_ids):
+    json.dump(post_ids, file)
+
+
+class Importer:
+    """Загружает записи пачками bulk_create мимо сигналов моделей.
+
+    Каждая пачка пишется своей транзакцией, чтобы загрузка не держала
+    блокировку записи SQLite, пока идёт целиком. Счётчики, ленты и
+    поисковый индекс, которые обычно ведут сигналы, обновляются пачками
+    по ходу загрузки и одним пересчётом в конце. Посты получают новые id,
+    соответствие id из выгрузки копится в post_ids: по нему загружаются
+    комментарии, а повторная загрузка постов пропускает уже загруженные.
+    """
+
+    def __init__(self, kind, batch_size, post_ids=None, pause=0):
+        self.kind = kind
+        self.batch_size = batch_size
+        self.pause = pause
+        self.skipped = 0
+        self.users = UserMap()
+        self.groups = dict(Group.objects.values_list('slug', 'pk'))
+        self.post_ids = {} if post_ids is None else post_ids
+        self.new_post_ids = {}
+        self.authors = set()
+
+    def run(self, records):
+        model = {
+            'groups': Group, 'posts': Post,
+            'comments': Comment, 'follows': Follow,
+        }[self.kind]
+        load = getattr(self, f'load_{self.kind}')
+        before = model.objects.count()
+        with explicit_dates(model):
+            for number, batch in enumerate(batches(records, self.batch_size)):
+                if number:
+                    time.sleep(self.pause)
+                self.skipped += self.load_batch(load, batch)
+                self.post_ids.update(self.new_post_ids)
+        self.finish()
+        return model.objects.count() - before
+
+    @retry_on_locked
+    def load_batch(self, load, records):
+        """Пачка в транзакции. Возвращает число пропущенных записей."""
+        self.new_post_ids = {}
+        self.users.created = set()
+        try:
+            return load(records)
+        except DatabaseError:
+            self.users.forget_created()
+            raise
+
+    def load_groups(self, records):
+        Group.objects.bulk_create([
+            Group(slug=record['slug'], title=record['title'],
+                  description=record['description'])
+            for record in records
+        ], ignore_conflicts=True)
+        self.groups = dict(Group.objects.values_list('slug', 'pk'))
+        return 0
+
+    def load_posts(self, records):
+        users = self.users.resolve(record['author'] for record in records)
+        source_ids, posts = {}, []
+        for record in records:
+            source_id = int(record['id'])
+            if (
+                source_id in self.post_ids or source_id in source_ids
+                or record['group'] and record['group'] not in self.groups
+            ):
+                continue
+            source_ids[source_id] = None
+            posts.append(Post(
+                author_id=users[record['author']],
+                group_id=self.groups.get(record['group']),
+                text=record['text'],
+                pub_date=parse_datetime(record['pub_date']),
+                image=record['image'],
+            ))
+        self.create_posts(posts)
+        self.authors.update(post.author_id for post in posts)
+        self.new_post_ids = {
+            source_id: post.pk for source_id, post in zip(source_ids, posts)
+        }
+        search.get_backend().index_posts(posts)
+        scopes = {page_cache.POSTS_SCOPE}
+        for record in records:
+            scopes.add(page_cache.author_scope(record['author']))
+            if record['group']:
+                scopes.add(page_cache.group_scope(record['group']))
+        page_cache.bump(*scopes)
+        return len(records) - len(posts)
+
+    @staticmethod
+    def create_posts(posts):
+        if not posts or connection.features.can_return_ids_from_bulk_insert:
+            Post.objects.bulk_create(posts)
+            return
+        if connection.vendor != 'sqlite':
+            raise NotSupportedError(
+                'Загрузка постов требует SQLite или базы, возвращающей id '
+                'из bulk_create.'
+            )
+        # bulk_create на SQLite не возвращает id, поэтому они
+        # резервируются для пачки заранее.
+        first = reserve_post_ids(len(posts))
+        for number, post in enumerate(posts):
+            post.id = first + number
+        Post.objects.bulk_create(posts)
+
+    def load_comments(self, records):
+        users = self.users.resolve(record['author'] for record in records)
+        comments = [
+            Comment(
+                post_id=self.post_ids[int(record['post'])],
+                author_id=users[record['author']],
+                text=record['text'],
+                created=parse_datetime(record['created']),
+            )
+            for record in records if int(record['post']) in self.post_ids
+        ]
+        Comment.objects.bulk_create(comments)
+        page_cache.bump(*{
+            page_cache.post_scope(comment.post_id) for comment in comments
+        })
+        return len(records) - len(comments)
+
+    def load_follows(self, records):
+        users = self.users.resolve(itertools.chain.from_iterable(
+            (record['user'], record['author']) for record in records
+        ))
+        follows = [
+            Follow(user_id=users[record['user']],
+                   author_id=users[record['author']])
+            for record in records if record['user'] != record['author']
+        ]
+        Follow.objects.bulk_create(follows, ignore_conflicts=True)
+        self.authors.update(follow.author_id for follow in follows)
+        page_cache.bump(*{
+            page_cache.author_scope(username) for record in records
+            for username in (record['user'], record['author'])
+        })
+        return len(records) - len(follows)
+
+    def finish(self):
+        if self.kind == 'comments':
+            recount_posts()
+        if self.kind == 'posts':
+            recount_users(self.authors)
+            rebuild_feeds(self.authors, pause=self.pause)
+        if self.kind == 'follows':
+            recount_users()
+            rebuild_feeds(self.authors, pause=self.pause)
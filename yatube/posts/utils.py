@@ -1,8 +1,125 @@
+import base64
+import binascii
+
 from django.core.paginator import Paginator
 from django.conf import settings
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+
+CURSOR_NEXT = 'n'
+CURSOR_PREVIOUS = 'p'
+
+
+def encode_cursor(direction, obj, field='pub_date'):
+    """Упаковывает позицию (field, id) в непрозрачный токен."""
+    raw = f'{direction}|{getattr(obj, field).isoformat()}|{obj.pk}'
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(token):
+    """Распаковывает токен курсора. Возвращает None, если он испорчен."""
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        raw = base64.urlsafe_b64decode(padded.encode()).decode()
+        direction, value, pk = raw.split('|')
+        value = parse_datetime(value)
+        pk = int(pk)
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        return None
+    if direction not in (CURSOR_NEXT, CURSOR_PREVIOUS) or value is None:
+        return None
+    return direction, value, pk
+
+
+class CursorPage:
+    """Страница курсорной пагинации.
+
+    Не знает общего числа записей, а только умеет ссылаться
+    на соседние страницы через токены ?cursor=.
+    """
+    is_cursor = True
+
+    def __init__(self, object_list, next_cursor=None, previous_cursor=None):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def __repr__(self):
+        return f'<CursorPage of {len(self.object_list)} objects>'
 
+    def __len__(self):
+        return len(self.object_list)
 
-def get_page_context(posts, request):
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    def has_other_pages(self):
+        return self.has_next() or self.has_previous()
+
+
+def get_cursor_page(objects, token, per_page, field='pub_date',
+                    descending=True):
+    """Выбирает страницу по ключу (field, id) без COUNT и OFFSET.
+
+    Страницы идут по убыванию field, а с descending=False — по возрастанию.
+    """
+    cursor = decode_cursor(token) if token else None
+    direction = CURSOR_NEXT
+    if cursor is not None:
+        direction, value, pk = cursor
+        lookup = 'lt' if (direction == CURSOR_NEXT) == descending else 'gt'
+        objects = objects.filter(
+            Q(**{f'{field}__{lookup}': value})
+            | Q(**{field: value, f'pk__{lookup}': pk})
+        )
+    if (direction == CURSOR_NEXT) == descending:
+        objects = objects.order_by(f'-{field}', '-pk')
+    else:
+        objects = objects.order_by(field, 'pk')
+    object_list = list(objects[:per_page + 1])
+    has_more = len(object_list) > per_page
+    object_list = object_list[:per_page]
+    if direction == CURSOR_PREVIOUS:
+        object_list.reverse()
+    if not object_list:
+        return CursorPage(object_list)
+    has_next = has_more if direction == CURSOR_NEXT else True
+    has_previous = cursor is not None if direction == CURSOR_NEXT else has_more
+    return CursorPage(
+        object_list,
+        next_cursor=(
+            encode_cursor(CURSOR_NEXT, object_list[-1], field)
+            if has_next else None
+        ),
+        previous_cursor=(
+            encode_cursor(CURSOR_PREVIOUS, object_list[0], field)
+            if has_previous else None
+        ),
+    )
+
+
+def get_page_context(posts, request, field='pub_date'):
+    if settings.PAGINATION_MODE == 'cursor':
+        return get_cursor_page(
+            posts, request.GET.get('cursor'), settings.NUM_OF_POST, field
+        )
     paginator = Paginator(posts, settings.NUM_OF_POST)
     page_number = request.GET.get('page')
     return paginator.get_page(page_number)
+
+
+def get_comments_page(comments, token):
+    """Комментарии по порядку написания, пачками по NUM_OF_COMMENTS."""
+    return get_cursor_page(
+        comments, token, settings.NUM_OF_COMMENTS, field='created',
+        descending=False
+    )
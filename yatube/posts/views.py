@@ -1,16 +1,31 @@
+from urllib.parse import urlencode
+
+from django.http import Http404, JsonResponse
 from django.shortcuts import render, get_object_or_404, redirect
+from django.template.loader import render_to_string
 from django.contrib.auth.decorators import login_required
-from django.views.decorators.cache import cache_page
-
-from .forms import PostForm, CommentForm
-from .models import Post, Group, Follow, User
-from .utils import get_page_context
+from django.core.paginator import Paginator
+from django.conf import settings
 
+from core.sqlite import retry_on_locked
 
-@cache_page(20, key_prefix='index_page')
+from .feed import FEED_DATE, get_follow_feed
+from .forms import PostForm, CommentForm
+from .models import Comment, Post, Group, Follow, User
+from .page_cache import (cache_page_by_generation, group_scopes, index_scopes,
+                         post_comments_scopes, post_detail_scopes,
+                         profile_scopes)
+from .search import SearchResults
+from .thumbnails import schedule_thumbnails
+from .utils import get_comments_page, get_page_context
+
+
+@cache_page_by_generation(
+    index_scopes, key_prefix='index_page', personalized=True
+)
 def index(request):
     template = 'posts/index.html'
-    posts = Post.objects.select_related('group').all()
+    posts = Post.objects.for_list()
     page_obj = get_page_context(posts, request)
     context = {
         'page_obj': page_obj,
@@ -18,10 +33,11 @@ def index(request):
     return render(request, template, context)
 
 
+@cache_page_by_generation(group_scopes, key_prefix='group_page')
 def group_posts(request, slug):
     template = 'posts/group_list.html'
     group = get_object_or_404(Group, slug=slug)
-    posts = group.posts.all()
+    posts = group.posts.for_list()
     page_obj = get_page_context(posts, request)
     context = {
         'group': group,
@@ -30,36 +46,69 @@ def group_posts(request, slug):
     return render(request, template, context)
 
 
+@cache_page_by_generation(
+    profile_scopes, key_prefix='profile_page', personalized=True
+)
 def profile(request, username):
     template = 'posts/profile.html'
-    author = get_object_or_404(User, username=username)
-    posts = author.posts.all()
+    author = get_object_or_404(
+        User.objects.select_related('stats'), username=username
+    )
+    posts = author.posts.for_list()
     page_obj = get_page_context(posts, request)
-    following = request.user.is_authenticated and Follow.objects.filter(
-        user=request.user, author=author
-    ).exists()
     context = {
         'author': author,
         'page_obj': page_obj,
-        'following': following,
     }
     return render(request, template, context)
 
 
+@cache_page_by_generation(
+    post_detail_scopes, key_prefix='post_page', personalized=True
+)
 def post_detail(request, post_id):
     template = 'posts/post_detail.html'
-    post = get_object_or_404(Post, pk=post_id)
-    form = CommentForm(request.POST or None)
-    comments = post.comments.all()
+    post = get_object_or_404(Post.objects.for_detail(), pk=post_id)
+    comments = get_comments_page(
+        post.comments.for_list(), request.GET.get('cursor')
+    )
     context = {
         'post': post,
-        'form': form,
         'comments': comments,
     }
     return render(request, template, context)
 
 
+@cache_page_by_generation(post_comments_scopes, key_prefix='post_comments')
+def post_comments(request, post_id):
+    """Следующая пачка комментариев для кнопки «Показать ещё»."""
+    if not Post.objects.filter(pk=post_id).exists():
+        raise Http404
+    comments = get_comments_page(
+        Comment.objects.filter(post_id=post_id).for_list(),
+        request.GET.get('cursor')
+    )
+    html = render_to_string(
+        'includes/comments.html', {'comments': comments}, request
+    )
+    return JsonResponse({'html': html, 'next_cursor': comments.next_cursor})
+
+
+def search(request):
+    template = 'posts/search.html'
+    query = request.GET.get('q', '').strip()
+    paginator = Paginator(SearchResults(query), settings.NUM_OF_POST)
+    page_obj = paginator.get_page(request.GET.get('page'))
+    context = {
+        'query': query,
+        'page_obj': page_obj,
+        'page_params': '&' + urlencode({'q': query}),
+    }
+    return render(request, template, context)
+
+
 @login_required
+@retry_on_locked
 def post_create(request):
     template = 'posts/create_post.html'
     form = PostForm(request.POST or None, files=request.FILES or None)
@@ -70,12 +119,14 @@ def post_create(request):
         post = form.save(commit=False)
         post.author = request.user
         post.save()
+        schedule_thumbnails(post)
         return redirect('posts:profile', post.author)
 
     return render(request, template, context)
 
 
 @login_required
+@retry_on_locked
 def post_edit(request, post_id):
     template = 'posts/create_post.html'
     post = get_object_or_404(Post, pk=post_id)
@@ -88,6 +139,8 @@ def post_edit(request, post_id):
     )
     if form.is_valid():
         form.save()
+        if 'image' in form.changed_data:
+            schedule_thumbnails(post)
         return redirect('posts:post_detail', post_id)
     context = {
         'form': form,
@@ -98,6 +151,7 @@ def post_edit(request, post_id):
 
 
 @login_required
+@retry_on_locked
 def add_comment(request, post_id):
     post = get_object_or_404(Post, pk=post_id)
     form = CommentForm(request.POST or None)
@@ -112,9 +166,8 @@ def add_comment(request, post_id):
 @login_required
 def follow_index(request):
     template = 'posts/follow.html'
-    posts = Post.objects.filter(
-        author__following__user=request.user)
-    page_obj = get_page_context(posts, request)
+    posts = get_follow_feed(request.user).for_list()
+    page_obj = get_page_context(posts, request, FEED_DATE)
     context = {
         'page_obj': page_obj,
     }
@@ -122,6 +175,7 @@ def follow_index(request):
 
 
 @login_required
+@retry_on_locked
 def profile_follow(request, username):
     author = get_object_or_404(User, username=username)
     if author != request.user:
@@ -130,6 +184,7 @@ def profile_follow(request, username):
 
 
 @login_required
+@retry_on_locked
 def profile_unfollow(request, username):
     author = get_object_or_404(User, username=username)
     follower = Follow.objects.filter(user=request.user, author=author)
@@ -3,3 +3,14 @@ from django.apps import AppConfig
 
 class UsersConfig(AppConfig):
     name = 'users'
+
+    def ready(self):
+        from django.contrib.auth.password_validation import (
+            get_default_password_validators
+        )
+
+        from . import signals  # noqa: F401
+
+        # CommonPasswordValidator читает сжатый словарь при создании:
+        # пусть это случится при запуске, а не на первой регистрации.
+        get_default_password_validators()
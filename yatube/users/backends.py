@@ -0,0 +1,35 @@
+from django.conf import settings
+from django.contrib.auth.backends import ModelBackend
+from django.core.exceptions import PermissionDenied
+from django.core.cache import cache
+
+
+def user_cache_key(user_id):
+    return f'user:{user_id}'
+
+
+class CachedModelBackend(ModelBackend):
+    """ModelBackend, который берёт пользователя сессии из кеша.
+
+    AuthenticationMiddleware загружает пользователя на каждом запросе.
+    Запись сбрасывается сигналами при сохранении и удалении пользователя,
+    а USER_CACHE_TIMEOUT ограничивает отставание после правок через update().
+    """
+
+    def authenticate(self, request, username=None, password=None, **kwargs):
+        user = super().authenticate(request, username, password, **kwargs)
+        if user is None:
+            # ModelBackend после нас нужен только сессиям, открытым до
+            # перехода на кеш, и проверил бы тот же пароль второй раз.
+            raise PermissionDenied
+        return user
+
+    def get_user(self, user_id):
+        key = user_cache_key(user_id)
+        user = cache.get(key)
+        if user is None:
+            user = super().get_user(user_id)
+            if user is not None:
+                cache.set(key, user, settings.USER_CACHE_TIMEOUT)
+            return user
+        return user if self.user_can_authenticate(user) else None
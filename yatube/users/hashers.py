@@ -0,0 +1,70 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.contrib.auth.hashers import PBKDF2PasswordHasher
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+class HashingBusy(Exception):
+    """Очередь хеширования паролей переполнена."""
+
+
+class HashingPool:
+    """Пул потоков для PBKDF2 с ограниченным числом мест.
+
+    hashlib отпускает GIL на время PBKDF2, и без ограничения поток входов
+    занял бы все ядра. Запрос держит поток сервера, пока его хеш считается
+    или ждёт в очереди, поэтому мест slots меньше, чем потоков сервера, а
+    запрос, которому места не досталось, сразу получает HashingBusy.
+    """
+
+    def __init__(self, workers, slots):
+        self.executor = ThreadPoolExecutor(
+            max_workers=workers, thread_name_prefix='hashing'
+        )
+        self.slots = threading.BoundedSemaphore(slots)
+
+    def run(self, func, *args):
+        if not self.slots.acquire(blocking=False):
+            raise HashingBusy
+        try:
+            return self.executor.submit(func, *args).result()
+        finally:
+            self.slots.release()
+
+    def shutdown(self):
+        self.executor.shutdown()
+
+
+def get_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = HashingPool(
+                settings.PASSWORD_HASHING_WORKERS,
+                settings.PASSWORD_HASHING_SLOTS
+            )
+        return _pool
+
+
+def reset_pool():
+    """Пересоздаёт пул по текущим настройкам при следующем хешировании."""
+    global _pool
+    with _pool_lock:
+        pool, _pool = _pool, None
+    if pool is not None:
+        pool.shutdown()
+
+
+class PooledPBKDF2PasswordHasher(PBKDF2PasswordHasher):
+    """PBKDF2PasswordHasher, который считает хеши в общем пуле.
+
+    verify() тоже проходит через encode(), так что вход и регистрация
+    ограничены одним пулом. Алгоритм прежний, старые хеши подходят.
+    """
+
+    def encode(self, password, salt, iterations=None):
+        return get_pool().run(super().encode, password, salt, iterations)
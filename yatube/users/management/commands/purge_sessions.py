@@ -0,0 +1,45 @@
+import time
+
+from django.contrib.sessions.models import Session
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from core.sqlite import retry_on_locked
+
+
+@retry_on_locked
+def delete_batch(now, batch_size):
+    keys = list(
+        Session.objects.filter(expire_date__lt=now).values_list(
+            'session_key', flat=True
+        )[:batch_size]
+    )
+    Session.objects.filter(session_key__in=keys).delete()
+    return len(keys)
+
+
+class Command(BaseCommand):
+    help = (
+        'Удаляет истёкшие сессии небольшими пачками, как clearsessions, '
+        'но не держит таблицу заблокированной на всё удаление.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument(
+            '--pause', type=float, default=0.05,
+            help='Пауза между пачками в секундах, чтобы успевали писатели.'
+        )
+
+    def handle(self, *args, **options):
+        now = timezone.now()
+        total = 0
+        while True:
+            deleted = delete_batch(now, options['batch_size'])
+            total += deleted
+            if deleted < options['batch_size']:
+                break
+            time.sleep(options['pause'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Удалено истёкших сессий: {total}.'
+        ))
@@ -0,0 +1,25 @@
+from http import HTTPStatus
+
+from django.http import HttpResponse
+
+from .hashers import HashingBusy
+
+
+class HashingBusyMiddleware:
+    """Отвечает 503, когда пул хеширования паролей переполнен."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        return self.get_response(request)
+
+    def process_exception(self, request, exception):
+        if not isinstance(exception, HashingBusy):
+            return None
+        response = HttpResponse(
+            'Слишком много входов, попробуйте через секунду.',
+            status=HTTPStatus.SERVICE_UNAVAILABLE
+        )
+        response['Retry-After'] = '1'
+        return response
@@ -0,0 +1,29 @@
+from datetime import timedelta
+from io import StringIO
+
+from django.test import TestCase
+from django.contrib.sessions.models import Session
+from django.core.management import call_command
+from django.utils import timezone
+
+
+class PurgeSessionsTest(TestCase):
+    def test_only_expired_sessions_removed_in_batches(self):
+        """purge_sessions удаляет пачками только истёкшие сессии."""
+        now = timezone.now()
+        for number in range(5):
+            Session.objects.create(
+                session_key=f'expired{number}', session_data='',
+                expire_date=now - timedelta(days=1)
+            )
+        Session.objects.create(
+            session_key='alive', session_data='',
+            expire_date=now + timedelta(days=1)
+        )
+        out = StringIO()
+        call_command('purge_sessions', batch_size=2, pause=0, stdout=out)
+        self.assertIn('5', out.getvalue())
+        self.assertEqual(
+            list(Session.objects.values_list('session_key', flat=True)),
+            ['alive']
+        )
@@ -1,7 +1,25 @@
-from django.test import Client, TestCase
+import asyncio
+import threading
+from http import HTTPStatus
+from http.cookies import SimpleCookie
+from unittest import mock
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.contrib.auth.hashers import PBKDF2PasswordHasher
+from django.contrib.auth.password_validation import (
+    CommonPasswordValidator, get_default_password_validators
+)
+from django.core.cache import cache
+from django.core.wsgi import get_wsgi_application
+from django.test import (Client, TestCase, TransactionTestCase,
+                         override_settings)
 from django.urls import reverse
 
+from core.asgi import ASGIHandler
+
 from ..forms import User, CreationForm
+from ..hashers import get_pool, reset_pool
 
 
 class UsersPagesTests(TestCase):
@@ -40,3 +58,185 @@ class UsersPagesTests(TestCase):
         response = (self.authorized_client.get(reverse('users:signup')))
         self.assertIn('form', response.context)
         self.assertIsInstance(response.context['form'], CreationForm)
+
+
+class CachedSessionTests(TestCase):
+    def setUp(self) -> None:
+        cache.clear()
+        self.user = User.objects.create_user(username='Petr')
+        self.client.force_login(self.user)
+        self.url = reverse('about:author')
+
+    def test_session_and_user_served_from_cache(self) -> None:
+        """Вошедший пользователь после первого запроса не ходит в базу
+        за сессией и собой."""
+        self.client.get(self.url)
+        with self.assertNumQueries(0):
+            response = self.client.get(self.url)
+        self.assertEqual(response.context['user'], self.user)
+
+    def test_user_cache_reset_on_change(self) -> None:
+        """Правка профиля и смена пароля сбрасывают кеш пользователя."""
+        self.client.get(self.url)
+        self.user.first_name = 'Пётр'
+        self.user.save()
+        response = self.client.get(self.url)
+        self.assertEqual(response.context['user'].first_name, 'Пётр')
+        self.user.set_password('new-password')
+        self.user.save()
+        response = self.client.get(self.url)
+        self.assertFalse(response.context['user'].is_authenticated)
+
+    def test_sessions_from_model_backend_kept(self) -> None:
+        """Сессии, открытые через ModelBackend, остаются рабочими."""
+        client = Client()
+        client.force_login(
+            self.user, backend='django.contrib.auth.backends.ModelBackend'
+        )
+        response = client.get(reverse('posts:follow_index'))
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+
+    def test_wrong_password_checked_once(self) -> None:
+        """Неверный пароль не проверяется второй раз запасным бэкендом."""
+        self.user.set_password('Kx9!secret')
+        self.user.save()
+        with mock.patch.object(
+            PBKDF2PasswordHasher, 'encode', autospec=True,
+            side_effect=PBKDF2PasswordHasher.encode
+        ) as encode:
+            response = self.client.post(reverse('users:login'), {
+                'username': 'Petr', 'password': 'wrong',
+            })
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        self.assertEqual(encode.call_count, 1)
+
+
+class PasswordHashingTests(TestCase):
+    def setUp(self) -> None:
+        reset_pool()
+        self.addCleanup(reset_pool)
+        self.user = User.objects.create_user(
+            username='Petr', password='Kx9!secret'
+        )
+
+    def test_password_hashed_in_pool(self) -> None:
+        """Хеш считается в пуле и совместим с обычным pbkdf2_sha256."""
+        self.assertTrue(self.user.password.startswith('pbkdf2_sha256$'))
+        self.assertTrue(self.user.check_password('Kx9!secret'))
+        self.assertFalse(self.user.check_password('wrong'))
+        response = self.client.post(reverse('users:login'), {
+            'username': 'Petr', 'password': 'Kx9!secret',
+        })
+        self.assertEqual(response.status_code, HTTPStatus.FOUND)
+
+    @override_settings(PASSWORD_HASHING_WORKERS=1, PASSWORD_HASHING_SLOTS=1)
+    def test_login_rejected_when_pool_full(self) -> None:
+        """При занятом пуле вход отвечает 503, а не ждёт очереди."""
+        reset_pool()
+        pool = get_pool()
+        pool.slots.acquire()
+        try:
+            response = self.client.post(reverse('users:login'), {
+                'username': 'Petr', 'password': 'Kx9!secret',
+            })
+        finally:
+            pool.slots.release()
+        self.assertEqual(
+            response.status_code, HTTPStatus.SERVICE_UNAVAILABLE
+        )
+        self.assertEqual(response['Retry-After'], '1')
+
+    def test_validators_loaded_at_startup(self) -> None:
+        """Словарь CommonPasswordValidator загружен до первой регистрации."""
+        self.assertEqual(
+            get_default_password_validators.cache_info().misses, 1
+        )
+        validator = next(
+            validator for validator in get_default_password_validators()
+            if isinstance(validator, CommonPasswordValidator)
+        )
+        self.assertIn('password', validator.passwords)
+
+
+class HashingUnderServerLoadTests(TransactionTestCase):
+    def setUp(self) -> None:
+        cache.clear()
+        reset_pool()
+        self.addCleanup(reset_pool)
+        User.objects.create_user(username='Petr', password='Kx9!secret')
+        self.handler = ASGIHandler(
+            get_wsgi_application(), settings.ASGI_THREADS
+        )
+        self.addCleanup(self.handler.executor.shutdown)
+
+    async def request(self, method, path, body=b'', headers=()):
+        scope = {
+            'type': 'http', 'method': method, 'path': path,
+            'headers': list(headers),
+        }
+        messages = iter([{'type': 'http.request', 'body': body}])
+        sent = []
+
+        async def receive():
+            return next(messages)
+
+        async def send(message):
+            sent.append(message)
+
+        await self.handler(scope, receive, send)
+        return sent[0]
+
+    def test_pages_served_while_hashing_pool_full(self) -> None:
+        """Когда все места пула хеширования заняты входами, у сервера
+        остаются потоки для страниц, а лишние входы получают 503."""
+        self.assertLess(settings.PASSWORD_HASHING_SLOTS, settings.ASGI_THREADS)
+        release = threading.Event()
+        encode = PBKDF2PasswordHasher.encode
+
+        def slow_encode(hasher, *args):
+            release.wait(10)
+            return encode(hasher, *args)
+
+        async def scenario():
+            start = await self.request('GET', reverse('users:login'))
+            cookies = SimpleCookie()
+            for name, value in start['headers']:
+                if name == b'set-cookie':
+                    cookies.load(value.decode())
+            token = cookies['csrftoken'].value
+            body = urlencode({
+                'username': 'Petr', 'password': 'Kx9!secret',
+                'csrfmiddlewaretoken': token,
+            }).encode()
+            headers = [
+                (b'cookie', f'csrftoken={token}'.encode()),
+                (b'content-type', b'application/x-www-form-urlencoded'),
+                (b'content-length', str(len(body)).encode()),
+            ]
+            logins = [
+                asyncio.ensure_future(self.request(
+                    'POST', reverse('users:login'), body, headers
+                ))
+                for _ in range(settings.ASGI_THREADS)
+            ]
+            rejected = len(logins) - settings.PASSWORD_HASHING_SLOTS
+            while sum(login.done() for login in logins) < rejected:
+                await asyncio.sleep(0.01)
+            page = await asyncio.wait_for(
+                self.request('GET', reverse('posts:index')), timeout=5
+            )
+            release.set()
+            return page, await asyncio.gather(*logins)
+
+        with mock.patch.object(PBKDF2PasswordHasher, 'encode', slow_encode):
+            page, logins = asyncio.run(scenario())
+        self.assertEqual(page['status'], HTTPStatus.OK)
+        statuses = [login['status'] for login in logins]
+        self.assertEqual(
+            statuses.count(HTTPStatus.FOUND),
+            settings.PASSWORD_HASHING_SLOTS
+        )
+        self.assertEqual(
+            statuses.count(HTTPStatus.SERVICE_UNAVAILABLE),
+            settings.ASGI_THREADS - settings.PASSWORD_HASHING_SLOTS
+        )
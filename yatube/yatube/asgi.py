@@ -0,0 +1,14 @@
+"""
+ASGI config for yatube project.
+
+It exposes the ASGI callable as a module-level variable named ``application``,
+e.g. for ``uvicorn yatube.asgi:application``.
+"""
+
+import os
+
+from core.asgi import get_asgi_application
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'yatube.settings')
+
+application = get_asgi_application()
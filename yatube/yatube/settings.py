@@ -11,6 +11,7 @@ https://docs.djangoproject.com/en/2.2/ref/settings/
 """
 
 import os
+import sys
 
 # Build paths inside the project like this: os.path.join(BASE_DIR, ...)
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
@@ -40,6 +41,7 @@ INSTALLED_APPS = [
     'users.apps.UsersConfig',
     'core.apps.CoreConfig',
     'about.apps.AboutConfig',
+    'api.apps.ApiConfig',
     'django.contrib.admin',
     'django.contrib.auth',
     'django.contrib.contenttypes',
@@ -50,19 +52,85 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'core.static.StaticFilesMiddleware',
+    'core.middleware.RequestMetricsMiddleware',
+    'core.routers.ReplicaPinningMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'users.middleware.HashingBusyMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
+# Локальный LRU перед общим для всех процессов файловым кешем, см.
+# core.cache. L1_TIMEOUTS — время жизни в L1 по префиксу ключа.
+# Из кеша читаются pickle, поэтому он лежит в каталоге проекта, а не в
+# общем /tmp; тесты очищают кеш и получают свой каталог. Общий кеш при
+# MAX_ENTRIES удаляет каждую CULL_FREQUENCY-ю запись, а с ними и
+# поколения страниц, поэтому предел с запасом. Каталог перечисляется для
+# этого не чаще раза в CULL_INTERVAL секунд, а не при каждой записи.
+TESTING: bool = sys.argv[1:2] == ['test'] or 'pytest' in sys.modules
+CACHE_DIR = os.getenv(
+    'YATUBE_CACHE_DIR', os.path.join(BASE_DIR, 'cache')
+)
+if TESTING:
+    CACHE_DIR += '-test'
 CACHES = {
     'default': {
-        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'BACKEND': 'core.cache.TwoTierCache',
+        'LOCATION': CACHE_DIR,
+        'OPTIONS': {
+            'L1_MAX_ENTRIES': 2000,
+            'L1_TIMEOUTS': {'': 30, 'generation:': 5},
+            'SHARED_OPTIONS': {
+                'MAX_ENTRIES': 50000,
+                'CULL_FREQUENCY': 10,
+                'CULL_INTERVAL': 60,
+            },
+        },
     }
 }
+# Размеры миниатюр, которые выводят шаблоны постов: создаются заранее
+# в фоновом пуле после загрузки картинки.
+POST_THUMBNAILS = (
+    ('960x339', {'crop': 'center', 'upscale': True}),
+)
+THUMBNAIL_PREGENERATE: bool = True
+THUMBNAIL_WORKERS: int = 2
+# Загрузки пишутся на диск частями, а картинки постов пересохраняются
+# без метаданных и не больше POST_IMAGE_MAX_SIDE, см. posts.images.
+# WEBP работает, если Pillow собран с libwebp, иначе выйдет JPEG.
+FILE_UPLOAD_HANDLERS = [
+    'django.core.files.uploadhandler.TemporaryFileUploadHandler',
+]
+POST_IMAGE_MAX_BYTES: int = 20 * 1024 * 1024
+POST_IMAGE_MAX_PIXELS: int = 50 * 1000 * 1000
+POST_IMAGE_MAX_SIDE: int = 1920
+POST_IMAGE_FORMAT: str = 'JPEG'
+POST_IMAGE_QUALITY: int = 85
+# Картинка без постов удаляется, только если её не загружали последние
+# POST_IMAGE_RELEASE_GRACE секунд; оставшиеся убирает purge_images.
+POST_IMAGE_RELEASE_GRACE: int = 60 * 10
+# Кеш страниц сбрасывается сменой поколения при записи, а не по таймауту.
+PAGE_CACHE_TIMEOUT: int = 60 * 60 * 4
+# Пересборку страницы делает один запрос под блокировкой, остальные ждут
+# до PAGE_CACHE_LOCK_WAIT секунд или получают прошлую версию, которая
+# хранится ещё PAGE_CACHE_STALE_TIMEOUT. Если прошлая версия есть, а
+# запросы SQLite при пересборке не уложились в PAGE_CACHE_BUILD_DEADLINE
+# секунд, отдаётся она. PAGE_CACHE_EARLY_BETA — насколько рано начинается
+# вероятностное обновление перед истечением срока.
+PAGE_CACHE_STALE_TIMEOUT: int = 60 * 60
+PAGE_CACHE_LOCK_TIMEOUT: int = 30
+PAGE_CACHE_LOCK_WAIT: float = 2
+PAGE_CACHE_BUILD_DEADLINE: float = 2
+PAGE_CACHE_EARLY_BETA: float = 1
+# Метрики запросов по представлениям: /internal/metrics/ и лог медленных.
+# Время шаблонов засчитывает бэкенд core.templates.TimedDjangoTemplates,
+# обращения к кешу — core.cache.TwoTierCache.
+REQUEST_METRICS: bool = True
+SLOW_REQUEST_MS: int = 500
 ROOT_URLCONF = 'yatube.urls'
 TEMPLATES_DIR = os.path.join(BASE_DIR, 'templates')
 STATICFILES_DIRS = (os.path.join(BASE_DIR, 'static'),)
@@ -70,10 +138,17 @@ EMAIL_BACKEND = 'django.core.mail.backends.filebased.EmailBackend'
 CSRF_FAILURE_VIEW = 'core.views.csrf_failure'
 EMAIL_FILE_PATH = os.path.join(BASE_DIR, 'sent_emails')
 NUM_OF_POST: int = 10
+NUM_OF_COMMENTS: int = 20
+# 'numbered' — Paginator со страницами, 'cursor' — курсор по (pub_date, id)
+PAGINATION_MODE: str = 'numbered'
 LEN_POST: int = 15
+# Авторы с большим числом подписчиков не раскладываются по лентам при записи,
+# их посты подмешиваются в ленту при чтении.
+FEED_FANOUT_LIMIT: int = 1000
+FEED_BACKFILL_LIMIT: int = 100
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        'BACKEND': 'core.templates.TimedDjangoTemplates',
         'DIRS': [TEMPLATES_DIR],
         'APP_DIRS': True,
         'OPTIONS': {
@@ -89,6 +164,8 @@ TEMPLATES = [
 ]
 
 WSGI_APPLICATION = 'yatube.wsgi.application'
+# Потоки, в которых yatube.asgi выполняет представления, см. core.asgi.
+ASGI_THREADS: int = 16
 
 
 # Database
@@ -98,8 +175,59 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': os.path.join(BASE_DIR, 'db.sqlite3'),
+        'CONN_MAX_AGE': 60,
     }
 }
+# Выставляются каждому соединению с SQLite, см. core.sqlite.
+SQLITE_PRAGMAS: dict = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'busy_timeout': 5000,
+    'cache_size': -32000,
+    'mmap_size': 256 * 1024 * 1024,
+    'temp_store': 'MEMORY',
+}
+# Реплики для чтения. YATUBE_REPLICAS=2 добавит replica1 и replica2 —
+# копии db.sqlite3, которые обновляет команда sync_replicas.
+DATABASE_REPLICAS: list = []
+for number in range(1, int(os.getenv('YATUBE_REPLICAS', 0)) + 1):
+    DATABASES[f'replica{number}'] = {
+        **DATABASES['default'],
+        'NAME': os.path.join(BASE_DIR, f'db-replica{number}.sqlite3'),
+        'TEST': {'MIRROR': 'default'},
+    }
+    DATABASE_REPLICAS.append(f'replica{number}')
+DATABASE_ROUTERS = ['core.routers.ReplicaRouter']
+# Окно read-your-writes: столько после записи читаем из основной базы.
+REPLICA_STICKY_SECONDS: int = 10
+DB_RETRY_ATTEMPTS: int = 5
+DB_RETRY_DELAY: float = 0.02
+
+
+# Сессии читаются из кеша и пишутся в базу только при изменении,
+# пользователь сессии тоже берётся из кеша, см. users.backends.
+# ModelBackend остаётся в списке, чтобы не разлогинить пользователей,
+# вошедших до перехода на кеш: Django хранит путь бэкенда в сессии.
+SESSION_ENGINE = 'django.contrib.sessions.backends.cached_db'
+AUTHENTICATION_BACKENDS = [
+    'users.backends.CachedModelBackend',
+    'django.contrib.auth.backends.ModelBackend',
+]
+USER_CACHE_TIMEOUT: int = 60 * 5
+# PBKDF2 считается в пуле из PASSWORD_HASHING_WORKERS потоков. Считаются
+# и ждут очереди не больше PASSWORD_HASHING_SLOTS запросов — четверть
+# ASGI_THREADS, чтобы остальные потоки сервера оставались страницам, см.
+# users.hashers.
+PASSWORD_HASHERS = [
+    'users.hashers.PooledPBKDF2PasswordHasher',
+    'django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher',
+    'django.contrib.auth.hashers.Argon2PasswordHasher',
+    'django.contrib.auth.hashers.BCryptSHA256PasswordHasher',
+]
+PASSWORD_HASHING_WORKERS: int = 2
+PASSWORD_HASHING_SLOTS: int = max(
+    ASGI_THREADS // 4, PASSWORD_HASHING_WORKERS
+)
 
 
 # Password validation
@@ -139,6 +267,18 @@ USE_TZ = True
 # https://docs.djangoproject.com/en/2.2/howto/static-files/
 
 STATIC_URL = '/static/'
+# collectstatic добавляет к именам хеш содержимого и кладёт рядом .gz и
+# .br (если установлен brotli). core.static.StaticFilesMiddleware отдаёт
+# их из STATIC_ROOT: файлы с хешем кешируются на STATIC_MAX_AGE, адреса
+# из STATIC_ALIASES и файлы без хеша — на STATIC_ALIAS_MAX_AGE.
+STATIC_ROOT = os.path.join(BASE_DIR, 'staticfiles')
+STATICFILES_STORAGE = 'core.storage.CompressedManifestStaticFilesStorage'
+STATIC_MAX_AGE: int = 60 * 60 * 24 * 365
+STATIC_ALIAS_MAX_AGE: int = 60 * 60 * 24
+STATIC_ALIASES: dict = {
+    '/favicon.ico': 'img/fav/fav.ico',
+    '/apple-touch-icon.png': 'img/fav/apple-touch-icon.png',
+}
 LOGIN_URL = 'users:login'
 LOGIN_REDIRECT_URL = 'posts:index'
 MEDIA_URL = '/media/'
@@ -18,6 +18,8 @@ from django.urls import include, path
 from django.conf import settings
 from django.conf.urls.static import static
 
+from core.views import request_metrics
+
 handler404 = 'core.views.page_not_found'
 handler403 = 'core.views.permission_denied'
 
@@ -26,7 +28,9 @@ urlpatterns = [
     path('auth/', include('users.urls')),
     path('auth/', include('django.contrib.auth.urls')),
     path('admin/', admin.site.urls),
+    path('internal/metrics/', request_metrics, name='request_metrics'),
     path('about/', include('about.urls', namespace='about')),
+    path('api/v1/', include('api.urls', namespace='api')),
 ]
 if settings.DEBUG:
     urlpatterns += static(